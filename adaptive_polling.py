@@ -0,0 +1,99 @@
+import logging
+import math
+from datetime import datetime
+from config import POLL_MIN_INTERVAL, POLL_MAX_INTERVAL, POLL_WINDOW
+from compact_schema import COMPACT_MEASUREMENTS
+from metrics import POLL_INTERVAL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# 少于该数量的数据点时不估算活跃度，使用品种原来的固定间隔
+MIN_POINTS = 5
+
+
+def activity(points):
+    """由按时间升序的数据点估算 (实现波动率, 变化频率)，数据不足时返回 None
+
+    实现波动率为对数收益率平方和除以时间跨度后开方（每 √秒），与采样间隔无关；
+    变化频率为相邻数据点中数值发生变化的比例。
+    """
+    values, times = [], []
+    for point in points:
+        value = point.get(COMPACT_MEASUREMENTS.get(point['measurement'], {}).get('value'))
+        if value is None or value <= 0:
+            continue
+        values.append(float(value))
+        times.append(datetime.fromisoformat(point['timestamp']))
+    if len(values) < MIN_POINTS:
+        return None
+    span = (times[-1] - times[0]).total_seconds()
+    if span <= 0:
+        return None
+    returns = [math.log(current / previous) for previous, current in zip(values, values[1:])]
+    volatility = math.sqrt(sum(r * r for r in returns) / span)
+    changes = sum(1 for r in returns if r != 0) / len(returns)
+    return volatility, changes
+
+
+def allocate(weights, budget, low, high):
+    """把总请求速率 budget（次/秒）按权重分给各品种，每个品种的速率限制在 [low, high]
+
+    注水法：找一个系数 scale，使各品种速率 min(max(scale × 权重, low), high) 之和恰好不超过 budget，
+    触及上限的品种固定在上限，多出的速率留给其他品种，触及下限的品种由其他品种让出速率补足。
+    budget 连下限都不够（少于 len(weights) × low）时所有品种取下限，这是唯一会超出 budget 的情况。
+    权重全为 0 时平均分配。
+    """
+    if not weights:
+        return {}
+    if not any(weight > 0 for weight in weights.values()):
+        weights = dict.fromkeys(weights, 1.0)
+
+    def spend(scale):
+        return sum(min(max(scale * weight, low), high) for weight in weights.values())
+
+    # 先找到一个花超预算（或所有有权重的品种都已到上限）的系数，再二分
+    lower, upper = 0.0, 1.0
+    while spend(upper) <= budget and any(upper * weight < high for weight in weights.values() if weight > 0):
+        lower, upper = upper, upper * 2
+    for _ in range(100):
+        middle = (lower + upper) / 2
+        if spend(middle) <= budget:
+            lower = middle
+        else:
+            upper = middle
+    scale = upper if spend(upper) <= budget else lower
+    return {key: min(max(scale * weight, low), high) for key, weight in weights.items()}
+
+
+class AdaptivePoller:
+    """按品种活跃度分配采集间隔：波动大、数值变化频繁的品种采集更快，平静的品种更慢
+
+    数据来自 QuoteStore 中每个品种最近 window 个数据点；总请求速率不超过各品种按固定间隔采集时之和。
+    """
+
+    def __init__(self, quotes, min_interval=POLL_MIN_INTERVAL, max_interval=POLL_MAX_INTERVAL, window=POLL_WINDOW):
+        self.quotes = quotes
+        self.min_interval = max(1, min_interval)
+        self.max_interval = max(self.min_interval, max_interval)
+        self.window = max(MIN_POINTS, window)
+
+    def intervals(self, base_intervals):
+        """base_intervals 为 {品种标识: 固定间隔秒数}（当前开盘的品种），返回 {品种标识: 间隔秒数}"""
+        budget = sum(1 / seconds for seconds in base_intervals.values())
+        weights, result = {}, {}
+        for key, seconds in base_intervals.items():
+            stats = activity(self.quotes.history(key, self.window))
+            if stats is None:
+                # 数据不足的品种保持固定间隔，占用相应的请求量
+                result[key] = min(max(seconds, self.min_interval), self.max_interval)
+                budget -= 1 / result[key]
+            else:
+                volatility, changes = stats
+                weights[key] = volatility * changes
+        # 数据不足的品种占用的请求量可能超过总量，剩余速率不能为负
+        budget = max(0.0, budget)
+        for key, rate in allocate(weights, budget, 1 / self.max_interval, 1 / self.min_interval).items():
+            result[key] = 1 / rate
+        for key, seconds in result.items():
+            POLL_INTERVAL_SECONDS.set(round(seconds, 1), key=key)
+        return result
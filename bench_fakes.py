@@ -0,0 +1,241 @@
+"""基准测试用的离线替身：合成行情数据、进程内的 MySQL 连接和接收 line protocol 的本地 HTTP 服务
+
+只供 benchmark.py 使用，不依赖网络和真实数据库。
+"""
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+
+# yfinance 的 interval / period 与 pandas 频率、天数的对应关系
+INTERVAL_FREQ = {
+    '1m': '1min', '2m': '2min', '5m': '5min', '15m': '15min', '30m': '30min',
+    '60m': '1h', '90m': '90min', '1h': '1h', '1d': '1D', '5d': '5D', '1wk': '7D', '1mo': '30D',
+}
+PERIOD_DAYS = {'1d': 1, '2d': 2, '5d': 5, '1mo': 30, '3mo': 90, '6mo': 180, '1y': 365, '2y': 730, '5y': 1825}
+PRICE_COLUMNS = ['Close', 'High', 'Low', 'Open', 'Volume']
+
+
+def _mix(values):
+    """splitmix64 整数散列，向量化计算，结果只取决于输入值"""
+    z = values.astype('uint64') + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def _uniform(seed, keys):
+    """由 (seed, key) 得到 [0, 1) 的伪随机数"""
+    with np.errstate(over='ignore'):
+        return (_mix(keys ^ np.uint64(seed)) >> np.uint64(11)).astype('float64') / float(1 << 53)
+
+
+def synthetic_bars(symbol, index):
+    """生成一个代码在给定时间索引上的 OHLCV
+
+    价格由代码决定的基准价叠加多个周期的波动和逐根噪声，同一代码同一时刻的值总是相同，
+    与请求的区间和粒度无关，重复运行的结果可以直接比较。
+    """
+    seed = zlib.crc32(symbol.encode('utf-8'))
+    seconds = index.asi8 // 10**9
+    keys = seconds.astype('uint64')
+    base = 1 + (seed % 100000) / 10.0 if not symbol.endswith('=X') else 0.5 + (seed % 2000) / 100.0
+    phase = (seed % 997) / 997 * 2 * np.pi
+    years = seconds / (365.25 * 86400)
+    trend = 1 + 0.15 * np.sin(2 * np.pi * years / 3 + phase) + 0.05 * np.sin(2 * np.pi * years * 12 + phase)
+    noise = (_uniform(seed, keys) - 0.5) * 0.004
+    close = base * trend * (1 + noise)
+    open_ = close * (1 + (_uniform(seed + 1, keys) - 0.5) * 0.002)
+    high = np.maximum(open_, close) * (1 + _uniform(seed + 2, keys) * 0.001)
+    low = np.minimum(open_, close) * (1 - _uniform(seed + 3, keys) * 0.001)
+    volume = 0 if symbol.endswith('=X') else (_uniform(seed + 4, keys) * 1e6).astype('int64')
+    return pd.DataFrame(
+        {'Close': close, 'High': high, 'Low': low, 'Open': open_, 'Volume': volume},
+        index=index
+    )
+
+
+def _timestamp(value):
+    value = pd.Timestamp(value)
+    return value.tz_localize('UTC') if value.tzinfo is None else value.tz_convert('UTC')
+
+
+def synthetic_download(tickers, start=None, end=None, period=None, interval='1d', group_by='column',
+                       progress=False, ignore_tz=None, **kwargs):
+    """yf.download 的离线替身，返回与 yfinance 相同结构的 DataFrame
+
+    单个代码 (str) 返回 (Price, Ticker) 多级列；多个代码时 group_by='ticker' 返回 (Ticker, Price)，
+    否则返回 (Price, Ticker)。只生成工作日的K线，ignore_tz=True 时索引不带时区。
+    """
+    single = isinstance(tickers, str)
+    symbols = [tickers] if single else list(tickers)
+    freq = INTERVAL_FREQ.get(interval, '1D')
+    end = _timestamp(end) if end is not None else pd.Timestamp.now(tz='UTC')
+    days = None
+    if start is not None:
+        start = _timestamp(start)
+    else:
+        # period 按交易日计算：周末请求 period='1d' 时返回上一个交易日的数据
+        days = PERIOD_DAYS.get(period or '1mo', 30)
+        start = end - pd.Timedelta(days=days + 2 * (days // 5 + 2))
+    index = pd.date_range(start.ceil(freq), end, freq=freq, inclusive='left', name='Datetime')
+    index = index[index.dayofweek < 5]
+    if days is not None:
+        index = index[index.normalize().isin(index.normalize().unique()[-days:])]
+    if ignore_tz:
+        index = index.tz_localize(None)
+
+    frames = {symbol: synthetic_bars(symbol, index) for symbol in symbols}
+    if group_by == 'ticker' and not single:
+        data = pd.concat(frames, axis=1, names=['Ticker', 'Price'])
+    else:
+        data = pd.concat(frames, axis=1, names=['Ticker', 'Price']).swaplevel(axis=1)
+        data = data.reindex(columns=pd.MultiIndex.from_product([PRICE_COLUMNS, symbols], names=['Price', 'Ticker']))
+    return data
+
+
+class FakeDatabase:
+    """进程内的 MySQL 替身：只统计写入的语句和行数，可为每条语句和每行附加模拟延迟"""
+
+    def __init__(self, statement_latency=0.0, row_latency=0.0):
+        self.statement_latency = statement_latency
+        self.row_latency = row_latency
+        self.rows = {}
+        self.staged = {}
+        self.statements = 0
+        self.commits = 0
+        self._lastrowid = 0
+        self._lock = threading.Lock()
+
+    def execute(self, query, params):
+        match = re.match(r'\s*INSERT\s+(?:IGNORE\s+)?INTO\s+(\w+)\s*\(([^)]*)\)', query, re.IGNORECASE)
+        load = re.match(r'\s*LOAD\s+DATA\s+LOCAL\s+INFILE\s+%s\s+INTO\s+TABLE\s+(\w+)', query, re.IGNORECASE)
+        merge = re.search(r'\)\s*SELECT\s.*?\sFROM\s+(\w+)', query, re.IGNORECASE | re.DOTALL)
+        rows = 0
+        if load:
+            # 批量装载：统计文件行数，合并进目标表时计入写入行数
+            with open(params[0], encoding='utf-8') as f:
+                rows = sum(1 for _ in f)
+            with self._lock:
+                self.staged[load.group(1)] = self.staged.get(load.group(1), 0) + rows
+        elif match and merge:
+            with self._lock:
+                rows = self.staged.pop(merge.group(1), 0)
+        elif match and params:
+            rows = len(params) // (match.group(2).count(',') + 1)
+        with self._lock:
+            self.statements += 1
+            self._lastrowid += 1
+            if match:
+                self.rows[match.group(1)] = self.rows.get(match.group(1), 0) + rows
+            lastrowid = self._lastrowid
+        delay = self.statement_latency + self.row_latency * rows
+        if delay:
+            time.sleep(delay)
+        return rows, lastrowid
+
+    def commit(self):
+        with self._lock:
+            self.commits += 1
+
+    def total_rows(self):
+        with self._lock:
+            return sum(self.rows.values())
+
+    def connect(self, **kwargs):
+        return FakeConnection(self)
+
+    def pool(self, pool_name=None, pool_size=5, **kwargs):
+        return FakePool(self)
+
+
+class FakeCursor:
+    def __init__(self, database):
+        self.database = database
+        self.rowcount = 0
+        self.lastrowid = None
+
+    def execute(self, query, params=()):
+        self.rowcount, self.lastrowid = self.database.execute(query, params)
+
+    def fetchall(self):
+        return []
+
+    def fetchone(self):
+        return (None, None)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, database):
+        self.database = database
+
+    def cursor(self):
+        return FakeCursor(self.database)
+
+    def ping(self, reconnect=False):
+        pass
+
+    def commit(self):
+        self.database.commit()
+
+    def rollback(self):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+
+class FakePool:
+    def __init__(self, database):
+        self.database = database
+
+    def get_connection(self):
+        return FakeConnection(self.database)
+
+
+class LineProtocolServer:
+    """接收 InfluxDB v2 写入请求 (POST /api/v2/write) 的本地 HTTP 服务，只统计收到的行数"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.lines = 0
+        self.requests = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if self.headers.get('Content-Encoding') == 'gzip':
+                    body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+                with server._lock:
+                    server.requests += 1
+                    server.bytes += len(body)
+                    server.lines += sum(1 for line in body.splitlines() if line.strip())
+                self.send_response(204)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://{host}:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, name='line-protocol-server', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,294 @@
+"""离线基准测试：用合成行情替代 yfinance，用进程内替身替代 MySQL、本地 HTTP 服务替代 InfluxDB，
+测量历史导入和实时采集在不同品种数量下的吞吐量、各阶段耗时和内存峰值。
+
+    python benchmark.py                          # 导入 + 实时采集，10/100/1000 个品种
+    python benchmark.py --scenarios live --sizes 10 100 --cycles 5
+    python benchmark.py --history-days 365 --mysql-latency-ms 2 --output bench_output.txt
+    python benchmark.py --scenarios live --no-batch --fetch-latency-ms 200 --collect-async
+    python benchmark.py --scenarios import --bulk-load --mysql-row-latency-us 5
+
+每个 (场景, 品种数) 在独立子进程中运行：配置在导入时从环境变量读取，子进程之间内存峰值互不影响。
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+SCENARIOS = ('import', 'live')
+
+
+class StageTimer:
+    """记录各阶段每次调用的耗时"""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, owner, name, stage=None):
+        """替换 owner 上的函数或方法，调用时记录耗时"""
+        function = getattr(owner, name)
+        stage = stage or name
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - started)
+
+        setattr(owner, name, timed)
+
+    def summary(self):
+        result = {}
+        for stage, samples in self.samples.items():
+            ordered = sorted(samples)
+            result[stage] = {
+                'calls': len(ordered),
+                'total': sum(ordered),
+                'p50': ordered[len(ordered) // 2],
+                'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+                'max': ordered[-1],
+            }
+        return result
+
+
+class SleepRecorder:
+    """替换模块中的 time：sleep 只记录时长不真正等待，其余属性转给 time 模块"""
+
+    def __init__(self):
+        self.slept = 0.0
+        self.calls = 0
+
+    def sleep(self, seconds):
+        self.slept += seconds
+        self.calls += 1
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+def peak_rss_mb():
+    """进程的常驻内存峰值 (MB)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def bench_environment(symbols, history_days, influx_url, batch=True, collect_async=False, bulk_load=False):
+    """生成 symbols 个品种的配置：1 个美元指数，约一半货币，其余为美股代码"""
+    currencies = [f"C{i:03d}" for i in range(max(0, symbols // 2))]
+    stocks = [f"S{i:04d}" for i in range(max(0, symbols - len(currencies) - 1))]
+    return {
+        'USE_MYSQL': 'true',
+        'USE_INFLUXDB': 'true' if influx_url else 'false',
+        'INFLUXDB_URL': influx_url or '',
+        'INFLUXDB_TOKEN': 'benchmark',
+        'CURRENCIES': json.dumps(currencies),
+        'STOCKS': json.dumps({'US': stocks}),
+        'HISTORY_START_DATE': (date.today() - timedelta(days=history_days)).isoformat(),
+        'IMPORT_MODE': 'full',
+        'IMPORT_BULK_LOAD': 'true' if bulk_load else 'false',
+        'UPSTREAM_RATE_LIMIT': '0',
+        'BATCH_FETCH_ENABLED': 'true' if batch else 'false',
+        'COLLECT_ASYNC_ENABLED': 'true' if collect_async else 'false',
+        'SCHEDULER_ENABLED': 'false',
+        'SPOOL_ENABLED': 'false',
+        'CACHE_ENABLED': 'false',
+        'API_ENABLED': 'false',
+        'ROLLUP_ENABLED': 'false',
+        'CROSS_RATES_ENABLED': 'false',
+        'SYMBOL_CACHE_FILE': '',
+    }
+
+
+def install_fakes(database, fetch_latency=0.0):
+    """把 yfinance 和 mysql.connector 的入口替换为离线替身，fetch_latency 为模拟的每次上游请求延迟（秒）"""
+    import mysql.connector
+    from mysql.connector import pooling
+    import yfinance
+    from bench_fakes import synthetic_download
+
+    def download(*args, **kwargs):
+        if fetch_latency:
+            time.sleep(fetch_latency)
+        return synthetic_download(*args, **kwargs)
+
+    yfinance.download = download
+    mysql.connector.connect = database.connect
+    pooling.MySQLConnectionPool = database.pool
+
+
+def run_import(timer, args):
+    import historical_data_importer
+    import import_pipeline
+
+    importer = historical_data_importer.HistoricalDataImporter()
+    sleeps = SleepRecorder()
+    historical_data_importer.time = sleeps
+    timer.wrap(importer, 'get_historical_data', 'fetch')
+    timer.wrap(import_pipeline, 'normalize_bars', 'normalize')
+    timer.wrap(importer, 'write_bars', 'write')
+
+    started = time.perf_counter()
+    importer.run()
+    elapsed = time.perf_counter() - started
+    if importer.use_mysql:
+        importer.mysql_sink.close()
+        importer.mysql_sink = None
+    importer.influx_sink = None
+    return {'elapsed': elapsed, 'cycles': 1, 'sleep': sleeps.slept}
+
+
+def run_live(timer, args):
+    import market_data_collector
+
+    collector = market_data_collector.MarketDataCollector()
+    sleeps = SleepRecorder()
+    market_data_collector.time = sleeps
+    timer.wrap(collector, 'get_latest_data_batch', 'prefetch')
+    timer.wrap(collector, 'get_latest_data', 'fetch')
+    timer.wrap(collector, 'write_point', 'write_point')
+
+    instruments = collector.get_instruments()
+    started = time.perf_counter()
+    for _ in range(args.cycles):
+        cycle_started = time.perf_counter()
+        collector.collect(instruments)
+        timer.record('cycle', time.perf_counter() - cycle_started)
+    flush_started = time.perf_counter()
+    collector.cleanup()
+    timer.record('flush', time.perf_counter() - flush_started)
+    return {'elapsed': time.perf_counter() - started, 'cycles': args.cycles, 'sleep': sleeps.slept}
+
+
+def run_child(args):
+    """子进程：准备替身和环境变量后运行一个场景，结果以一行 JSON 输出到 stdout"""
+    logging.basicConfig(level=getattr(logging, args.log_level), stream=sys.stderr)
+    from bench_fakes import FakeDatabase, LineProtocolServer
+
+    try:
+        import influxdb_client  # noqa: F401
+        influx = None if args.no_influxdb else LineProtocolServer()
+    except ImportError:
+        influx = None
+    os.environ.update(bench_environment(
+        args.symbols, args.history_days, influx.url if influx else None, not args.no_batch, args.collect_async, args.bulk_load
+    ))
+
+    database = FakeDatabase(args.mysql_latency_ms / 1000, args.mysql_row_latency_us / 1e6)
+    install_fakes(database, args.fetch_latency_ms / 1000)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    timer = StageTimer()
+    result = (run_import if args.run == 'import' else run_live)(timer, args)
+    traced_peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024 if args.tracemalloc else None
+    if influx:
+        influx.stop()
+
+    rows = database.total_rows()
+    result.update({
+        'scenario': args.run,
+        'symbols': args.symbols,
+        'mysql_rows': rows,
+        'mysql_statements': database.statements,
+        'influx_lines': influx.lines if influx else None,
+        'rows_per_second': rows / result['elapsed'] if result['elapsed'] else 0.0,
+        'stages': timer.summary(),
+        'peak_rss_mb': peak_rss_mb(),
+        'peak_traced_mb': traced_peak,
+    })
+    print(json.dumps(result))
+
+
+def format_report(results):
+    lines = []
+    for result in results:
+        influx = '-' if result['influx_lines'] is None else result['influx_lines']
+        traced = '' if result['peak_traced_mb'] is None else f", Python 分配峰值 {result['peak_traced_mb']:.1f} MB"
+        lines.append(
+            f"[{result['scenario']} x {result['symbols']}] 耗时 {result['elapsed']:.2f}s "
+            f"({result['cycles']} 轮), MySQL {result['mysql_rows']} 行 / {result['mysql_statements']} 条语句, "
+            f"InfluxDB {influx} 行, {result['rows_per_second']:.0f} 行/秒, "
+            f"跳过等待 {result['sleep']:.1f}s, 内存峰值 {result['peak_rss_mb'] or 0:.1f} MB{traced}"
+        )
+        lines.append(f"    {'阶段':<12}{'次数':>8}{'合计(s)':>12}{'p50(ms)':>12}{'p95(ms)':>12}{'max(ms)':>12}")
+        for stage, stats in result['stages'].items():
+            lines.append(
+                f"    {stage:<12}{stats['calls']:>8}{stats['total']:>12.3f}"
+                f"{stats['p50'] * 1000:>12.2f}{stats['p95'] * 1000:>12.2f}{stats['max'] * 1000:>12.2f}"
+            )
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='离线基准测试：历史导入与实时采集')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[10, 100, 1000], help='品种数量')
+    parser.add_argument('--history-days', type=int, default=3 * 365, help='历史导入的天数')
+    parser.add_argument('--cycles', type=int, default=3, help='实时采集的轮数')
+    parser.add_argument('--mysql-latency-ms', type=float, default=0.0, help='模拟每条 SQL 语句的延迟')
+    parser.add_argument('--mysql-row-latency-us', type=float, default=0.0, help='模拟每行写入的延迟')
+    parser.add_argument('--fetch-latency-ms', type=float, default=0.0, help='模拟每次上游请求的延迟')
+    parser.add_argument('--no-batch', action='store_true', help='实时采集不使用批量预取，逐个品种请求')
+    parser.add_argument('--collect-async', action='store_true', help='实时采集使用并发模式')
+    parser.add_argument('--bulk-load', action='store_true', help='历史导入使用 LOAD DATA 批量装载')
+    parser.add_argument('--no-influxdb', action='store_true', help='不启动 InfluxDB 替身')
+    parser.add_argument('--tracemalloc', action='store_true', help='同时统计 Python 分配峰值（会明显变慢）')
+    parser.add_argument('--log-level', default='WARNING', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+    parser.add_argument('--output', help='报告同时写入该文件')
+    parser.add_argument('--json', action='store_true', help='输出 JSON 而不是表格')
+    parser.add_argument('--run', choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument('--symbols', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_child(args)
+        return
+
+    results = []
+    passthrough = [
+        '--history-days', str(args.history_days), '--cycles', str(args.cycles),
+        '--mysql-latency-ms', str(args.mysql_latency_ms), '--mysql-row-latency-us', str(args.mysql_row_latency_us),
+        '--fetch-latency-ms', str(args.fetch_latency_ms),
+        *(['--no-batch'] if args.no_batch else []),
+        *(['--collect-async'] if args.collect_async else []),
+        *(['--bulk-load'] if args.bulk_load else []),
+        '--log-level', args.log_level,
+        *(['--no-influxdb'] if args.no_influxdb else []),
+        *(['--tracemalloc'] if args.tracemalloc else []),
+    ]
+    for scenario in args.scenarios:
+        for size in args.sizes:
+            print(f"运行 {scenario} x {size} ...", file=sys.stderr)
+            completed = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--run', scenario, '--symbols', str(size), *passthrough],
+                stdout=subprocess.PIPE, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+            )
+            if completed.returncode != 0:
+                print(f"{scenario} x {size} 运行失败 (退出码 {completed.returncode})", file=sys.stderr)
+                continue
+            results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    report = json.dumps(results, indent=2) if args.json else format_report(results)
+    print(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report + '\n')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime
+import mysql.connector
+import numpy as np
+import pandas as pd
+from config import (
+    MYSQL_CONFIG, MYSQL_ON_DUPLICATE, MYSQL_SCHEMA, IMPORT_BULK_LOAD_ROWS, IMPORT_BULK_LOAD_DIR
+)
+from compact_schema import COMPACT_MEASUREMENTS, VALUES_TABLE, VALUE_COLUMNS, SeriesRegistry, to_compact_rows
+from mysql_sink import MySQLSink
+from metrics import ROWS_WRITTEN, WRITE_FAILURES, WRITE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def format_field(value):
+    """TSV 中的一个字段：NULL 写为 \\N，时间写为 DATETIME 格式，文本转义制表符、换行和反斜杠"""
+    if value is None or value != value:  # NaN 视为 NULL
+        return '\\N'
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, float):
+        return repr(value)
+    if isinstance(value, str):
+        return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+    return str(value)
+
+
+def format_column(values):
+    """按列格式化：时间列整列转换，数值列直接转换，标签列（同一数据段内基本不变）按值缓存"""
+    sample = next((value for value in values if value is not None), None)
+    if isinstance(sample, datetime):
+        index = pd.DatetimeIndex(values)
+        if index.tz is not None:
+            # 保留所在时区的时间，与 mysql.connector 写入 DATETIME 的方式一致
+            index = index.tz_localize(None)
+        return np.datetime_as_string(index.values.astype('datetime64[s]')).tolist()
+    if isinstance(sample, float):
+        return ['\\N' if value is None or value != value else repr(value) for value in values]
+    if isinstance(sample, int):
+        return ['\\N' if value is None else str(value) for value in values]
+    formatted = {}
+    return [formatted[value] if value in formatted else formatted.setdefault(value, format_field(value)) for value in values]
+
+
+def build_merge_query(table, staging, columns, update_columns=(), on_duplicate='update'):
+    """把暂存表一次性合并进目标表，重复数据由目标表的唯一键去重"""
+    column_list = ', '.join(columns)
+    select = f"SELECT {column_list} FROM {staging}"
+    if on_duplicate == 'ignore' or not update_columns:
+        return f"INSERT IGNORE INTO {table} ({column_list}) {select}"
+    updates = ', '.join(f"{column} = VALUES({column})" for column in update_columns)
+    return f"INSERT INTO {table} ({column_list}) {select} ON DUPLICATE KEY UPDATE {updates}"
+
+
+class BulkLoader:
+    """MySQL 批量装载，接口与 MySQLSink.write_rows 相同，可直接作为导入写入线程的 sink
+
+    行先追加到每张表一个的本地 TSV 临时文件，攒够 rows_per_load 行后 LOAD DATA LOCAL INFILE
+    到没有任何索引的临时暂存表，再用一条 INSERT ... SELECT 合并进目标表，省去逐条语句的解析开销。
+    服务器未开启 local_infile 时退回多行 INSERT。
+
+    数据在装载后才提交，导入进度通过 after_load() 登记，所在的临时文件装载成功后才记录；
+    任何一次装载失败后不再记录进度，下次增量导入从失败前的位置重新开始。
+    """
+
+    def __init__(self, rows_per_load=IMPORT_BULK_LOAD_ROWS, directory=IMPORT_BULK_LOAD_DIR,
+                 on_duplicate=MYSQL_ON_DUPLICATE, schema=MYSQL_SCHEMA):
+        self.rows_per_load = max(1, rows_per_load)
+        self.directory = directory
+        self.on_duplicate = on_duplicate
+        self.compact = schema == 'compact'
+        self.series = SeriesRegistry()
+        self.db = mysql.connector.connect(**MYSQL_CONFIG, allow_local_infile=True)
+        self.cursor = self.db.cursor()
+        self.failed = False
+        self._buffers = {}
+        # 服务器不允许 LOAD DATA LOCAL 时，在同一连接上改用多行 INSERT
+        self.fallback = None if self.local_infile_enabled() else MySQLSink(connection=self.db)
+
+    def local_infile_enabled(self):
+        try:
+            self.cursor.execute("SHOW VARIABLES LIKE 'local_infile'")
+            rows = self.cursor.fetchall()
+        except mysql.connector.Error as e:
+            logger.warning(f"无法读取 local_infile 设置，仍尝试批量装载: {e}")
+            return True
+        if rows and rows[0][1] is not None and str(rows[0][1]).upper() in ('OFF', '0'):
+            logger.warning("MySQL 未开启 local_infile，批量装载退回多行 INSERT（可执行 SET GLOBAL local_infile = 1）")
+            return False
+        return True
+
+    def write_rows(self, table, columns, rows, update_columns=()):
+        """追加到表的临时文件，攒够 rows_per_load 行时装载，返回接收的行数"""
+        if not rows:
+            return 0
+        if self.fallback:
+            return self.fallback.write_rows(table, columns, rows, update_columns)
+
+        measurement = table
+        if self.compact and table in COMPACT_MEASUREMENTS:
+            # 先登记序列并提交，文件中只保存 series_id
+            rows = to_compact_rows(self.cursor, self.series, table, columns, rows)
+            self.db.commit()
+            table, columns, update_columns = VALUES_TABLE, VALUE_COLUMNS, ('value', 'volume')
+
+        buffer = self._buffers.get(table)
+        if buffer is None:
+            handle = tempfile.NamedTemporaryFile(
+                'w', encoding='utf-8', newline='\n', suffix=f'.{table}.tsv', dir=self.directory, delete=False
+            )
+            buffer = self._buffers[table] = {
+                'file': handle, 'columns': tuple(columns), 'update_columns': tuple(update_columns),
+                'measurements': set(), 'rows': 0, 'callbacks': [],
+            }
+        if tuple(columns) != buffer['columns']:
+            raise ValueError(f"{table} 的列与已缓冲的数据不一致: {columns}")
+        fields = [format_column(values) for values in zip(*rows)]
+        buffer['file'].writelines('\t'.join(row) + '\n' for row in zip(*fields))
+        buffer['measurements'].add(measurement)
+        buffer['rows'] += len(rows)
+        if buffer['rows'] >= self.rows_per_load:
+            self.load(table)
+        return len(rows)
+
+    def after_load(self, measurement, callback):
+        """登记在该 measurement 已缓冲的数据装载成功后执行的回调（如记录导入进度），已经装载时立即执行"""
+        if self.failed:
+            return
+        table = VALUES_TABLE if self.compact and measurement in COMPACT_MEASUREMENTS else measurement
+        buffer = self._buffers.get(table)
+        if buffer is None or self.fallback:
+            callback()
+        else:
+            buffer['callbacks'].append(callback)
+
+    def load(self, table):
+        """装载一张表的临时文件：LOAD DATA 到暂存表，合并进目标表后提交"""
+        buffer = self._buffers.pop(table)
+        buffer['file'].close()
+        path = buffer['file'].name
+        columns = ', '.join(buffer['columns'])
+        staging = f"staging_{table}"
+        started = time.perf_counter()
+        try:
+            self.db.ping(reconnect=True)
+            # 临时表只属于当前连接，不带索引和自增列，连接断开后自动删除
+            self.cursor.execute(f"CREATE TEMPORARY TABLE IF NOT EXISTS {staging} AS SELECT {columns} FROM {table} LIMIT 0")
+            self.cursor.execute(
+                f"LOAD DATA LOCAL INFILE %s INTO TABLE {staging} "
+                f"FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' ({columns})",
+                (path,)
+            )
+            self.cursor.execute(build_merge_query(
+                table, staging, buffer['columns'], buffer['update_columns'], self.on_duplicate
+            ))
+            self.cursor.execute(f"TRUNCATE TABLE {staging}")
+            self.db.commit()
+        except mysql.connector.Error as e:
+            logger.error(f"批量装载 {table} 失败 ({buffer['rows']} 行)，之后不再记录导入进度: {e}")
+            WRITE_FAILURES.inc(buffer['rows'], sink='mysql')
+            self.failed = True
+            self.series.clear()
+            try:
+                self.db.rollback()
+            except mysql.connector.Error:
+                pass
+            raise
+        finally:
+            WRITE_SECONDS.observe(time.perf_counter() - started, sink='mysql', stage='flush')
+            os.unlink(path)
+
+        logger.info(f"已批量装载 {table}: {buffer['rows']} 行, 耗时 {time.perf_counter() - started:.1f} 秒")
+        ROWS_WRITTEN.inc(buffer['rows'], sink='mysql', table='/'.join(sorted(buffer['measurements'])))
+        for callback in buffer['callbacks']:
+            callback()
+
+    def flush(self):
+        """装载所有表的剩余数据，某张表失败时继续装载其他表"""
+        for table in list(self._buffers):
+            try:
+                self.load(table)
+            except mysql.connector.Error:
+                pass
+
+    def close(self):
+        """装载剩余数据后关闭连接"""
+        try:
+            self.flush()
+        finally:
+            if self.cursor:
+                self.cursor.close()
+                self.cursor = None
+            if self.db:
+                self.db.close()
+                self.db = None
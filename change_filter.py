@@ -0,0 +1,91 @@
+import logging
+import threading
+from config import WRITE_DEADBAND, WRITE_DEADBANDS, WRITE_DEADBAND_MAX_AGE
+from compact_schema import COMPACT_MEASUREMENTS
+from quote_store import quote_key
+from metrics import POINTS_SUPPRESSED
+
+logger = logging.getLogger(__name__)
+
+
+def _naive(timestamp):
+    """去掉时区，与 MySQL DATETIME 中保存的时间一致，便于和启动时读取的记录比较"""
+    return timestamp.replace(tzinfo=None) if getattr(timestamp, 'tzinfo', None) else timestamp
+
+
+class ChangeFilter:
+    """写入前的去重：记住每个序列最后写入的数据点，跳过没有变化的数据点
+
+    - 时间戳与最后写入的相同且数值相同：休市时每轮采集都会拿到同一根K线，直接跳过；
+    - 时间戳更新、数值相对最后写入值的变化不超过死区（WRITE_DEADBAND，按比例）：跳过，
+      但距最后写入超过 max_age 秒（按数据时间戳）时仍写入一次；
+    - 早于最后写入的数据点（如补采历史数据）不受影响。
+    """
+
+    def __init__(self, deadband=WRITE_DEADBAND, deadbands=WRITE_DEADBANDS, max_age=WRITE_DEADBAND_MAX_AGE):
+        self.deadband = deadband
+        self.deadbands = deadbands
+        self.max_age = max_age
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def remember(self, measurement, key, timestamp, fields):
+        """记录一个序列最后写入的数据点"""
+        with self._lock:
+            self._last[(measurement, key)] = (_naive(timestamp), dict(fields))
+
+    def forget(self, measurement, tags):
+        """数据点没有写入成功时清除记录"""
+        with self._lock:
+            self._last.pop((measurement, quote_key(measurement, tags)), None)
+
+    def seed(self, sink, measurements=COMPACT_MEASUREMENTS):
+        """从数据库读取每个序列最新的一行，重启后第一轮采集也能去重"""
+        for measurement, spec in measurements.items():
+            fields = tuple(field for field in (spec['value'], spec['volume']) if field)
+            try:
+                latest = sink.latest_rows(measurement, spec['keys'], fields)
+            except Exception as e:
+                logger.warning(f"读取 {measurement} 最新数据失败，该表从空缓存开始去重: {e}")
+                continue
+            for keys, (timestamp, values) in latest.items():
+                tags = dict(zip(spec['keys'], keys))
+                values = {
+                    field: None if value is None else int(value) if field == spec['volume'] else float(value)
+                    for field, value in zip(fields, values)
+                }
+                self.remember(measurement, quote_key(measurement, tags), timestamp, values)
+        logger.info(f"写入去重已载入 {len(self._last)} 个序列的最新数据")
+
+    def admit(self, measurement, tags, fields, timestamp):
+        """判断数据点是否需要写入，需要时记为该序列最后写入的数据点"""
+        key = quote_key(measurement, tags)
+        timestamp = _naive(timestamp)
+        with self._lock:
+            last = self._last.get((measurement, key))
+            if last is not None:
+                reason = self._suppress_reason(measurement, key, last, fields, timestamp)
+                if reason:
+                    POINTS_SUPPRESSED.inc(measurement=measurement, reason=reason)
+                    return False
+                if timestamp < last[0]:
+                    return True
+            self._last[(measurement, key)] = (timestamp, dict(fields))
+        return True
+
+    def _suppress_reason(self, measurement, key, last, fields, timestamp):
+        last_timestamp, last_fields = last
+        if timestamp == last_timestamp:
+            return 'duplicate' if fields == last_fields else None
+        deadband = self.deadbands.get(key, self.deadband)
+        if deadband <= 0 or timestamp < last_timestamp:
+            return None
+        if (timestamp - last_timestamp).total_seconds() >= self.max_age:
+            return None
+        value_field = COMPACT_MEASUREMENTS.get(measurement, {}).get('value')
+        value, last_value = fields.get(value_field), last_fields.get(value_field)
+        if value is None or last_value is None:
+            return None
+        if abs(value - last_value) <= deadband * abs(last_value):
+            return 'deadband'
+        return None
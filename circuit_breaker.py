@@ -0,0 +1,94 @@
+import logging
+import threading
+import time
+from config import CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_OPEN_SECONDS, CIRCUIT_MAX_OPEN_SECONDS
+from http_api import json_response
+from metrics import CIRCUIT_STATE
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# 写入 market_data_circuit_state 指标的数值
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    """每个上游代码一个熔断器，长期失败的代码不再拖慢其他品种
+
+    - closed：正常请求；连续 threshold 次获取失败（每次含全部重试）后进入 open；
+    - open：隔离期内直接跳过，不请求上游也不等待；
+    - half_open：隔离期满后只放行一次单次请求探测，成功回到 closed，失败重新隔离，隔离期翻倍，
+      最长 max_open 秒。探测进行中其他调用方仍按 open 跳过。
+    """
+
+    def __init__(self, threshold=CIRCUIT_FAILURE_THRESHOLD, open_seconds=CIRCUIT_OPEN_SECONDS,
+                 max_open=CIRCUIT_MAX_OPEN_SECONDS):
+        self.threshold = max(1, threshold)
+        self.open_seconds = open_seconds
+        self.max_open = max(open_seconds, max_open)
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, symbol):
+        """请求前调用，返回 closed（正常请求）、half_open（只请求一次）或 open（跳过）"""
+        with self._lock:
+            circuit = self._circuits.get(symbol)
+            if circuit is None or circuit['state'] == CLOSED:
+                return CLOSED
+            if circuit['state'] == OPEN and time.time() >= circuit['retry_at']:
+                self._transition(symbol, circuit, HALF_OPEN)
+                return HALF_OPEN
+            return OPEN
+
+    def is_open(self, symbol):
+        """是否处于隔离期（不改变状态）"""
+        with self._lock:
+            circuit = self._circuits.get(symbol)
+            return circuit is not None and circuit['state'] == OPEN and time.time() < circuit['retry_at']
+
+    def success(self, symbol):
+        with self._lock:
+            circuit = self._circuits.get(symbol)
+            if circuit is None:
+                return
+            if circuit['state'] != CLOSED:
+                logger.info(f"{symbol} 探测成功，恢复正常采集（此前隔离 {circuit['open_seconds']:.0f} 秒）")
+            del self._circuits[symbol]
+            CIRCUIT_STATE.set(STATE_VALUES[CLOSED], symbol=symbol)
+
+    def failure(self, symbol):
+        with self._lock:
+            circuit = self._circuits.setdefault(
+                symbol, {'state': CLOSED, 'failures': 0, 'open_seconds': 0, 'retry_at': None, 'since': time.time()}
+            )
+            circuit['failures'] += 1
+            if circuit['state'] == HALF_OPEN:
+                circuit['open_seconds'] = min(circuit['open_seconds'] * 2, self.max_open)
+            elif circuit['state'] == CLOSED and circuit['failures'] >= self.threshold:
+                circuit['open_seconds'] = self.open_seconds
+            else:
+                return
+            circuit['retry_at'] = time.time() + circuit['open_seconds']
+            self._transition(symbol, circuit, OPEN)
+            logger.warning(
+                f"{symbol} 连续失败 {circuit['failures']} 次，隔离 {circuit['open_seconds']:.0f} 秒后再探测"
+            )
+
+    def _transition(self, symbol, circuit, state):
+        """切换状态（调用方持有锁）"""
+        circuit['state'] = state
+        circuit['since'] = time.time()
+        CIRCUIT_STATE.set(STATE_VALUES[state], symbol=symbol)
+
+    def snapshot(self):
+        """所有不处于正常状态的代码: {symbol: {state, failures, open_seconds, retry_at, since}}"""
+        with self._lock:
+            return {symbol: dict(circuit) for symbol, circuit in self._circuits.items() if circuit['failures']}
+
+
+def handle_circuits(breaker, request):
+    """GET /circuits  失败中或被隔离的上游代码及其熔断状态"""
+    return json_response(request, breaker.snapshot())
@@ -0,0 +1,110 @@
+from datetime import date
+
+# 紧凑表结构：series 维度表保存每个序列的标签，series_values 以 (series_id, timestamp) 为主键，
+# InnoDB 按主键聚簇存储，同一序列的数据物理上连续，按时间范围读取单个序列只需顺序扫描
+SERIES_TABLE = 'series'
+VALUES_TABLE = 'series_values'
+VALUE_COLUMNS = ('series_id', 'timestamp', 'value', 'volume')
+
+# series 表中的标签列
+SERIES_COLUMNS = ('from_currency', 'to_currency', 'market', 'symbol', 'currency')
+
+# 各 measurement 的映射：keys 标识序列，attributes 为序列的属性，value/volume 为数值列
+COMPACT_MEASUREMENTS = {
+    'usd_index': {'keys': (), 'attributes': (), 'value': 'value', 'volume': None},
+    'exchange_rates': {'keys': ('from_currency', 'to_currency'), 'attributes': (), 'value': 'rate', 'volume': None},
+    'cross_rates': {'keys': ('from_currency', 'to_currency'), 'attributes': (), 'value': 'rate', 'volume': None},
+    'stock_prices': {'keys': ('market', 'symbol'), 'attributes': ('currency',), 'value': 'price', 'volume': 'volume'},
+}
+
+CREATE_SERIES_TABLE = """
+CREATE TABLE IF NOT EXISTS series (
+    series_id INT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    measurement VARCHAR(32) NOT NULL,
+    series_key VARCHAR(64) NOT NULL,
+    from_currency VARCHAR(10),
+    to_currency VARCHAR(10),
+    market VARCHAR(10),
+    symbol VARCHAR(20),
+    currency VARCHAR(10),
+    UNIQUE KEY uk_measurement_series_key (measurement, series_key)
+) ENGINE=InnoDB
+"""
+
+CREATE_VALUES_TABLE = """
+CREATE TABLE IF NOT EXISTS series_values (
+    series_id INT UNSIGNED NOT NULL,
+    timestamp DATETIME NOT NULL,
+    value DECIMAL(20, 6) NOT NULL,
+    volume BIGINT,
+    PRIMARY KEY (series_id, timestamp)
+) ENGINE=InnoDB
+"""
+
+REGISTER_SERIES_QUERY = (
+    "INSERT INTO series (measurement, series_key, " + ', '.join(SERIES_COLUMNS) + ") "
+    "VALUES (%s, %s, " + ', '.join(['%s'] * len(SERIES_COLUMNS)) + ") "
+    "ON DUPLICATE KEY UPDATE series_id = LAST_INSERT_ID(series_id), currency = COALESCE(VALUES(currency), currency)"
+)
+
+
+def series_key(key_values):
+    """序列标识，与迁移时 SQL 中的 CONCAT_WS(':', ...) 保持一致"""
+    return ':'.join(str(value) for value in key_values)
+
+
+class SeriesRegistry:
+    """series 维度表的本地缓存：(measurement, series_key) -> series_id，缺少的序列自动登记"""
+
+    def __init__(self):
+        self._ids = {}
+
+    def resolve(self, cursor, measurement, values):
+        """values 为包含标签列的字典，返回 series_id"""
+        spec = COMPACT_MEASUREMENTS[measurement]
+        key = (measurement, series_key(values[column] for column in spec['keys']))
+        if key not in self._ids:
+            tags = {column: values.get(column) for column in spec['keys'] + spec['attributes']}
+            cursor.execute(REGISTER_SERIES_QUERY, (*key, *(tags.get(column) for column in SERIES_COLUMNS)))
+            self._ids[key] = cursor.lastrowid
+        return self._ids[key]
+
+    def clear(self):
+        """事务回滚后清空缓存，避免引用未提交的序列"""
+        self._ids.clear()
+
+
+def to_compact_rows(cursor, registry, measurement, columns, rows):
+    """把旧表结构的行转换为 series_values 的行: (series_id, timestamp, value, volume)"""
+    spec = COMPACT_MEASUREMENTS[measurement]
+    compact_rows = []
+    for row in rows:
+        values = dict(zip(columns, row))
+        compact_rows.append((
+            registry.resolve(cursor, measurement, values),
+            values['timestamp'],
+            values[spec['value']],
+            values.get(spec['volume']) if spec['volume'] else None
+        ))
+    return compact_rows
+
+
+def month_partitions(first_month, last_month):
+    """返回 [first_month, last_month] 每个月的分区: (分区名, 上界日期)"""
+    partitions = []
+    year, month = first_month.year, first_month.month
+    while (year, month) <= (last_month.year, last_month.month):
+        upper = date(year + month // 12, month % 12 + 1, 1)
+        partitions.append((f"p{year:04d}{month:02d}", upper))
+        year, month = upper.year, upper.month
+    return partitions
+
+
+def partition_definitions(partitions):
+    """按月 RANGE 分区定义，最后附加 MAXVALUE 分区"""
+    definitions = [
+        f"PARTITION {name} VALUES LESS THAN (TO_DAYS('{upper.isoformat()}'))"
+        for name, upper in partitions
+    ]
+    definitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    return ',\n    '.join(definitions)
@@ -9,6 +9,20 @@ MYSQL_CONFIG = {
     'database': os.environ.get('DB_NAME', 'market_data')
 }
 
+# MySQL批量写入配置：每条多行INSERT的行数，以及重复数据的处理方式 (update/ignore)
+MYSQL_BATCH_SIZE = int(os.environ.get('MYSQL_BATCH_SIZE', 1000))
+MYSQL_ON_DUPLICATE = os.environ.get('MYSQL_ON_DUPLICATE', 'update').lower()
+# 表结构: legacy 为 schema.sql 中的宽表; compact 为 series 维度表 + 以 (series_id, timestamp) 为主键的 series_values
+MYSQL_SCHEMA = os.environ.get('MYSQL_SCHEMA', 'legacy').lower()
+# 写入原始数据后增量维护 1h/1d/1w OHLC 汇总表（首次启用前执行 python rollup.py rebuild）
+ROLLUP_ENABLED = os.environ.get('ROLLUP_ENABLED', 'false').lower() == 'true'
+
+# 实时采集的MySQL写入线程：采集线程把数据放入有界队列，写入线程从连接池取连接批量写入
+MYSQL_WRITER_THREADS = int(os.environ.get('MYSQL_WRITER_THREADS', 2))
+MYSQL_WRITE_QUEUE_SIZE = int(os.environ.get('MYSQL_WRITE_QUEUE_SIZE', 10000))
+# 队列满时采集线程最多等待多少秒，超时后丢弃该数据点
+MYSQL_WRITE_TIMEOUT = float(os.environ.get('MYSQL_WRITE_TIMEOUT', 30))
+
 # 数据库开关
 USE_MYSQL = os.environ.get('USE_MYSQL', 'true').lower() == 'true'
 USE_INFLUXDB = os.environ.get('USE_INFLUXDB', 'false').lower() == 'true'
@@ -21,12 +35,46 @@ INFLUXDB_CONFIG = {
     'bucket': os.environ.get('INFLUXDB_BUCKET', 'rate')
 }
 
-# 从环境变量获取货币配置，默认值使用JSON格式
+# InfluxDB批量写入配置（时间单位: 毫秒）
+INFLUXDB_WRITE_OPTIONS = {
+    'batch_size': int(os.environ.get('INFLUXDB_BATCH_SIZE', 5000)),
+    'flush_interval': int(os.environ.get('INFLUXDB_FLUSH_INTERVAL', 1000)),
+    'retry_interval': int(os.environ.get('INFLUXDB_RETRY_INTERVAL', 5000)),
+    'max_retries': int(os.environ.get('INFLUXDB_MAX_RETRIES', 5)),
+    'max_retry_delay': int(os.environ.get('INFLUXDB_MAX_RETRY_DELAY', 30000)),
+    'exponential_base': float(os.environ.get('INFLUXDB_EXPONENTIAL_BASE', 2.0)),
+    # 缓冲区上限（字节，按 line protocol 计），满时最多等待 buffer_timeout 毫秒，仍然满则丢弃该数据点
+    'max_buffer_bytes': int(os.environ.get('INFLUXDB_MAX_BUFFER_MB', 64)) * 1024 * 1024,
+    'buffer_timeout': int(os.environ.get('INFLUXDB_BUFFER_TIMEOUT', 0))
+}
+
+# 本地写入日志 (spool)：实时数据先追加到本地分段日志，再由后台线程写入各数据库，数据库故障时不丢数据
+SPOOL_ENABLED = os.environ.get('SPOOL_ENABLED', 'false').lower() == 'true'
+SPOOL_DIR = os.environ.get('SPOOL_DIR', 'spool')
+# 单个日志分段的大小上限
+SPOOL_SEGMENT_BYTES = int(os.environ.get('SPOOL_SEGMENT_MB', 16)) * 1024 * 1024
+# 每追加多少条或间隔多少秒执行一次 fsync
+SPOOL_FSYNC_BATCH = int(os.environ.get('SPOOL_FSYNC_BATCH', 100))
+SPOOL_FSYNC_INTERVAL = float(os.environ.get('SPOOL_FSYNC_INTERVAL', 1.0))
+# 每次回放给数据库的条数，以及数据库故障时重试间隔的上限（秒）
+SPOOL_DRAIN_BATCH = int(os.environ.get('SPOOL_DRAIN_BATCH', 500))
+SPOOL_MAX_RETRY_DELAY = float(os.environ.get('SPOOL_MAX_RETRY_DELAY', 60))
+
+# 内嵌 HTTP 接口：/quotes 提供内存中的最新行情
+API_ENABLED = os.environ.get('API_ENABLED', 'false').lower() == 'true'
+API_HOST = os.environ.get('API_HOST', '0.0.0.0')
+API_PORT = int(os.environ.get('API_PORT', 8080))
+# 每个品种在内存中保留的最近数据点数
+QUOTE_BUFFER_SIZE = int(os.environ.get('QUOTE_BUFFER_SIZE', 500))
+# 运行指标：/metrics 提供 Prometheus 格式的指标（需启用 API_ENABLED），每隔多少秒在日志中输出一行汇总，0 为不输出
+METRICS_SUMMARY_INTERVAL = int(os.environ.get('METRICS_SUMMARY_INTERVAL', 300))
+
+# 从环境变量获取货币配置，默认值使用JSON格式；JSON 配置为空字符串（如 docker-compose 中未设置）时使用默认值
 DEFAULT_CURRENCIES = [
     'CNH', 'CNY', 'HKD', 'JPY', 'KRW',
     'SGD', 'RUB', 'TWD', 'AUD', 'GBP', 'EUR'
 ]
-CURRENCIES = json.loads(os.environ.get('CURRENCIES', json.dumps(DEFAULT_CURRENCIES)))
+CURRENCIES = json.loads(os.environ.get('CURRENCIES') or json.dumps(DEFAULT_CURRENCIES))
 
 # 从环境变量获取股票配置
 DEFAULT_STOCKS = {
@@ -38,12 +86,107 @@ DEFAULT_STOCKS = {
         '899050.BJ'    # 北证50
     ]
 }
-STOCKS = json.loads(os.environ.get('STOCKS', json.dumps(DEFAULT_STOCKS)))
+STOCKS = json.loads(os.environ.get('STOCKS') or json.dumps(DEFAULT_STOCKS))
+
+# 上游代码候选 (JSON格式)：键为品种标识（usd_index、USD/CNH、HK:^HSI），值为按优先级排列的 yfinance 代码，
+# 与默认值合并；未配置的品种：美元指数用 EURUSD=X，货币用 USDxxx=X，股票指数直接使用 STOCKS 中的代码
+DEFAULT_SYMBOL_CANDIDATES = {
+    'USD/CNH': ['USDCNH=X', 'CNH=F', 'CNHUSD=X'],
+}
+SYMBOL_CANDIDATES = {**DEFAULT_SYMBOL_CANDIDATES, **json.loads(os.environ.get('SYMBOL_CANDIDATES') or '{}')}
+# 记住每个品种上一次成功的代码，只有它失败时才重新探测；记录的有效期（秒）
+SYMBOL_CACHE_FILE = os.environ.get('SYMBOL_CACHE_FILE', 'symbol_cache.json')
+SYMBOL_CACHE_TTL = int(os.environ.get('SYMBOL_CACHE_TTL', 86400))
+
+# 交叉汇率：由本轮获取的 USD 汇率推导非 USD 货币对（如 CNY/JPY），作为派生序列写入 cross_rates
+CROSS_RATES_ENABLED = os.environ.get('CROSS_RATES_ENABLED', 'false').lower() == 'true'
+CROSS_RATE_CURRENCIES = json.loads(os.environ.get('CROSS_RATE_CURRENCIES') or json.dumps(CURRENCIES))
+# 对齐时间前超过多少秒没有数据的汇率不参与计算
+CROSS_RATE_MAX_SKEW = int(os.environ.get('CROSS_RATE_MAX_SKEW', 900))
+
+# 写入去重：记住每个序列最后写入的数据点（启动时从 MySQL 读取），时间戳和数值都没变的数据点不再写入
+CHANGE_FILTER_ENABLED = os.environ.get('CHANGE_FILTER_ENABLED', 'true').lower() == 'true'
+# 死区：新时间戳的数值相对上次写入值的变化不超过该比例时也不写入，0 为关闭；按品种标识覆盖 (JSON格式)
+WRITE_DEADBAND = float(os.environ.get('WRITE_DEADBAND', 0))
+WRITE_DEADBANDS = json.loads(os.environ.get('WRITE_DEADBANDS') or '{}')
+# 死区内的数据点最多间隔多少秒（按数据时间戳）仍写入一次，避免序列长时间没有数据
+WRITE_DEADBAND_MAX_AGE = int(os.environ.get('WRITE_DEADBAND_MAX_AGE', 3600))
 
 # 其他配置
 FETCH_INTERVAL = int(os.environ.get('FETCH_INTERVAL', 3600))
+
+# 交易时段调度：每个品种按自己的间隔采集，休市时跳过，收盘后补采一次
+SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', 'false').lower() == 'true'
+# 单个品种的采集间隔（秒），键为 usd_index、USD/JPY、US:^DJI 这样的品种标识，未配置的使用 FETCH_INTERVAL
+SYMBOL_FETCH_INTERVALS = json.loads(os.environ.get('SYMBOL_FETCH_INTERVALS') or '{}')
+# 收盘后等待多久（秒）再补采最后一次，等待上游数据到齐
+SCHEDULE_CLOSE_GRACE = int(os.environ.get('SCHEDULE_CLOSE_GRACE', 300))
+# 自适应采集间隔（需启用 SCHEDULER_ENABLED）：按各品种最近 POLL_WINDOW 个数据点的实现波动率和变化频率
+# 分配请求，总请求量不超过固定间隔时的水平，单个品种的间隔在 POLL_MIN_INTERVAL 和 POLL_MAX_INTERVAL 秒之间
+ADAPTIVE_POLLING_ENABLED = os.environ.get('ADAPTIVE_POLLING_ENABLED', 'false').lower() == 'true'
+POLL_MIN_INTERVAL = int(os.environ.get('POLL_MIN_INTERVAL', 60))
+POLL_MAX_INTERVAL = int(os.environ.get('POLL_MAX_INTERVAL', 3600))
+POLL_WINDOW = int(os.environ.get('POLL_WINDOW', 30))
+# 各市场节假日 (JSON格式)，例如 {"US": ["2026-12-25"], "CN": ["2026-10-01"]}，市场: US/HK/CN/FX
+MARKET_HOLIDAYS = json.loads(os.environ.get('MARKET_HOLIDAYS') or '{}')
+# 批量获取：按 (period, interval) 分组，每组一次多代码请求
+BATCH_FETCH_ENABLED = os.environ.get('BATCH_FETCH_ENABLED', 'false').lower() == 'true'
+# 并发采集：每轮中逐个品种的请求作为 asyncio 任务并发执行，阻塞的上游请求在线程池中运行，
+# 最多 COLLECT_CONCURRENCY 个同时进行，请求速率受 UPSTREAM_RATE_LIMIT 限制
+COLLECT_ASYNC_ENABLED = os.environ.get('COLLECT_ASYNC_ENABLED', 'false').lower() == 'true'
+COLLECT_CONCURRENCY = int(os.environ.get('COLLECT_CONCURRENCY', 8))
+# 单个品种的超时（秒），超时的品种本轮记为失败，不再等待
+COLLECT_TASK_TIMEOUT = float(os.environ.get('COLLECT_TASK_TIMEOUT', 120))
+# 熔断：上游代码连续获取失败 CIRCUIT_FAILURE_THRESHOLD 次后隔离 CIRCUIT_OPEN_SECONDS 秒，期间直接跳过；
+# 隔离期满后只发一次请求探测，探测失败隔离期翻倍，最长 CIRCUIT_MAX_OPEN_SECONDS 秒
+CIRCUIT_BREAKER_ENABLED = os.environ.get('CIRCUIT_BREAKER_ENABLED', 'true').lower() == 'true'
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 2))
+CIRCUIT_OPEN_SECONDS = int(os.environ.get('CIRCUIT_OPEN_SECONDS', 300))
+CIRCUIT_MAX_OPEN_SECONDS = int(os.environ.get('CIRCUIT_MAX_OPEN_SECONDS', 21600))
 HISTORY_START_DATE = os.environ.get('HISTORY_START_DATE', '2017-07-01')
 
+# 历史导入模式: full 从 HISTORY_START_DATE 全量导入; incremental 只导入每个序列最新数据之后的部分
+IMPORT_MODE = os.environ.get('IMPORT_MODE', 'full').lower()
+# 导入进度文件，增量模式下每完成一个数据段记录一次，中断后从这里继续
+IMPORT_STATE_FILE = os.environ.get('IMPORT_STATE_FILE', 'import_state.json')
+# 增量导入的起点: progress 只按导入进度文件; database 同时参考数据库中每个序列的最新时间戳
+# （包括实时采集写入的数据，采集过但从未导入或有缺口的序列会被视为已是最新）
+IMPORT_WATERMARK = os.environ.get('IMPORT_WATERMARK', 'progress').lower()
+
+# 并行导入配置：获取线程数、写入线程数、写入队列长度（按时间窗口计）
+IMPORT_WORKERS = int(os.environ.get('IMPORT_WORKERS', 4))
+IMPORT_WRITERS = int(os.environ.get('IMPORT_WRITERS', 1))
+IMPORT_WRITE_QUEUE_SIZE = int(os.environ.get('IMPORT_WRITE_QUEUE_SIZE', 16))
+# 流式导入：每个数据段按时间窗口切分，每个窗口最多约 IMPORT_WINDOW_ROWS 根K线（1m 约 7 天，与上游单次请求上限一致）
+IMPORT_WINDOW_ROWS = int(os.environ.get('IMPORT_WINDOW_ROWS', 10000))
+# 已获取、尚未写完的在途数据的内存上限，达到上限时获取线程等待写入线程
+IMPORT_MEMORY_LIMIT_BYTES = int(os.environ.get('IMPORT_MEMORY_LIMIT_MB', 256)) * 1024 * 1024
+# 批量装载：写入线程把数据追加到本地 TSV 临时文件，每攒够 IMPORT_BULK_LOAD_ROWS 行执行一次 LOAD DATA LOCAL INFILE
+# 到暂存表，再合并进目标表（需要 MySQL 开启 local_infile），适合新环境首次导入多年数据
+IMPORT_BULK_LOAD = os.environ.get('IMPORT_BULK_LOAD', 'false').lower() == 'true'
+IMPORT_BULK_LOAD_ROWS = int(os.environ.get('IMPORT_BULK_LOAD_ROWS', 500000))
+# 临时文件目录，默认使用系统临时目录
+IMPORT_BULK_LOAD_DIR = os.environ.get('IMPORT_BULK_LOAD_DIR') or None
+
+# 上游请求限速（令牌桶）：平均每秒请求数和允许的突发请求数，所有线程共享
+UPSTREAM_RATE_LIMIT = float(os.environ.get('UPSTREAM_RATE_LIMIT', 1.0))
+UPSTREAM_BURST = int(os.environ.get('UPSTREAM_BURST', 5))
+
+# 下载缓存：历史K线以 Parquet 格式缓存在本地（需要 pyarrow），已收盘的区间永不过期
+CACHE_ENABLED = os.environ.get('CACHE_ENABLED', 'false').lower() == 'true'
+CACHE_DIR = os.environ.get('CACHE_DIR', 'cache')
+# 包含最近数据的区间的有效期（秒）
+CACHE_TTL = int(os.environ.get('CACHE_TTL', 900))
+# 结束时间早于多少秒前的区间视为已收盘
+CACHE_CLOSED_AFTER = int(os.environ.get('CACHE_CLOSED_AFTER', 86400))
+# 缓存总大小上限，超出后按最近使用时间淘汰
+CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_MB', 1024)) * 1024 * 1024
+
+# 进度日志：导入和采集按间隔（秒）输出一行汇总；逐行明细默认只在 DEBUG 级别输出，
+# LOG_DETAIL_SAMPLE=N 时每 N 条明细以 INFO 输出一条
+PROGRESS_LOG_INTERVAL = float(os.environ.get('PROGRESS_LOG_INTERVAL', 10))
+LOG_DETAIL_SAMPLE = int(os.environ.get('LOG_DETAIL_SAMPLE', 0))
+
 # 添加历史数据配置
 HISTORY_FETCH_ENABLED = os.environ.get('HISTORY_FETCH_ENABLED', 'false').lower() == 'true'
 
@@ -0,0 +1,81 @@
+import bisect
+import logging
+from datetime import datetime, timedelta
+import numpy as np
+from config import CROSS_RATE_MAX_SKEW
+from normalization import COLLECTOR_ROUNDING, round_decimal_array
+
+logger = logging.getLogger(__name__)
+
+
+def cross_rate_matrix(usd_rates):
+    """由 USD 对各货币的汇率计算完整的交叉汇率矩阵
+
+    usd_rates[i] 为 1 USD 可兑换的货币 i 数量，返回 matrix[i, j] 为 1 单位货币 i 可兑换的货币 j 数量。
+    """
+    rates = np.asarray(usd_rates, dtype='float64')
+    return rates[np.newaxis, :] / rates[:, np.newaxis]
+
+
+def value_at(history, timestamp):
+    """history 为按时间升序的 [(timestamp, value)]，返回 timestamp 时刻（含）之前最后一个值"""
+    index = bisect.bisect_right([point[0] for point in history], timestamp)
+    return history[index - 1] if index else None
+
+
+class CrossRateEngine:
+    """由本轮已获取的 USD 汇率推导非 USD 货币对，不再额外请求上游
+
+    各条 USD 汇率的最新时间不同，以其中最新的时间作为对齐时间，每条汇率取该时刻（含）之前的最后一个值；
+    比对齐时间早 max_skew 秒以上的汇率视为过期（如已休市或本轮获取失败），不参与计算。
+    """
+
+    def __init__(self, currencies, max_skew=CROSS_RATE_MAX_SKEW, rounding=COLLECTOR_ROUNDING):
+        self.currencies = list(dict.fromkeys(currencies))
+        self.max_skew = timedelta(seconds=max_skew)
+        self.rounding = rounding
+
+    def align(self, histories):
+        """对齐各条 USD 汇率，返回 (对齐时间, {货币: 汇率})"""
+        histories = {currency: history for currency, history in histories.items() if history}
+        if len(histories) < 2:
+            return None, {}
+
+        aligned_at = max(history[-1][0] for history in histories.values())
+        legs = {}
+        for currency, history in histories.items():
+            point = value_at(history, aligned_at)
+            if point is None or aligned_at - point[0] > self.max_skew:
+                logger.debug(f"USD/{currency} 在 {aligned_at} 前 {self.max_skew} 内没有数据，不参与交叉汇率计算")
+                continue
+            if point[1] and np.isfinite(point[1]):
+                legs[currency] = point[1]
+        return aligned_at, legs
+
+    def compute(self, histories):
+        """histories 为 {货币: [(timestamp, USD汇率)]}，返回 (对齐时间, [(from, to, rate)])，不含 USD 本身参与的货币对"""
+        aligned_at, legs = self.align(histories)
+        currencies = [currency for currency in self.currencies if currency in legs and currency != 'USD']
+        if len(currencies) < 2:
+            return aligned_at, []
+
+        matrix = cross_rate_matrix([legs[currency] for currency in currencies])
+        rounded = round_decimal_array(matrix.ravel(), **self.rounding).reshape(matrix.shape)
+        rows, columns = np.nonzero(~np.eye(len(currencies), dtype=bool) & np.isfinite(rounded))
+        return aligned_at, [
+            (currencies[i], currencies[j], float(rounded[i, j]))
+            for i, j in zip(rows, columns)
+        ]
+
+
+def quote_histories(store, currencies):
+    """从 QuoteStore 中取出各货币 USD 汇率的历史: {货币: [(timestamp, rate)]}"""
+    histories = {}
+    for currency in currencies:
+        points = store.history(f"USD/{currency}", store.size)
+        histories[currency] = [
+            (datetime.fromisoformat(point['timestamp']), point['rate'])
+            for point in points
+            if point.get('rate') is not None
+        ]
+    return histories
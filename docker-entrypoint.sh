@@ -7,6 +7,11 @@ do
     sleep 1
 done
 
+# 一次性运行：采集一轮后退出，不导入历史数据
+if [ "$1" = "--once" ]; then
+    exec python market_data_collector.py --once
+fi
+
 # 根据环境变量决定是否导入历史数据
 if [ "$IMPORT_HISTORY" = "true" ]; then
     echo "Importing historical data..."
@@ -0,0 +1,195 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+import pandas as pd
+from config import CACHE_DIR, CACHE_TTL, CACHE_MAX_BYTES, CACHE_CLOSED_AFTER
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = 'index.json'
+
+
+def to_naive_local(value):
+    """时间统一转换为本地无时区时间，便于比较"""
+    value = pd.Timestamp(value)
+    if value.tzinfo is not None:
+        value = value.tz_convert(datetime.now().astimezone().tzinfo).tz_localize(None)
+    return value
+
+
+def slice_range(data, start, end):
+    """按 [start, end) 截取数据，与 yf.download 的区间语义一致"""
+    index = data.index
+    if index.tz is not None:
+        local_tz = datetime.now().astimezone().tzinfo
+        start = pd.Timestamp(start).tz_localize(local_tz) if pd.Timestamp(start).tzinfo is None else pd.Timestamp(start)
+        end = pd.Timestamp(end).tz_localize(local_tz) if pd.Timestamp(end).tzinfo is None else pd.Timestamp(end)
+    else:
+        start, end = to_naive_local(start), to_naive_local(end)
+    return data[(index >= start) & (index < end)]
+
+
+class DownloadCache:
+    """上游下载结果的本地 Parquet 缓存，按 代码/周期/时区模式/时间范围 存储
+
+    读取时用一个或多个相邻的条目拼接出请求的时间范围，完整覆盖时命中。
+    时区模式（ignore_tz）不同的数据不会互相命中：历史导入保存交易所本地时间的无时区数据，实时采集保存带时区的数据。
+
+    结束时间早于 now - CACHE_CLOSED_AFTER 的区间视为已收盘，数据不会再变化，永不过期；
+    包含最近时间的区间在 CACHE_TTL 秒后过期。总大小超过 CACHE_MAX_BYTES 时按最近使用时间淘汰。
+    需要安装 pyarrow，未安装时缓存自动停用。
+    """
+
+    def __init__(self, directory=CACHE_DIR, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES,
+                 closed_after=CACHE_CLOSED_AFTER):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.closed_after = timedelta(seconds=closed_after)
+        self._lock = threading.Lock()
+        self.entries = {}
+        self.enabled = True
+
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            logger.warning("未安装 pyarrow，下载缓存已停用")
+            self.enabled = False
+            return
+
+        os.makedirs(directory, exist_ok=True)
+        index_path = os.path.join(directory, INDEX_FILE)
+        if os.path.exists(index_path):
+            try:
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error(f"读取缓存索引失败，将重建缓存: {e}")
+        # 没有记录时区模式的旧条目无法判断能否命中，直接删除
+        for key in [key for key, entry in self.entries.items() if 'ignore_tz' not in entry]:
+            self._remove(key)
+        logger.info(f"下载缓存: {len(self.entries)} 个文件, {self.total_bytes() / 1024 / 1024:.1f} MB ({directory})")
+
+    def total_bytes(self):
+        return sum(entry['size'] for entry in self.entries.values())
+
+    def _key(self, symbol, interval, start, end, ignore_tz):
+        raw = f"{symbol}|{interval}|{int(ignore_tz)}|{to_naive_local(start).isoformat()}|{to_naive_local(end).isoformat()}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _is_fresh(self, entry, now):
+        return entry['closed'] or now - entry['created'] < self.ttl
+
+    def _cover(self, symbol, interval, ignore_tz, start, end, now):
+        """选出拼接起来完整覆盖 [start, end) 的一组未过期条目（start、end 为本地时间的 ISO 字符串），覆盖不了时返回 None"""
+        entries = [
+            entry for entry in self.entries.values()
+            if entry['symbol'] == symbol and entry['interval'] == interval and entry['ignore_tz'] == ignore_tz
+            and entry['start'] < end and entry['end'] > start and self._is_fresh(entry, now)
+        ]
+        chosen, cursor = [], start
+        while cursor < end:
+            best = None
+            for entry in entries:
+                if entry['start'] <= cursor < entry['end'] and (best is None or entry['end'] > best['end']):
+                    best = entry
+            if best is None:
+                return None
+            chosen.append(best)
+            cursor = best['end']
+        return chosen
+
+    def get(self, symbol, interval, start, end, ignore_tz=False):
+        """查找拼接起来完整覆盖 [start, end) 的缓存，命中时返回截取后的数据，否则返回 None"""
+        if not self.enabled:
+            return None
+
+        start_local, end_local = to_naive_local(start).isoformat(), to_naive_local(end).isoformat()
+        now = time.time()
+        with self._lock:
+            chosen = self._cover(symbol, interval, ignore_tz, start_local, end_local, now)
+            if not chosen:
+                return None
+            for entry in chosen:
+                entry['last_access'] = now
+
+        frames = []
+        for entry in chosen:
+            try:
+                frames.append(pd.read_parquet(os.path.join(self.directory, entry['file'])))
+            except Exception as e:
+                logger.error(f"读取缓存失败 {symbol} {interval}: {e}")
+                with self._lock:
+                    self._remove(entry['file'][:-len('.parquet')])
+                return None
+
+        data = frames[0] if len(frames) == 1 else pd.concat(frames)
+        if len(chosen) > 1 or chosen[0]['start'] != start_local or chosen[0]['end'] != end_local:
+            # 不是同一时间范围的下载结果，拼接后去掉条目间重叠的K线再截取
+            data = slice_range(data[~data.index.duplicated(keep='last')], start, end)
+        logger.debug(f"命中下载缓存: {symbol} {interval} {start} ~ {end} ({len(data)} 行, {len(chosen)} 个文件)")
+        return data
+
+    def put(self, symbol, interval, start, end, data, ignore_tz=False):
+        """保存一次下载结果，ignore_tz 与下载时传给 yf.download 的参数一致"""
+        if not self.enabled or data is None or data.empty:
+            return
+
+        key = self._key(symbol, interval, start, end, ignore_tz)
+        filename = f"{key}.parquet"
+        path = os.path.join(self.directory, filename)
+        try:
+            data.to_parquet(f"{path}.tmp")
+            os.replace(f"{path}.tmp", path)
+        except Exception as e:
+            logger.error(f"写入缓存失败 {symbol} {interval}: {e}")
+            return
+
+        now = time.time()
+        end_local = to_naive_local(end)
+        with self._lock:
+            self.entries[key] = {
+                'symbol': symbol,
+                'interval': interval,
+                'ignore_tz': ignore_tz,
+                'start': to_naive_local(start).isoformat(),
+                'end': end_local.isoformat(),
+                'closed': end_local <= datetime.now() - self.closed_after,
+                'created': now,
+                'last_access': now,
+                'size': os.path.getsize(path),
+                'file': filename,
+            }
+            self._evict(now)
+            self._save_index()
+
+    def _evict(self, now):
+        """删除过期条目，超出容量时按最近使用时间淘汰"""
+        for key, entry in list(self.entries.items()):
+            if not self._is_fresh(entry, now):
+                self._remove(key)
+
+        total = self.total_bytes()
+        for key, entry in sorted(self.entries.items(), key=lambda item: item[1]['last_access']):
+            if total <= self.max_bytes:
+                break
+            total -= entry['size']
+            self._remove(key)
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry:
+            try:
+                os.remove(os.path.join(self.directory, entry['file']))
+            except OSError:
+                pass
+
+    def _save_index(self):
+        index_path = os.path.join(self.directory, INDEX_FILE)
+        with open(f"{index_path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+        os.replace(f"{index_path}.tmp", index_path)
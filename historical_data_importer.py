@@ -1,323 +1,391 @@
-import yfinance as yf
-import mysql.connector
-from datetime import datetime, timedelta, timezone
+from startup import lazy_import, mark, startup_profile
+from datetime import datetime, timedelta
 import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
 from config import *
 import time
-from decimal import Decimal, ROUND_HALF_UP
+from normalization import IMPORTER_ROUNDING, round_decimal
+from influx_sink import InfluxSink
+from import_state import ImportState
+from rate_limiter import TokenBucket
+from progress import ProgressReporter
+from import_pipeline import MemoryBudget, period_start, split_windows, stream_bars
+from symbol_resolver import SymbolResolver
+from metrics import FETCH_FAILURES, FETCH_RETRIES, FETCH_SECONDS, WRITE_FAILURES, summary_line
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 各表的数值字段，第一个来自处理后的收盘价
+MEASUREMENT_FIELDS = {
+    'usd_index': ('value',),
+    'exchange_rates': ('rate',),
+    'stock_prices': ('price', 'volume'),
+}
+
 class HistoricalDataImporter:
     def __init__(self):
         # MySQL 初始化
         self.use_mysql = USE_MYSQL
         if self.use_mysql:
-            self.db = mysql.connector.connect(**MYSQL_CONFIG)
-            self.cursor = self.db.cursor()
+            self.mysql_sink = lazy_import('mysql_sink').MySQLSink()
         
         # InfluxDB 初始化
         self.use_influxdb = USE_INFLUXDB
         if self.use_influxdb:
-            from influxdb_client import InfluxDBClient
-            self.influx_client = InfluxDBClient(
-                url=INFLUXDB_CONFIG['url'],
-                token=INFLUXDB_CONFIG['token'],
-                org=INFLUXDB_CONFIG['org']
-            )
-            self.write_api = self.influx_client.write_api()
+            # 缓冲区满时写入线程等待发送，InfluxDB 比 MySQL 慢或在重试时，在途数据的内存仍有上限
+            self.influx_sink = InfluxSink(block=True)
 
         # 设置起始日期
         self.start_date = datetime.strptime(HISTORY_START_DATE, '%Y-%m-%d')
         self.end_date = datetime.now()
 
-    def round_decimal(self, value, places=4):
-        """智能四舍五入处理数值"""
-        try:
-            if isinstance(value, (float, int)):
-                value = str(value)
-            # 将数值转换为Decimal进行精确计算
-            dec = Decimal(value)
-            
-            # 处理接近整数的情况（如0.999999）
-            # 如果与最近的整数的差异小于0.0001，则取整
-            nearest_int = round(float(dec))
-            if abs(float(dec) - nearest_int) < 0.0001:
-                return float(Decimal(str(nearest_int)))
-            
-            # 其他情况正常四舍五入到指定位数
-            return float(dec.quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP))
-        except Exception as e:
-            logger.error(f"数值转换错误 {value}: {e}")
-            return value
+        # 增量模式：按每个序列已有的最新数据确定起点
+        self.incremental = IMPORT_MODE == 'incremental'
+        self.import_state = ImportState() if self.incremental else None
+        self.watermarks = {}
 
-    def safe_float(self, value):
-        """安全地将值转换为float"""
-        try:
-            if hasattr(value, 'iloc'):
-                return float(value.iloc[0])
-            return float(value)
-        except Exception as e:
-            logger.error(f"转换float失败: {e}")
-            return 0.0
+        # 所有获取线程共享的上游限速器
+        self.rate_limiter = TokenBucket(UPSTREAM_RATE_LIMIT, UPSTREAM_BURST)
+
+        # 本地下载缓存
+        self.download_cache = lazy_import('download_cache').DownloadCache() if CACHE_ENABLED else None
+
+        # 品种到上游代码的解析，与实时采集共用缓存文件
+        self.symbols = SymbolResolver()
+
+        # 导入进度汇总，每次 import_series_list 重新创建
+        self.progress = ProgressReporter('历史导入', log=logger)
+
+        # 在途数据（已获取、尚未写完的时间窗口）的内存上限
+        self.memory_budget = MemoryBudget()
+
+    def round_decimal(self, value, places=4):
+        """智能四舍五入处理数值：接近整数时取整，其余保留4位小数"""
+        return round_decimal(value, places=places, snap_steps=IMPORTER_ROUNDING['snap_steps'])
 
     def get_historical_data(self, symbol, start, end, interval, retries=3):
-        """获取历史数据，带重试机制"""
+        """获取历史数据，优先读取本地缓存，带重试机制"""
+        data = self.download_cache.get(symbol, interval, start, end, ignore_tz=True) if self.download_cache else None
+        if data is not None and not data.empty:
+            data.index = data.index.tz_localize('UTC')
+            return data
+        
         for attempt in range(retries):
+            if attempt:
+                FETCH_RETRIES.inc(operation='get_historical_data')
             try:
-                data = yf.download(
-                    symbol,
-                    start=start,
-                    end=end,
-                    interval=interval,
-                    progress=False,
-                    ignore_tz=True
-                )
+                self.rate_limiter.acquire()
+                with FETCH_SECONDS.time(operation='get_historical_data', symbol=symbol):
+                    data = lazy_import('yfinance').download(
+                        symbol,
+                        start=start,
+                        end=end,
+                        interval=interval,
+                        progress=False,
+                        ignore_tz=True
+                    )
                 if not data.empty:
+                    if self.download_cache:
+                        self.download_cache.put(symbol, interval, start, end, data, ignore_tz=True)
                     # 转换为UTC时间
                     data.index = data.index.tz_localize('UTC')
                     return data
             except Exception as e:
+                FETCH_FAILURES.inc(operation='get_historical_data')
                 logger.error(f"第{attempt + 1}次获取{symbol}数据失败: {e}")
                 if attempt < retries - 1:
                     time.sleep(5 * (attempt + 1))
         return None
 
-    def get_data_segments(self):
+    def write_mysql_rows(self, table, columns, rows, update_columns=(), mysql_sink=None):
+        """MySQL批量写入，失败时记录日志并继续后续数据段"""
+        if not self.use_mysql:
+            return 0
+        try:
+            return (mysql_sink or self.mysql_sink).write_rows(table, columns, rows, update_columns)
+        except Exception as e:
+            WRITE_FAILURES.inc(len(rows), sink='mysql')
+            logger.error(f"写入 {table} 失败，跳过该数据段: {e}")
+            return None
+
+    def load_watermarks(self):
+        """每张表一次查询，读取每个序列在数据库中的最新时间戳"""
+        if not self.use_mysql:
+            return
+        
+        tables = [
+            ('usd_index', (), lambda key: 'usd_index'),
+            ('exchange_rates', ('from_currency', 'to_currency'), lambda key: f"exchange_rates:{key[0]}/{key[1]}"),
+            ('stock_prices', ('market', 'symbol'), lambda key: f"stock_prices:{key[0]}:{key[1]}"),
+        ]
+        for table, key_columns, series_name in tables:
+            try:
+                for key, timestamp in self.mysql_sink.latest_timestamps(table, key_columns).items():
+                    # 与写入时一致：K线时间按交易所本地时间保存，去掉时区后直接比较
+                    self.watermarks[series_name(key)] = timestamp.replace(tzinfo=None)
+            except Exception as e:
+                logger.error(f"读取 {table} 最新时间戳失败: {e}")
+        logger.info(f"已读取 {len(self.watermarks)} 个序列的最新时间戳")
+
+    def get_series_start(self, series):
+        """返回序列本次导入的起点：全量模式为 HISTORY_START_DATE，增量模式取已有数据之后"""
+        if not self.incremental:
+            return self.start_date
+        candidates = [self.start_date, self.watermarks.get(series), self.import_state.get(series)]
+        return max(candidate for candidate in candidates if candidate is not None)
+
+    def mark_progress(self, series, timestamps):
+        """数据段写入成功后，把进度记录到该段最后一根K线（上游数据有延迟，不能直接用分段终点）"""
+        if self.import_state is None or len(timestamps) == 0:
+            return
+        # 与写入数据库的时间一致：只去掉时区标记，不做换算
+        self.import_state.mark(series, timestamps[-1].replace(tzinfo=None))
+
+    def get_data_segments(self, start_date=None):
         """根据时间跨度返回数据获取分段"""
+        start_date = start_date or self.start_date
         end_date = datetime.now()
         
-        # 计算时间段
-        recent_7d = end_date - timedelta(days=7)
-        recent_60d = end_date - timedelta(days=60)
+        # 计算时间段：分界对齐到日历周期的起点，重复导入时各数据段的窗口边界不变
+        recent_7d = period_start(end_date - timedelta(days=7), '1m')
+        recent_60d = period_start(end_date - timedelta(days=60), '1h')
         
         segments = []
         
         # 如果起始日期早于60天前，添加日级别数据段
-        if self.start_date < recent_60d:
-            segments.append((self.start_date, recent_60d, '1d'))
+        if start_date < recent_60d:
+            segments.append((start_date, recent_60d, '1d'))
         
         # 如果起始日期早于或在最近60天内，添加小时级别数据段
-        if self.start_date < recent_7d:
-            start = max(self.start_date, recent_60d)
+        if start_date < recent_7d:
+            start = max(start_date, recent_60d)
             segments.append((start, recent_7d, '1h'))
         
         # 如果起始日期早于或在最近7天内，添加分钟级别数据段
-        if self.start_date < end_date:
-            start = max(self.start_date, recent_7d)
+        if start_date < end_date:
+            start = max(start_date, recent_7d)
             segments.append((start, end_date, '1m'))
         
         return [(start, end, interval) for start, end, interval in segments if start < end]
 
-    def import_historical_exchange_rates(self):
-        """导入历史汇率数据"""
-        logger.info("开始导入历史汇率数据...")
-        segments = self.get_data_segments()
+    def get_series_specs(self):
+        """列出需要导入的所有序列：上游代码（按优先级排列的候选）、写入的表和标签"""
+        specs = [{
+            'series': 'usd_index',
+            'key': 'usd_index',
+            'label': '美元指数',
+            'measurement': 'usd_index',
+            'tags': {},
+            'transform': lambda eur_usd_rate: (1 / eur_usd_rate) * 88.3,  # 由 EUR/USD 换算
+        }]
         
         for currency in CURRENCIES:
+            specs.append({
+                'series': f"exchange_rates:USD/{currency}",
+                'key': f"USD/{currency}",
+                'label': f"USD/{currency}",
+                'measurement': 'exchange_rates',
+                'tags': {'from_currency': 'USD', 'to_currency': currency},
+            })
+        
+        for market, symbols in STOCKS.items():
+            for symbol in symbols:
+                specs.append({
+                    'series': f"stock_prices:{market}:{symbol}",
+                    'key': f"{market}:{symbol}",
+                    'label': f"{market}:{symbol}",
+                        'measurement': 'stock_prices',
+                    'tags': {
+                        'market': market,
+                        'symbol': symbol,
+                        'currency': 'USD' if market == 'US' else 'HKD' if market == 'HK' else 'CNY'
+                    },
+                })
+        return specs
+
+    def write_bars(self, spec, bars, interval, mysql_sink=None):
+        """写入一个数据段，返回MySQL写入行数，MySQL写入失败时返回 None"""
+        measurement = spec['measurement']
+        value_field, *extra_fields = MEASUREMENT_FIELDS[measurement]
+        tags = spec['tags']
+        timestamps = bars.index.to_pydatetime()
+        columns = [bars['value'].tolist()] + [bars[field].tolist() for field in extra_fields]
+        
+        # MySQL写入：整段一个事务，重复数据由唯一键去重
+        tag_values = tuple(tags.values())
+        written = self.write_mysql_rows(
+            measurement,
+            ('timestamp', *tags.keys(), value_field, *extra_fields),
+            [(timestamp, *tag_values, *values) for timestamp, *values in zip(timestamps, *columns)],
+            update_columns=(value_field, *extra_fields),
+            mysql_sink=mysql_sink
+        )
+        
+        # InfluxDB写入
+        if self.use_influxdb:
+            field_names = (value_field, *extra_fields)
+            for timestamp, *values in zip(timestamps, *columns):
+                self.influx_sink.write(measurement, tags, dict(zip(field_names, values)), timestamp)
+        
+        self.progress.detail("导入 %s %s 数据: %d 条", spec['label'], interval, len(timestamps))
+        return written
+
+    def fetch_window(self, spec, start, end, interval):
+        """获取一个时间窗口：每个窗口重新解析候选代码，首选代码按正常次数重试，其他候选只请求一次
+
+        换用其他候选成功时记录它，之后的窗口直接从它开始；所有候选都没有数据（如休市）时不视为代码失效。
+        """
+        self.progress.detail("获取 %s 从 %s 到 %s 的 %s 数据", spec['label'], start, end, interval)
+        for i, symbol in enumerate(self.symbols.candidates(spec['key'])):
+            data = self.get_historical_data(symbol, start, end, interval, retries=3 if i == 0 else 1)
+            if data is not None and not data.empty:
+                self.symbols.success(spec['key'], symbol)
+                return data
+        return None
+
+    def import_series(self, spec, write_queue):
+        """按时间窗口流式获取一个序列：fetch → normalize 逐个窗口进行，处理好的窗口交给写入线程"""
+        label = spec['label']
+        try:
+            segments = self.get_data_segments(self.get_series_start(spec['series']))
+            if not segments:
+                self.progress.detail("%s 已是最新，无需导入", label)
+                return
+            
+            windows = stream_bars(
+                partial(self.fetch_window, spec), segments,
+                transform=spec.get('transform'), budget=self.memory_budget
+            )
+            for interval, bars, reserved in windows:
+                if bars is None:
+                    logger.error(f"未能获取到 {label} 的 {interval} 数据")
+                # 缺口（bars 为 None）也交给写入线程，之后的窗口不再推进进度；队列已满时阻塞，等待写入线程
+                write_queue.put((spec, bars, interval, reserved))
+            
+            self.progress.detail("完成 %s 的历史数据获取", label)
+        except Exception as e:
+            self.progress.advance(spec['series'], errors=1, done=0)
+            logger.error(f"导入 {label} 失败: {e}")
+
+    def write_worker(self, write_queue, mysql_sink):
+        """写入线程：按入队顺序写入数据段并记录进度"""
+        broken_series = set()
+        while True:
+            job = write_queue.get()
+            if job is None:
+                break
+            spec, bars, interval, reserved = job
+            series = spec['series']
             try:
-                symbol = f'USD{currency}=X'
-                
-                # 对CNH特殊处理
-                if currency == 'CNH':
-                    symbols_to_try = ['USDCNH=X', 'CNH=F', 'CNHUSD=X']
-                else:
-                    symbols_to_try = [symbol]
-                
-                for segment_start, segment_end, interval in segments:
-                    logger.info(f"获取 {currency} 从 {segment_start} 到 {segment_end} 的 {interval} 数据")
-                    
-                    data = None
-                    for symbol_try in symbols_to_try:
-                        data = self.get_historical_data(symbol_try, segment_start, segment_end, interval)
-                        if data is not None and not data.empty:
-                            break
-                    
-                    if data is None or data.empty:
-                        logger.error(f"未能获取到 {currency} 的数据")
-                        continue
-                    
-                    for index, row in data.iterrows():
-                        try:
-                            timestamp = index.to_pydatetime()
-                            rate = self.round_decimal(self.safe_float(row['Close']))
-                            
-                            # MySQL写入
-                            if self.use_mysql:
-                                check_query = """SELECT id FROM exchange_rates 
-                                               WHERE timestamp = %s AND from_currency = %s 
-                                               AND to_currency = %s"""
-                                self.cursor.execute(check_query, (timestamp, 'USD', currency))
-                                if not self.cursor.fetchone():
-                                    query = """INSERT INTO exchange_rates 
-                                             (timestamp, from_currency, to_currency, rate) 
-                                             VALUES (%s, %s, %s, %s)"""
-                                    self.cursor.execute(query, (timestamp, 'USD', currency, rate))
-                                    self.db.commit()
-                            
-                            # InfluxDB写入
-                            if self.use_influxdb:
-                                from influxdb_client import Point
-                                point = Point("exchange_rates") \
-                                    .tag("from_currency", "USD") \
-                                    .tag("to_currency", currency) \
-                                    .field("rate", rate) \
-                                    .time(timestamp)
-                                self.write_api.write(bucket=INFLUXDB_CONFIG['bucket'], record=point)
-                            
-                            logger.info(f"导入汇率数据: {timestamp} USD/{currency} - {rate}")
-                            
-                        except Exception as e:
-                            logger.error(f"处理{currency}数据时出错: {e}")
-                            continue
-                    
-                    time.sleep(1)  # 短暂暂停避免请求过快
-                
-                logger.info(f"完成货币 {currency} 的历史数据导入")
-                time.sleep(2)  # 避免请求过于频繁
-                
+                written = None if bars is None else self.write_bars(spec, bars, interval, mysql_sink)
+                # 只有之前的数据段都成功时才推进进度，避免中断后跳过缺口
+                if written is None:
+                    broken_series.add(series)
+                elif series not in broken_series:
+                    timestamps = bars.index.to_pydatetime()[-1:]
+                    if hasattr(mysql_sink, 'after_load'):
+                        # 批量装载模式下数据装载提交后才记录进度
+                        mysql_sink.after_load(spec['measurement'], partial(self.mark_progress, series, timestamps))
+                    else:
+                        self.mark_progress(series, timestamps)
+                self.progress.advance(series, rows=0 if bars is None else len(bars), errors=int(written is None))
             except Exception as e:
-                logger.error(f"导入汇率数据失败 {currency}: {e}")
-                time.sleep(5)
+                broken_series.add(series)
+                self.progress.advance(series, errors=1)
+                logger.error(f"写入 {spec['label']} {interval} 数据失败: {e}")
+            finally:
+                self.memory_budget.release(reserved)
+
+    def import_series_list(self, specs):
+        """并行导入：每个序列一个任务，由 IMPORT_WORKERS 个线程获取数据，
+        经有界队列交给 IMPORT_WRITERS 个写入线程（同一序列固定由同一个写入线程处理）"""
+        writer_count = max(1, IMPORT_WRITERS)
+        total = sum(
+            len(split_windows(*segment))
+            for spec in specs
+            for segment in self.get_data_segments(self.get_series_start(spec['series']))
+        )
+        self.progress = ProgressReporter('历史导入', total=total, unit='个时间窗口', log=logger)
+        write_queues = [queue.Queue(maxsize=IMPORT_WRITE_QUEUE_SIZE) for _ in range(writer_count)]
+        
+        # 每个写入线程使用独立的MySQL连接；批量装载模式下每个写入线程一个 BulkLoader
+        mysql_sinks = [None] * writer_count
+        if self.use_mysql and IMPORT_BULK_LOAD:
+            mysql_sinks = [lazy_import('bulk_loader').BulkLoader() for _ in range(writer_count)]
+        elif self.use_mysql:
+            mysql_sinks = [self.mysql_sink] + [lazy_import('mysql_sink').MySQLSink() for _ in range(writer_count - 1)]
+        
+        writers = [
+            threading.Thread(target=self.write_worker, args=(write_queue, mysql_sink), name=f'import-writer-{i}')
+            for i, (write_queue, mysql_sink) in enumerate(zip(write_queues, mysql_sinks))
+        ]
+        for writer in writers:
+            writer.start()
+        
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, IMPORT_WORKERS), thread_name_prefix='import-fetch') as pool:
+                futures = [
+                    pool.submit(self.import_series, spec, write_queues[i % writer_count])
+                    for i, spec in enumerate(specs)
+                ]
+                for future in as_completed(futures):
+                    future.result()
+        finally:
+            for write_queue in write_queues:
+                write_queue.put(None)
+            for writer in writers:
+                writer.join()
+            for mysql_sink in mysql_sinks:
+                # 批量装载模式下 close() 会装载剩余数据
+                if mysql_sink is not None and mysql_sink is not self.mysql_sink:
+                    mysql_sink.close()
+            self.progress.finish()
+
+    def import_historical_exchange_rates(self):
+        """导入历史汇率数据"""
+        logger.info("开始导入历史汇率数据...")
+        self.import_series_list([spec for spec in self.get_series_specs() if spec['measurement'] == 'exchange_rates'])
 
     def import_historical_stock_prices(self):
         """导入历史股票数据"""
         logger.info("开始导入历史股票数据...")
-        segments = self.get_data_segments()
-        
-        for market, symbols in STOCKS.items():
-            for symbol in symbols:
-                try:
-                    # 修正股票代码格式
-                    if market == 'HK':
-                        yf_symbol = "^HSI"
-                    elif market == 'CN':
-                        yf_symbol = symbol
-                    else:
-                        yf_symbol = symbol
-                    
-                    for segment_start, segment_end, interval in segments:
-                        logger.info(f"获取 {market}:{symbol} 从 {segment_start} 到 {segment_end} 的 {interval} 数据")
-                        data = self.get_historical_data(yf_symbol, segment_start, segment_end, interval)
-                        
-                        if data is None or data.empty:
-                            logger.error(f"未能获取到 {market}:{symbol} 的数据")
-                            continue
-                        
-                        currency = 'USD' if market == 'US' else 'HKD' if market == 'HK' else 'CNY'
-                        
-                        for index, row in data.iterrows():
-                            try:
-                                timestamp = index.to_pydatetime()
-                                price = self.round_decimal(self.safe_float(row['Close']))
-                                volume = int(self.safe_float(row['Volume'])) if 'Volume' in row else 0
-                                
-                                # MySQL写入
-                                if self.use_mysql:
-                                    check_query = """SELECT id FROM stock_prices 
-                                                   WHERE timestamp = %s AND market = %s 
-                                                   AND symbol = %s"""
-                                    self.cursor.execute(check_query, (timestamp, market, symbol))
-                                    if not self.cursor.fetchone():
-                                        query = """INSERT INTO stock_prices 
-                                                 (timestamp, market, symbol, price, currency, volume) 
-                                                 VALUES (%s, %s, %s, %s, %s, %s)"""
-                                        self.cursor.execute(query, (timestamp, market, symbol, price, currency, volume))
-                                        self.db.commit()
-                                
-                                # InfluxDB写入
-                                if self.use_influxdb:
-                                    from influxdb_client import Point
-                                    point = Point("stock_prices") \
-                                        .tag("market", market) \
-                                        .tag("symbol", symbol) \
-                                        .tag("currency", currency) \
-                                        .field("price", price) \
-                                        .field("volume", volume) \
-                                        .time(timestamp)
-                                    self.write_api.write(bucket=INFLUXDB_CONFIG['bucket'], record=point)
-                                
-                                logger.info(f"导入股票数据: {timestamp} {market}:{symbol} - {price} {currency}")
-                                
-                            except Exception as e:
-                                logger.error(f"处理股票数据时出错 {market}:{symbol}: {e}")
-                                continue
-                        
-                        time.sleep(1)  # 短暂暂停避免请求过快
-                    
-                    logger.info(f"完成股票 {market}:{symbol} 的历史数据导入")
-                    time.sleep(2)
-                    
-                except Exception as e:
-                    logger.error(f"导入股票数据失败 {market}:{symbol}: {e}")
-                    time.sleep(5)
+        self.import_series_list([spec for spec in self.get_series_specs() if spec['measurement'] == 'stock_prices'])
 
     def import_historical_usd_index(self):
         """导入历史美元指数数据"""
         logger.info("开始导入历史美元指数数据...")
-        segments = self.get_data_segments()
-        
-        try:
-            for segment_start, segment_end, interval in segments:
-                logger.info(f"获取美元指数从 {segment_start} 到 {segment_end} 的 {interval} 数据")
-                data = self.get_historical_data('EURUSD=X', segment_start, segment_end, interval)
-                
-                if data is not None and not data.empty:
-                    for index, row in data.iterrows():
-                        try:
-                            timestamp = index.to_pydatetime()
-                            eur_usd_rate = self.safe_float(row['Close'])
-                            usd_index = self.round_decimal((1 / eur_usd_rate) * 88.3)
-                            
-                            # MySQL写入
-                            if self.use_mysql:
-                                check_query = "SELECT id FROM usd_index WHERE timestamp = %s"
-                                self.cursor.execute(check_query, (timestamp,))
-                                if not self.cursor.fetchone():
-                                    query = "INSERT INTO usd_index (timestamp, value) VALUES (%s, %s)"
-                                    self.cursor.execute(query, (timestamp, usd_index))
-                                    self.db.commit()
-                            
-                            # InfluxDB写入
-                            if self.use_influxdb:
-                                from influxdb_client import Point
-                                point = Point("usd_index") \
-                                    .field("value", usd_index) \
-                                    .time(timestamp)
-                                self.write_api.write(bucket=INFLUXDB_CONFIG['bucket'], record=point)
-                            
-                            logger.info(f"导入美元指数数据: {timestamp} - {usd_index}")
-                            
-                        except Exception as e:
-                            logger.error(f"处理美元指数数据时出错 {timestamp}: {e}")
-                            continue
-                    
-                    time.sleep(1)  # 短暂暂停避免请求过快
-                
-                logger.info(f"完成时间段 {segment_start} 到 {segment_end} 的美元指数数据导入")
-            
-        except Exception as e:
-            logger.error(f"导入美元指数历史数据失败: {e}")
+        self.import_series_list([spec for spec in self.get_series_specs() if spec['measurement'] == 'usd_index'])
 
     def run(self):
         """运行所有历史数据导入"""
-        self.import_historical_usd_index()  # 添加美元指数历史数据导入
-        self.import_historical_exchange_rates()
-        self.import_historical_stock_prices()
-        logger.info("历史数据导入完成")
+        if self.incremental:
+            logger.info(f"增量导入模式：只导入每个序列最新数据之后的部分（起点依据: {IMPORT_WATERMARK}）")
+            if IMPORT_WATERMARK == 'database':
+                self.load_watermarks()
+        logger.info("开始导入历史数据...")
+        if self.use_mysql and IMPORT_BULK_LOAD:
+            logger.info(f"批量装载模式：每 {IMPORT_BULK_LOAD_ROWS} 行执行一次 LOAD DATA LOCAL INFILE")
+            if ROLLUP_ENABLED:
+                logger.warning("批量装载不维护 OHLC 汇总表，导入完成后请执行 python rollup.py rebuild")
+        self.import_series_list(self.get_series_specs())
+        if self.use_influxdb:
+            self.influx_sink.close()  # 发送剩余数据
+        logger.info(f"历史数据导入完成，在途数据峰值约 {self.memory_budget.peak / 1024 / 1024:.0f} MB")
+        logger.info(f"指标汇总: {summary_line()}")
+        logger.info("启动耗时:\n" + "\n".join(startup_profile()))
 
     def __del__(self):
         """清理资源"""
-        if hasattr(self, 'cursor') and self.cursor:
-            self.cursor.close()
-        if hasattr(self, 'db') and self.db:
-            self.db.close()
-        if hasattr(self, 'write_api') and self.write_api:
-            self.write_api.close()
-        if hasattr(self, 'influx_client') and self.influx_client:
-            self.influx_client.close()
+        if hasattr(self, 'mysql_sink') and self.mysql_sink:
+            self.mysql_sink.close()
+        if hasattr(self, 'influx_sink') and self.influx_sink:
+            self.influx_sink.close()
 
 if __name__ == "__main__":
+    mark('模块加载')
     importer = HistoricalDataImporter()
     importer.run() 
\ No newline at end of file
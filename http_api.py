@@ -0,0 +1,117 @@
+import json
+import logging
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+from config import API_HOST, API_PORT
+
+logger = logging.getLogger(__name__)
+
+# 进程启动标识，写入 ETag，进程重启后旧的 ETag 自动失效
+BOOT_ID = format(int(time.time() * 1000), 'x')
+
+
+class Request:
+    """一次 GET 请求：路由前缀之后的路径、查询参数和请求头"""
+
+    def __init__(self, path, query, headers):
+        self.path = path
+        self.query = query
+        self.headers = headers
+
+    def param(self, name, default=None):
+        values = self.query.get(name)
+        return values[0] if values else default
+
+
+def json_response(request, data, version=None, last_modified=None, status=200):
+    """返回 JSON 响应；给出 version / last_modified 时支持 ETag 和 If-Modified-Since，未变化时返回 304"""
+    headers = {'Content-Type': 'application/json; charset=utf-8', 'Cache-Control': 'no-cache'}
+    if version is not None:
+        etag = f'"{BOOT_ID}-{version}"'
+        headers['ETag'] = etag
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+            return 304, headers, b''
+    if last_modified is not None:
+        # Last-Modified 只精确到秒：数据在当前这一秒内更新时不返回，否则同一秒内之后的更新会被客户端的
+        # If-Modified-Since 当作未变化；这一秒过去后再返回，客户端拿到的数据已包含该秒内的全部更新
+        if int(last_modified) < int(time.time()):
+            headers['Last-Modified'] = formatdate(last_modified, usegmt=True)
+        if_modified_since = request.headers.get('If-Modified-Since')
+        if if_modified_since and 'If-None-Match' not in request.headers:
+            try:
+                if int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp():
+                    return 304, headers, b''
+            except (TypeError, ValueError):
+                pass
+    body = json.dumps(data, ensure_ascii=False, default=str).encode('utf-8')
+    return status, headers, body
+
+
+def text_response(text, content_type='text/plain; charset=utf-8', status=200):
+    return status, {'Content-Type': content_type}, text.encode('utf-8')
+
+
+class ApiServer:
+    """内嵌的只读 HTTP 服务，在后台线程中运行；各模块通过 route() 注册自己的路径前缀
+
+    handler(request) 返回 (status, headers, body)。
+    """
+
+    def __init__(self, host=API_HOST, port=API_PORT):
+        self.host = host
+        self.port = port
+        self.routes = []
+        self._server = None
+        self._thread = None
+
+    def route(self, prefix, handler):
+        """注册路径前缀，最长前缀优先匹配"""
+        self.routes.append((prefix.rstrip('/'), handler))
+        self.routes.sort(key=lambda item: len(item[0]), reverse=True)
+
+    def dispatch(self, raw_path, headers):
+        url = urlsplit(raw_path)
+        path = unquote(url.path).rstrip('/') or '/'
+        for prefix, handler in self.routes:
+            if path == prefix or path.startswith(prefix + '/'):
+                request = Request(path[len(prefix):].lstrip('/'), parse_qs(url.query), headers)
+                try:
+                    return handler(request)
+                except Exception as e:
+                    logger.error(f"处理请求 {raw_path} 出错: {e}")
+                    return json_response(request, {'error': 'internal error'}, status=500)
+        return 404, {'Content-Type': 'application/json'}, b'{"error": "not found"}'
+
+    def start(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, headers, body = api.dispatch(self.path, self.headers)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if body:
+                    self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(f"{self.address_string()} {format % args}")
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name='http-api', daemon=True)
+        self._thread.start()
+        logger.info(f"HTTP 接口已启动: http://{self.host}:{self.port}")
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
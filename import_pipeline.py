@@ -0,0 +1,138 @@
+import math
+import threading
+from datetime import timedelta
+from config import IMPORT_WINDOW_ROWS, IMPORT_MEMORY_LIMIT_BYTES
+from normalization import IMPORTER_ROUNDING, normalize_bars
+
+# 各K线粒度的秒数，用于按行数切分时间窗口
+INTERVAL_SECONDS = {
+    '1m': 60, '2m': 120, '5m': 300, '15m': 900, '30m': 1800, '60m': 3600, '90m': 5400,
+    '1h': 3600, '1d': 86400, '5d': 432000, '1wk': 604800, '1mo': 2592000,
+}
+
+# 一行数据从下载到写完在内存中的估算字节数（DataFrame、写入用的行元组和 line protocol 字符串）
+ROW_BYTES = 400
+
+
+def period_start(value, interval):
+    """value 所在日历周期的起点：分钟级K线为当周星期一，小时级为当月 1 日，日级及以上为当年 1 月 1 日"""
+    day = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    seconds = INTERVAL_SECONDS.get(interval, 86400)
+    if seconds < 3600:
+        return day - timedelta(days=day.weekday())
+    if seconds < 86400:
+        return day.replace(day=1)
+    return day.replace(month=1, day=1)
+
+
+def next_period(value, interval):
+    """日历周期起点 value 的下一个周期起点"""
+    seconds = INTERVAL_SECONDS.get(interval, 86400)
+    if seconds < 3600:
+        return value + timedelta(days=7)
+    if seconds < 86400:
+        return (value.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return value.replace(year=value.year + 1)
+
+
+def split_windows(start, end, interval, window_rows=IMPORT_WINDOW_ROWS):
+    """把一个数据段按日历周期（周 / 月 / 年，见 period_start）切分为时间窗口
+
+    周期超过约 window_rows 根K线时再等分为固定的几份。窗口边界只取决于日历，与运行时间无关，
+    重复导入时已收盘的窗口与上次完全相同，可以命中下载缓存；数据段首尾的窗口按段的起止截短。
+    """
+    limit = timedelta(seconds=INTERVAL_SECONDS.get(interval, 86400) * max(1, window_rows))
+    windows = []
+    period = period_start(start, interval)
+    while period < end:
+        period_end = next_period(period, interval)
+        count = max(1, math.ceil((period_end - period) / limit))
+        step = (period_end - period) / count
+        for i in range(count):
+            window_start = max(start, period + step * i)
+            window_end = min(end, period_end if i == count - 1 else period + step * (i + 1))
+            if window_start < window_end:
+                windows.append((window_start, window_end, interval))
+        period = period_end
+    return windows
+
+
+def estimate_rows(start, end, interval):
+    """按日历时间估算窗口内的K线数（不扣除休市时间，偏大）"""
+    return int((end - start).total_seconds() // INTERVAL_SECONDS.get(interval, 86400)) + 1
+
+
+class MemoryBudget:
+    """在途数据的内存上限：获取前按估算行数预留，写完后归还，预留不下时阻塞等待写入线程
+
+    单个窗口超过上限时，只要没有其他在途数据就放行，避免死锁。
+    """
+
+    def __init__(self, limit_bytes=IMPORT_MEMORY_LIMIT_BYTES):
+        self.limit = limit_bytes
+        self.used = 0
+        self.peak = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, amount):
+        if self.limit <= 0:
+            return 0
+        with self._cond:
+            while self.used and self.used + amount > self.limit:
+                self._cond.wait()
+            self.used += amount
+            self.peak = max(self.peak, self.used)
+        return amount
+
+    def resize(self, reserved, amount):
+        """按实际行数调整预留量，只会调小"""
+        if self.limit <= 0 or amount >= reserved:
+            return reserved
+        self.release(reserved - amount)
+        return amount
+
+    def release(self, amount):
+        if self.limit <= 0 or not amount:
+            return
+        with self._cond:
+            self.used -= amount
+            self._cond.notify_all()
+
+
+def fetch_stage(fetch, windows, budget=None):
+    """逐个窗口获取数据，fetch(start, end, interval) 每个窗口自行解析候选代码
+
+    生成 (interval, data, reserved)，获取失败或窗口内没有数据时 data 为 None；reserved 为向 budget 预留的字节数。
+    """
+    for start, end, interval in windows:
+        reserved = budget.acquire(estimate_rows(start, end, interval) * ROW_BYTES) if budget else 0
+        try:
+            data = fetch(start, end, interval)
+        except BaseException:
+            if budget:
+                budget.release(reserved)
+            raise
+        yield interval, (data if data is not None and not data.empty else None), reserved
+
+
+def normalize_stage(frames, transform=None, rounding=IMPORTER_ROUNDING, budget=None):
+    """把下载的K线转换为 value / volume 两列，生成 (interval, bars, reserved)，并按实际行数归还多预留的内存"""
+    for interval, data, reserved in frames:
+        bars = None
+        if data is not None:
+            try:
+                bars = normalize_bars(data, rounding=rounding, transform=transform)
+            except BaseException:
+                if budget:
+                    budget.release(reserved)
+                raise
+            if budget:
+                reserved = budget.resize(reserved, len(bars) * ROW_BYTES)
+        yield interval, bars, reserved
+
+
+def stream_bars(fetch, segments, transform=None, rounding=IMPORTER_ROUNDING,
+                window_rows=IMPORT_WINDOW_ROWS, budget=None):
+    """fetch → normalize 流水线：按窗口逐段生成处理好的K线，任何时刻只有有限个窗口在内存中"""
+    windows = [window for segment in segments for window in split_windows(*segment, window_rows)]
+    return normalize_stage(fetch_stage(fetch, windows, budget), transform, rounding, budget)
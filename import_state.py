@@ -0,0 +1,45 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from config import IMPORT_STATE_FILE
+
+logger = logging.getLogger(__name__)
+
+
+class ImportState:
+    """历史导入进度：记录每个序列已导入到的时间点，中断后从这里继续
+
+    每完成一个数据段就写一次文件（先写临时文件再替换），
+    进程在任意时刻退出都不会留下损坏的状态文件。
+    """
+
+    def __init__(self, path=IMPORT_STATE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._progress = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._progress = json.load(f)
+                logger.info(f"已加载导入进度: {len(self._progress)} 个序列 ({path})")
+            except (OSError, ValueError) as e:
+                logger.error(f"读取导入进度失败，将重新开始: {e}")
+
+    def get(self, series):
+        """返回序列已导入到的时间点，没有记录时返回 None"""
+        value = self._progress.get(series)
+        return datetime.fromisoformat(value) if value else None
+
+    def mark(self, series, timestamp):
+        """记录序列已导入到 timestamp，只会向后推进"""
+        with self._lock:
+            current = self.get(series)
+            if current is not None and current >= timestamp:
+                return
+            self._progress[series] = timestamp.isoformat()
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._progress, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
@@ -0,0 +1,257 @@
+import logging
+import numbers
+import threading
+import time
+from datetime import datetime, timezone
+from config import INFLUXDB_CONFIG, INFLUXDB_WRITE_OPTIONS
+from startup import lazy_import
+from metrics import ROWS_WRITTEN, WRITE_FAILURES, WRITE_RETRIES, WRITE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def escape_key(value, measurement=False):
+    """转义 measurement / tag / field 名称中的特殊字符"""
+    value = str(value).replace('\\', '\\\\').replace(',', '\\,').replace(' ', '\\ ')
+    if not measurement:
+        value = value.replace('=', '\\=')
+    return value
+
+
+def format_field(value):
+    """按 line protocol 格式化字段值，无法写入的值返回 None"""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, numbers.Integral):
+        return f"{int(value)}i"
+    if isinstance(value, numbers.Real):
+        value = float(value)
+        if value != value or value in (float('inf'), float('-inf')):
+            return None
+        return repr(value)
+    if value is None:
+        return None
+    text = str(value).replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{text}"'
+
+
+def to_nanoseconds(timestamp):
+    """时间戳转换为纳秒，无时区的时间按UTC处理"""
+    if hasattr(timestamp, 'to_datetime64'):  # pandas.Timestamp
+        return int(timestamp.value)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    delta = timestamp - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 10**9 + delta.microseconds * 1000
+
+
+def to_line_protocol(measurement, tags, fields, timestamp):
+    """构造一行 line protocol，没有有效字段时返回 None"""
+    field_parts = []
+    for key, value in fields.items():
+        formatted = format_field(value)
+        if formatted is not None:
+            field_parts.append(f"{escape_key(key)}={formatted}")
+    if not field_parts:
+        return None
+
+    key = escape_key(measurement, measurement=True)
+    for tag_key, tag_value in sorted(tags.items()):
+        if tag_value not in (None, ''):
+            key += f",{escape_key(tag_key)}={escape_key(tag_value)}"
+
+    return f"{key} {','.join(field_parts)} {to_nanoseconds(timestamp)}"
+
+
+class InfluxSink:
+    """InfluxDB 批量写入：数据点先转成 line protocol 缓存，后台线程按数量或时间间隔批量发送
+
+    发送失败时按指数退避重试，超过最大重试次数后丢弃该批并记录错误；
+    close() 会把剩余数据发送后再关闭连接：关闭期间每批只发送一次（正在退避的批次立即做最后一次尝试），
+    一批失败就丢弃其余数据，不再逐批等待重试。关闭后的 write() 直接丢弃数据点。
+
+    缓冲区最多 max_buffer_bytes 字节：满时 write() 最多等待 buffer_timeout 毫秒，仍然满则丢弃该数据点并计入写入失败；
+    block=True 时一直等待到有空间（背压），用于历史导入。
+    """
+
+    def __init__(self, options=INFLUXDB_WRITE_OPTIONS, block=False):
+        InfluxDBClient = lazy_import('influxdb_client').InfluxDBClient
+        SYNCHRONOUS = lazy_import('influxdb_client.client.write_api').SYNCHRONOUS
+
+        self.bucket = INFLUXDB_CONFIG['bucket']
+        self.org = INFLUXDB_CONFIG['org']
+        self.batch_size = max(1, options['batch_size'])
+        self.flush_interval = options['flush_interval'] / 1000
+        self.retry_interval = options['retry_interval'] / 1000
+        self.max_retries = options['max_retries']
+        self.max_retry_delay = options['max_retry_delay'] / 1000
+        self.exponential_base = options['exponential_base']
+        self.max_buffer_bytes = max(1, options['max_buffer_bytes'])
+        self.buffer_timeout = options['buffer_timeout'] / 1000
+        self.block = block
+
+        self.client = InfluxDBClient(
+            url=INFLUXDB_CONFIG['url'],
+            token=INFLUXDB_CONFIG['token'],
+            org=self.org
+        )
+        self.write_api = self.client.write_api(write_options=SYNCHRONOUS)
+
+        self.stats = {'written': 0, 'failed': 0, 'batches': 0}
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._dropped = 0
+        self._cond = threading.Condition()
+        self._send_lock = threading.Lock()
+        self._closed = False
+        self._closing = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='influx-sink', daemon=True)
+        self._thread.start()
+
+    def write(self, measurement, tags, fields, timestamp):
+        """写入一个数据点（仅加入缓冲区）"""
+        line = to_line_protocol(measurement, tags, fields, timestamp)
+        if line is None:
+            logger.warning(f"忽略没有有效字段的数据点: {measurement} {tags} {fields}")
+            return False
+        with self._cond:
+            has_space = self._wait_for_space(len(line))
+            if self._closed:
+                self.stats['failed'] += 1
+                WRITE_FAILURES.inc(sink='influxdb')
+                logger.warning(f"InfluxDB写入已关闭，丢弃数据点: {measurement} {tags}")
+                return False
+            if not has_space:
+                self.stats['failed'] += 1
+                self._dropped += 1
+                if self._dropped == 1:
+                    logger.error(f"InfluxDB写入缓冲区已满 (上限 {self.max_buffer_bytes / 1024 / 1024:.1f} MB)，开始丢弃数据点")
+                WRITE_FAILURES.inc(sink='influxdb')
+                return False
+            if self._dropped:
+                logger.warning(f"InfluxDB写入缓冲区恢复，期间丢弃了 {self._dropped} 个数据点")
+                self._dropped = 0
+            self._buffer.append(line)
+            self._buffer_bytes += len(line)
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify_all()
+        return True
+
+    def _wait_for_space(self, size):
+        """等待缓冲区有空间（调用方持有 _cond），返回是否可以加入；缓冲区为空时总是可以加入"""
+        deadline = None if self.block else time.monotonic() + self.buffer_timeout
+        while self._buffer and self._buffer_bytes + size > self.max_buffer_bytes and not self._closed:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            # 唤醒后台线程立即发送，发送线程取走数据后会通知等待的写入方
+            self._cond.notify_all()
+            self._cond.wait(remaining)
+        return True
+
+    def write_points(self, points):
+        """同步写入一组数据点，不经过缓冲区也不重试，失败时抛出异常由调用方处理"""
+        lines = [
+            line for line in (
+                to_line_protocol(point['measurement'], point['tags'], point['fields'], point['timestamp'])
+                for point in points
+            )
+            if line is not None
+        ]
+        if not lines:
+            return 0
+        with self._send_lock:
+            with WRITE_SECONDS.time(sink='influxdb', stage='flush'):
+                self.write_api.write(bucket=self.bucket, org=self.org, record=lines)
+            self.stats['written'] += len(lines)
+            self.stats['batches'] += 1
+        ROWS_WRITTEN.inc(len(lines), sink='influxdb', table=self.bucket)
+        return len(lines)
+
+    def flush(self):
+        """立即发送缓冲区中的全部数据；关闭期间一批发送失败时丢弃其余数据"""
+        while True:
+            with self._cond:
+                batch = self._buffer[:self.batch_size]
+                del self._buffer[:self.batch_size]
+                self._buffer_bytes -= sum(len(line) for line in batch)
+                self._cond.notify_all()
+            if not batch:
+                return
+            if not self._send(batch) and self._closing.is_set():
+                self._discard()
+                return
+
+    def _discard(self):
+        """丢弃缓冲区中的剩余数据并计入写入失败"""
+        with self._cond:
+            count = len(self._buffer)
+            self._buffer = []
+            self._buffer_bytes = 0
+            self._cond.notify_all()
+        if count:
+            self.stats['failed'] += count
+            WRITE_FAILURES.inc(count, sink='influxdb')
+            logger.error(f"InfluxDB关闭时写入失败，丢弃剩余 {count} 个点")
+
+    def _run(self):
+        """后台刷新线程"""
+        while True:
+            with self._cond:
+                if not self._closed and len(self._buffer) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"InfluxDB后台刷新出错: {e}")
+
+    def _send(self, lines):
+        """发送一批数据，失败时指数退避重试"""
+        with self._send_lock:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    with WRITE_SECONDS.time(sink='influxdb', stage='flush'):
+                        self.write_api.write(bucket=self.bucket, org=self.org, record=lines)
+                    self.stats['written'] += len(lines)
+                    self.stats['batches'] += 1
+                    ROWS_WRITTEN.inc(len(lines), sink='influxdb', table=self.bucket)
+                    logger.debug(f"InfluxDB批量写入成功: {len(lines)} 个点")
+                    return True
+                except Exception as e:
+                    status = getattr(e, 'status', None)
+                    retryable = status is None or status == 429 or status >= 500
+                    if not retryable or attempt >= self.max_retries or self._closing.is_set():
+                        self.stats['failed'] += len(lines)
+                        WRITE_FAILURES.inc(len(lines), sink='influxdb')
+                        logger.error(f"InfluxDB批量写入最终失败，丢弃 {len(lines)} 个点: {e}")
+                        return False
+                    delay = min(self.retry_interval * self.exponential_base ** attempt, self.max_retry_delay)
+                    WRITE_RETRIES.inc(sink='influxdb')
+                    logger.warning(
+                        f"InfluxDB批量写入失败 (尝试 {attempt + 1}/{self.max_retries + 1})，"
+                        f"{delay:.1f} 秒后重试: {e}"
+                    )
+                    # 关闭时立即结束等待，做最后一次尝试
+                    self._closing.wait(delay)
+        return False
+
+    def close(self):
+        """发送剩余数据并关闭连接"""
+        if self._closed:
+            return
+        with self._cond:
+            self._closed = True
+            self._closing.set()
+            self._cond.notify_all()
+        self._thread.join()
+        self.flush()
+        logger.info(
+            f"InfluxDB写入统计: 成功 {self.stats['written']} 个点 / {self.stats['batches']} 批, "
+            f"失败 {self.stats['failed']} 个点"
+        )
+        self.write_api.close()
+        self.client.close()
@@ -0,0 +1,124 @@
+import logging
+from datetime import datetime, date, time as dt_time, timedelta
+from zoneinfo import ZoneInfo
+from config import MARKET_HOLIDAYS
+
+logger = logging.getLogger(__name__)
+
+WEEKDAYS = (0, 1, 2, 3, 4)
+
+# 各市场交易时段（交易所当地时间），按星期几列出；'24:00' 表示次日零点
+MARKET_SESSIONS = {
+    'US': {
+        'timezone': 'America/New_York',
+        'sessions': {day: [('09:30', '16:00')] for day in WEEKDAYS},
+    },
+    'HK': {
+        'timezone': 'Asia/Hong_Kong',
+        'sessions': {day: [('09:30', '12:00'), ('13:00', '16:00')] for day in WEEKDAYS},
+    },
+    'CN': {
+        'timezone': 'Asia/Shanghai',
+        'sessions': {day: [('09:30', '11:30'), ('13:00', '15:00')] for day in WEEKDAYS},
+    },
+    # 外汇：纽约时间周日17:00开盘，周五17:00收盘
+    'FX': {
+        'timezone': 'America/New_York',
+        'sessions': {
+            6: [('17:00', '24:00')],
+            0: [('00:00', '24:00')],
+            1: [('00:00', '24:00')],
+            2: [('00:00', '24:00')],
+            3: [('00:00', '24:00')],
+            4: [('00:00', '17:00')],
+        },
+    },
+}
+
+
+def parse_time(value):
+    """解析 HH:MM，'24:00' 返回 None 表示次日零点"""
+    if value == '24:00':
+        return None
+    hour, minute = value.split(':')
+    return dt_time(int(hour), int(minute))
+
+
+class MarketCalendar:
+    """单个市场的交易日历：交易时段、周末和节假日"""
+
+    def __init__(self, market, timezone, sessions, holidays=()):
+        self.market = market
+        self.tz = ZoneInfo(timezone)
+        self.sessions = {
+            int(day): [(parse_time(start), parse_time(end)) for start, end in ranges]
+            for day, ranges in sessions.items()
+        }
+        self.holidays = {date.fromisoformat(day) for day in holidays}
+
+    def _intervals(self, around, days=8):
+        """返回 around 前后若干天内的交易区间（已合并相邻区间，UTC时间）"""
+        local_day = around.astimezone(self.tz).date()
+        intervals = []
+        for offset in range(-days, days + 1):
+            day = local_day + timedelta(days=offset)
+            if day in self.holidays:
+                continue
+            for start, end in self.sessions.get(day.weekday(), []):
+                start_at = datetime.combine(day, start, tzinfo=self.tz)
+                if end is None:
+                    end_at = datetime.combine(day + timedelta(days=1), dt_time(0), tzinfo=self.tz)
+                else:
+                    end_at = datetime.combine(day, end, tzinfo=self.tz)
+                intervals.append((start_at, end_at))
+
+        merged = []
+        for start_at, end_at in sorted(intervals):
+            if merged and start_at <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end_at))
+            else:
+                merged.append((start_at, end_at))
+        return merged
+
+    def is_open(self, now):
+        """当前是否在交易时段内"""
+        return any(start_at <= now < end_at for start_at, end_at in self._intervals(now, days=1))
+
+    def next_open(self, now):
+        """下一次开盘时间，一周内没有交易时段时返回 None"""
+        return next((start_at for start_at, _ in self._intervals(now) if start_at > now), None)
+
+    def next_close(self, now):
+        """下一次收盘时间"""
+        return next((end_at for _, end_at in self._intervals(now) if end_at > now), None)
+
+
+class AlwaysOpenCalendar:
+    """没有配置交易时段的市场，视为一直开盘"""
+
+    def is_open(self, now):
+        return True
+
+    def next_open(self, now):
+        return now
+
+    def next_close(self, now):
+        return None
+
+
+def load_calendars(holidays=MARKET_HOLIDAYS):
+    """根据默认交易时段和配置的节假日构建所有市场的日历"""
+    calendars = {}
+    for market, spec in MARKET_SESSIONS.items():
+        calendars[market] = MarketCalendar(
+            market, spec['timezone'], spec['sessions'], holidays.get(market, ())
+        )
+    unknown = set(holidays) - set(calendars)
+    if unknown:
+        logger.warning(f"以下市场没有交易时段配置，节假日设置将被忽略: {sorted(unknown)}")
+    return calendars
+
+
+def get_calendar(calendars, market):
+    """返回市场日历，未配置的市场视为一直开盘"""
+    return calendars.get(market) or AlwaysOpenCalendar()
@@ -1,440 +1,727 @@
+from startup import lazy_import, mark, startup_profile
+import argparse
+import sys
 import time
-import yfinance as yf
-import mysql.connector
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from functools import partial
 import logging
 from config import *
-from decimal import Decimal, ROUND_HALF_UP
+from normalization import COLLECTOR_ROUNDING, round_decimal
+from influx_sink import InfluxSink
+from scheduler import Scheduler
+from adaptive_polling import AdaptivePoller
+from write_spool import WriteSpool
+from quote_store import QuoteStore, handle_quotes, quote_key
+from http_api import ApiServer
+from progress import ProgressReporter
+from symbol_resolver import SymbolResolver
+from rate_limiter import TokenBucket
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, handle_circuits
+from change_filter import ChangeFilter
+from metrics import (
+    CYCLE_SECONDS, FETCH_FAILURES, FETCH_RETRIES, FETCH_SECONDS, FETCH_SKIPPED, SLEEP_SECONDS,
+    WRITE_QUEUE_DEPTH, WRITE_SECONDS, handle_metrics, summary_line
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 各 measurement 对应的 MySQL 表：列（时间戳 + 标签 + 字段）和重复时更新的列
+MYSQL_TABLES = {
+    'usd_index': (('timestamp', 'value'), ('value',)),
+    'exchange_rates': (('timestamp', 'from_currency', 'to_currency', 'rate'), ('rate',)),
+    'cross_rates': (('timestamp', 'from_currency', 'to_currency', 'rate'), ('rate',)),
+    'stock_prices': (
+        ('timestamp', 'market', 'symbol', 'price', 'currency', 'volume'),
+        ('price', 'currency', 'volume')
+    ),
+}
+
+# 上游代码对应的交易所时区，与单代码下载返回的时区一致（已有数据按该时区的本地时间保存）。
+# 多代码下载混合了不同时区的代码时 yfinance 返回 UTC 时间，按此换算回交易所时区；前缀以 ^ 开头，其余为后缀
+EXCHANGE_TIMEZONES = (
+    ('=X', 'Europe/London'),
+    ('.SS', 'Asia/Shanghai'), ('.SZ', 'Asia/Shanghai'), ('.BJ', 'Asia/Shanghai'),
+    ('.HK', 'Asia/Hong_Kong'), ('^HSI', 'Asia/Hong_Kong'),
+    ('^', 'America/New_York'),
+)
+
+
+def exchange_timezone(symbol):
+    """按代码形式推断交易所时区，无法推断时返回 None"""
+    for pattern, zone in EXCHANGE_TIMEZONES:
+        if symbol.startswith(pattern) if pattern.startswith('^') else symbol.endswith(pattern):
+            return zone
+    return None
+
+
 class MarketDataCollector:
-    def __init__(self):
+    def __init__(self, once=False):
+        # 一次性运行（--once）：采集一轮后退出，不启动 HTTP 接口
+        self.once = once
         self.use_mysql = USE_MYSQL
-        if self.use_mysql:
-            self.db = mysql.connector.connect(**MYSQL_CONFIG)
-            self.cursor = self.db.cursor()
-        
         self.use_influxdb = USE_INFLUXDB
         if self.use_influxdb:
-            from influxdb_client import InfluxDBClient
-            self.influx_client = InfluxDBClient(
-                url=INFLUXDB_CONFIG['url'],
-                token=INFLUXDB_CONFIG['token'],
-                org=INFLUXDB_CONFIG['org']
-            )
-            self.write_api = self.influx_client.write_api()
+            self.influx_sink = InfluxSink()
 
-    def round_decimal(self, value, places=6):
-        """智能四舍五入处理数值"""
+        # 品种到上游代码的解析，记住上一次成功的候选代码
+        self.symbols = SymbolResolver()
+
+        # 单代码下载返回的各代码交易所时区，用于换算批量下载返回的 UTC 时间
+        self.timezones = {}
+
+        # 每个上游代码的熔断器：长期失败的代码被隔离，不再每轮重试等待
+        self.breaker = CircuitBreaker() if CIRCUIT_BREAKER_ENABLED else None
+
+        # 对上游的请求限速，并发采集时所有线程共享
+        self.rate_limiter = TokenBucket(UPSTREAM_RATE_LIMIT, UPSTREAM_BURST)
+        # 并发采集模式下执行阻塞请求的线程池
+        self.executor = None
+        if COLLECT_ASYNC_ENABLED:
+            futures = lazy_import('concurrent.futures')
+            self.executor = futures.ThreadPoolExecutor(max(1, COLLECT_CONCURRENCY), thread_name_prefix='collect')
+
+        # 历史数据的本地下载缓存
+        self.download_cache = lazy_import('download_cache').DownloadCache() if CACHE_ENABLED else None
+
+        # 本地写入日志：数据先落盘，由后台线程回放到各数据库
+        self.spool = None
+        self.spool_mysql_sink = None
+        if SPOOL_ENABLED:
+            handlers = {}
+            if self.use_mysql:
+                handlers['mysql'] = self.drain_to_mysql
+            if self.use_influxdb:
+                handlers['influxdb'] = self.influx_sink.write_points
+            self.spool = WriteSpool(handlers)
+        
+        # 采集与写入分离：数据点进入有界队列，由连接池支撑的写入线程批量写入MySQL
+        self.mysql_writer = None
+        if self.use_mysql and not self.spool:
+            self.mysql_writer = lazy_import('mysql_sink').MySQLWriter(MYSQL_TABLES)
+
+        # 交叉汇率：由内存中的 USD 汇率推导，不额外请求上游
+        self.cross_rates = None
+        if CROSS_RATES_ENABLED:
+            self.cross_rates = lazy_import('cross_rates').CrossRateEngine(CROSS_RATE_CURRENCIES)
+
+        # 写入去重：休市时重复采集到的同一根K线不再写入
+        self.change_filter = None
+        if CHANGE_FILTER_ENABLED:
+            self.change_filter = ChangeFilter()
+            if self.use_mysql:
+                self.seed_change_filter()
+
+        # 内存中的最新行情，通过内嵌 HTTP 接口提供给内部服务
+        self.quotes = QuoteStore()
+        self.api = None
+        if API_ENABLED and not once:
+            self.api = ApiServer()
+            self.api.route('/quotes', partial(handle_quotes, self.quotes))
+            self.api.route('/metrics', handle_metrics)
+            if self.breaker:
+                self.api.route('/circuits', partial(handle_circuits, self.breaker))
+            self.api.start()
+        self.metrics_logged_at = time.monotonic()
+
+        # 每轮采集的进度汇总，逐个品种的明细只在 DEBUG 或抽样时输出
+        self.progress = ProgressReporter('采集', unit='个品种', log=logger)
+
+    def seed_change_filter(self):
+        """从 MySQL 读取每个序列最后写入的数据点，失败时从空缓存开始"""
+        sink = None
         try:
-            if isinstance(value, (float, int)):
-                value = str(value)
-            dec = Decimal(value)
-            
-            # 处理接近整数的情况（如0.9999或1.0001）
-            nearest_int = round(float(dec))
-            if abs(float(dec) - nearest_int) < 0.0001:
-                return float(nearest_int)
-            
-            # 处理接近x.5的情况（如7.4999或7.5001）
-            nearest_half = round(float(dec) * 2) / 2
-            if abs(float(dec) - nearest_half) < 0.0001:
-                return float(nearest_half)
-            
-            # 处理接近x.25或x.75的情况
-            nearest_quarter = round(float(dec) * 4) / 4
-            if abs(float(dec) - nearest_quarter) < 0.0001:
-                return float(nearest_quarter)
-            
-            # 其他情况保留6位小数
-            return float(dec.quantize(Decimal('0.000001'), rounding=ROUND_HALF_UP))
+            sink = lazy_import('mysql_sink').MySQLSink()
+            self.change_filter.seed(sink)
         except Exception as e:
-            logger.error(f"数值转换错误 {value}: {e}")
-            return value
+            logger.warning(f"读取各序列最新数据失败，写入去重从空缓存开始: {e}")
+        finally:
+            if sink is not None:
+                sink.close()
+
+    def sleep(self, seconds, reason):
+        """等待并记录等待时长，reason 区分重试、逐个请求间隔和轮间等待"""
+        SLEEP_SECONDS.inc(seconds, reason=reason)
+        time.sleep(seconds)
+
+    def round_decimal(self, value, places=6):
+        """智能四舍五入处理数值：吸附到整数、x.5、x.25/x.75，其余保留6位小数"""
+        return round_decimal(value, places=places, snap_steps=COLLECTOR_ROUNDING['snap_steps'])
+
+    def get_fetch_params(self, symbol):
+        """根据代码类型返回 (period, interval)"""
+        if symbol.endswith('=X'):  # 货币对
+            return '1d', '1m'
+        if symbol.startswith('^'):  # 美股指数
+            return '2d', '1h'
+        return '1d', '1m'  # 其他市场
+
+    def extract_latest(self, data, symbol=None):
+        """从下载结果中提取最后一根K线，时间统一为代码所在交易所的时区，单代码和批量下载得到的时间相同"""
+        if data is None or data.empty:
+            return None
+        if data.columns.nlevels > 1:
+            data = data.droplevel(1, axis=1)  # 单代码下载返回 (Price, Ticker) 多级列
+        if 'Close' not in data:
+            return None
+        data = data.dropna(subset=['Close'])
+        if data.empty:
+            return None
+        latest = data.iloc[-1]
+        volume = latest['Volume'] if 'Volume' in latest else 0
+        return {
+            'timestamp': self.exchange_time(data.index[-1], symbol),
+            'Close': float(latest['Close']),
+            'Volume': 0 if volume != volume else int(volume)  # NaN 视为 0
+        }
+
+    def exchange_time(self, timestamp, symbol):
+        """把时间换算到代码所在交易所的时区：单代码下载返回的非 UTC 时区会被记住，批量下载返回的 UTC 时间按它换算"""
+        if symbol is None or getattr(timestamp, 'tzinfo', None) is None:
+            return timestamp
+        if str(timestamp.tzinfo) != 'UTC':
+            self.timezones[symbol] = timestamp.tzinfo
+            return timestamp
+        zone = self.timezones.get(symbol) or exchange_timezone(symbol)
+        return timestamp.tz_convert(zone) if zone else timestamp
 
     def get_latest_data(self, symbol, retries=3):
-        """获取最新数据，带重试机制"""
+        """获取最新数据，带重试机制；启用熔断时隔离期内的代码直接跳过，隔离期满只请求一次"""
+        state = self.breaker.acquire(symbol) if self.breaker else CLOSED
+        if state == OPEN:
+            FETCH_SKIPPED.inc(symbol=symbol)
+            self.progress.detail("%s 处于隔离期，跳过", symbol)
+            return None
+        if state == HALF_OPEN:
+            retries = 1
+        
+        latest = self.fetch_latest(symbol, retries)
+        if self.breaker:
+            if latest is not None:
+                self.breaker.success(symbol)
+            else:
+                self.breaker.failure(symbol)
+        return latest
+
+    def fetch_latest(self, symbol, retries):
+        """请求上游最多 retries 次，返回最后一根K线"""
+        period, interval = self.get_fetch_params(symbol)
         for attempt in range(retries):
+            if attempt:
+                FETCH_RETRIES.inc(operation='get_latest_data')
             try:
-                # 对于货币对特殊处理
-                if symbol.endswith('=X'):
-                    data = yf.download(
-                        symbol, 
-                        period='1d', 
-                        interval='1m',
-                        progress=False
-                    )
-                    if not data.empty:
-                        latest = data.iloc[-1]
-                        return {
-                            'timestamp': data.index[-1],
-                            'Close': float(latest['Close'].iloc[0]) if hasattr(latest['Close'], 'iloc') else float(latest['Close']),
-                            'Volume': int(latest['Volume'].iloc[0]) if hasattr(latest['Volume'], 'iloc') else int(latest['Volume']) if 'Volume' in latest else 0
-                        }
-                else:
-                    # 非货币对的处理
-                    if symbol.startswith('^'):  # 美股指数
-                        period = '2d'
-                        interval = '1h'
-                    else:  # 其他市场
-                        period = '1d'
-                        interval = '1m'
-                        
-                    data = yf.download(
+                self.rate_limiter.acquire()
+                with FETCH_SECONDS.time(operation='get_latest_data', symbol=symbol):
+                    data = lazy_import('yfinance').download(
                         symbol, 
                         period=period,
                         interval=interval,
                         progress=False
                     )
-                    if not data.empty:
-                        latest = data.iloc[-1]
-                        logger.info(f"获取到 {symbol} 数据: 时间={data.index[-1]}, 价格={latest['Close']}")
-                        return {
-                            'timestamp': data.index[-1],
-                            'Close': float(latest['Close'].iloc[0]) if hasattr(latest['Close'], 'iloc') else float(latest['Close']),
-                            'Volume': int(latest['Volume'].iloc[0]) if hasattr(latest['Volume'], 'iloc') else int(latest['Volume']) if 'Volume' in latest else 0
-                        }
+                latest = self.extract_latest(data, symbol)
+                if latest is not None:
+                    self.progress.detail("获取到 %s 数据: 时间=%s, 价格=%s", symbol, latest['timestamp'], latest['Close'])
+                    return latest
                 
                 logger.error(f"未能获取到 {symbol} 的数据")
             except Exception as e:
+                FETCH_FAILURES.inc(operation='get_latest_data')
                 logger.error(f"第{attempt + 1}次获取{symbol}数据失败: {e}")
                 if attempt < retries - 1:
-                    time.sleep(5 * (attempt + 1))
+                    self.sleep(5 * (attempt + 1), 'retry')
         return None
 
-    def write_to_mysql(self, query, params, retries=3):
-        """MySQL写入，带重试机制"""
-        if not self.use_mysql:
-            return
+    def get_latest_data_batch(self, symbols, retries=3):
+        """批量获取最新数据：按 (period, interval) 分组，每组一次多代码请求
+
+        返回 {symbol: data}，data 与 get_latest_data 的返回格式相同；
+        未取到数据的代码不会出现在结果中，由调用方逐个回退。
+        """
+        groups = {}
+        for symbol in dict.fromkeys(symbols):
+            groups.setdefault(self.get_fetch_params(symbol), []).append(symbol)
+        
+        results = {}
+        for (period, interval), group in groups.items():
+            data = None
+            for attempt in range(retries):
+                if attempt:
+                    FETCH_RETRIES.inc(operation='get_latest_data_batch')
+                try:
+                    self.rate_limiter.acquire()
+                    with FETCH_SECONDS.time(operation='get_latest_data_batch', symbol=f"{period}/{interval}"):
+                        data = lazy_import('yfinance').download(
+                            group,
+                            period=period,
+                            interval=interval,
+                            group_by='ticker',
+                            progress=False
+                        )
+                    break
+                except Exception as e:
+                    FETCH_FAILURES.inc(operation='get_latest_data_batch')
+                    logger.error(f"第{attempt + 1}次批量获取 {group} 数据失败: {e}")
+                    if attempt < retries - 1:
+                        self.sleep(5 * (attempt + 1), 'retry')
             
-        for attempt in range(retries):
-            try:
-                self.cursor.execute(query, params)
-                self.db.commit()
-                return True
-            except mysql.connector.Error as e:
-                logger.error(f"MySQL写入错误 (尝试 {attempt + 1}/{retries}): {e}")
-                if attempt < retries - 1:
-                    try:
-                        self.db.ping(reconnect=True)  # 尝试重连
-                        time.sleep(1 * (attempt + 1))  # 递增等待时间
-                    except Exception as e:
-                        logger.error(f"MySQL重连失败: {e}")
+            if data is None or data.empty:
+                logger.error(f"批量请求未返回数据: {group}")
+                continue
+            
+            for symbol in group:
+                if data.columns.nlevels > 1:
+                    if symbol not in data.columns.get_level_values(0):
+                        continue
+                    frame = data[symbol]
                 else:
-                    logger.error("MySQL写入最终失败")
-                    return False
-        return False
+                    frame = data
+                latest = self.extract_latest(frame, symbol)
+                if latest is not None:
+                    results[symbol] = latest
+                    if self.breaker:
+                        self.breaker.success(symbol)
+            logger.info(f"批量获取 {period}/{interval} 数据: {len(group)} 个代码, 成功 {sum(s in results for s in group)} 个")
+        return results
 
-    def write_to_influxdb(self, measurement, tags, fields, timestamp, retries=3):
-        """写入数据到InfluxDB，带重试机制"""
+    def write_to_influxdb(self, measurement, tags, fields, timestamp):
+        """写入数据到InfluxDB（加入批量写入缓冲区，由后台线程发送和重试）"""
         if not self.use_influxdb:
-            logger.info("InfluxDB写入已禁用")
+            logger.debug("InfluxDB写入已禁用")
             return False
             
-        for attempt in range(retries):
+        try:
+            logger.debug("加入InfluxDB写入队列: measurement=%s, tags=%s, fields=%s, timestamp=%s", measurement, tags, fields, timestamp)
+            with WRITE_SECONDS.time(sink='influxdb', stage='enqueue'):
+                return self.influx_sink.write(measurement, tags, fields, timestamp)
+        except Exception as e:
+            logger.error(f"InfluxDB写入错误: {e}")
+            logger.error(f"详细信息: measurement={measurement}, tags={tags}, fields={fields}, timestamp={timestamp}")
+            return False
+
+    def drain_to_mysql(self, points):
+        """写入日志回放到 MySQL：使用独立连接，失败时断开，下次回放时重新连接"""
+        try:
+            if self.spool_mysql_sink is None:
+                self.spool_mysql_sink = lazy_import('mysql_sink').MySQLSink()
+            self.spool_mysql_sink.write_points(points, MYSQL_TABLES)
+        except Exception:
+            if self.spool_mysql_sink is not None:
+                try:
+                    self.spool_mysql_sink.close()
+                except Exception:
+                    pass
+                self.spool_mysql_sink = None
+            raise
+
+    def write_point(self, measurement, tags, fields, timestamp):
+        """写入一个数据点：先更新内存行情，启用写入日志时只追加到本地日志，否则放入各数据库的写入队列
+
+        返回是否至少有一处写入成功；与最后写入的数据点相比没有变化时跳过写入，视为成功。
+        """
+        self.quotes.add(quote_key(measurement, tags), measurement, tags, fields, timestamp)
+        if self.change_filter and not self.change_filter.admit(measurement, tags, fields, timestamp):
+            return True
+        
+        success = self.write_to_sinks(measurement, tags, fields, timestamp)
+        if not success and self.change_filter:
+            # 没有写入成功，下次采集到同样的数据点时重新写入
+            self.change_filter.forget(measurement, tags)
+        return success
+
+    def write_to_sinks(self, measurement, tags, fields, timestamp):
+        """启用写入日志时只追加到本地日志，否则放入各数据库的写入队列，返回是否至少有一处成功"""
+        if self.spool:
             try:
-                from influxdb_client import Point
-                point = Point(measurement)
-                
-                # 添加所有标签
-                for tag_key, tag_value in tags.items():
-                    point = point.tag(tag_key, tag_value)
-                
-                # 添加所有字段
-                for field_key, field_value in fields.items():
-                    point = point.field(field_key, field_value)
-                
-                # 设置时间戳
-                point = point.time(timestamp)
-                
-                logger.info(f"正在写入InfluxDB: measurement={measurement}, tags={tags}, fields={fields}, timestamp={timestamp}")
-                
-                # 写入数据
-                self.write_api.write(
-                    bucket=INFLUXDB_CONFIG['bucket'],
-                    record=point
-                )
-                
-                logger.info(f"InfluxDB写入成功: {measurement}")
-                return True
-                
+                with WRITE_SECONDS.time(sink='spool', stage='enqueue'):
+                    return self.spool.append(measurement, tags, fields, timestamp)
             except Exception as e:
-                logger.error(f"InfluxDB写入错误 (尝试 {attempt + 1}/{retries}): {e}")
-                logger.error(f"详细信息: measurement={measurement}, tags={tags}, fields={fields}, timestamp={timestamp}")
-                if attempt < retries - 1:
-                    time.sleep(1 * (attempt + 1))
-                else:
-                    logger.error("InfluxDB写入最终失败")
-                    return False
-        return False
+                logger.error(f"写入日志追加失败，改为直接写入数据库: {e}")
+        
+        mysql_success = False
+        if self.mysql_writer:
+            with WRITE_SECONDS.time(sink='mysql', stage='enqueue'):
+                mysql_success = self.mysql_writer.put({
+                    'measurement': measurement,
+                    'tags': tags,
+                    'fields': fields,
+                    'timestamp': timestamp
+                })
+        influx_success = self.write_to_influxdb(measurement, tags, fields, timestamp)
+        return bool(mysql_success or influx_success)
+
+    def get_currency_symbols(self, currency):
+        """返回货币对应的候选代码列表，上一次成功的代码排在最前"""
+        return self.symbols.candidates(f'USD/{currency}')
+
+    def get_stock_symbol(self, market, symbol):
+        """返回股票指数当前首选的上游代码"""
+        return self.symbols.primary(f'{market}:{symbol}')
+
+    def fetch_resolved(self, key, prefetched=None):
+        """获取一个品种的最新数据：先查批量预取的结果，再依次请求候选代码，并记录成功的代码
+
+        首选代码按正常次数重试，探测其他候选代码时每个只请求一次。
+        """
+        candidates = self.symbols.candidates(key)
+        data = (prefetched or {}).get(candidates[0])
+        if data is not None:
+            self.symbols.success(key, candidates[0])
+            return data
+        for i, symbol in enumerate(candidates):
+            data = self.get_latest_data(symbol, retries=3 if i == 0 else 1)
+            if data is not None:
+                self.symbols.success(key, symbol)
+                return data
+            self.symbols.failure(key, symbol)
+        return None
+
+    def get_instruments(self):
+        """列出所有实时采集的品种：标识、所属市场、批量预取用的代码和采集函数"""
+        instruments = [{
+            'key': 'usd_index',
+            'market': 'FX',
+            'fetch': self.fetch_usd_index
+        }]
+        for currency in CURRENCIES:
+            instruments.append({
+                'key': f'USD/{currency}',
+                'market': 'FX',
+                'fetch': partial(self.fetch_exchange_rate, currency)
+            })
+        for market, symbols in STOCKS.items():
+            for symbol in symbols:
+                instruments.append({
+                    'key': f'{market}:{symbol}',
+                    'market': market,
+                    'fetch': partial(self.fetch_stock_price, market, symbol)
+                })
+        return instruments
+
+    def prefetch_latest_data(self, instruments=None):
+        """批量预取一组品种的最新数据，每个品种取当前首选的上游代码，隔离期内的代码不参与"""
+        instruments = instruments if instruments is not None else self.get_instruments()
+        symbols = [self.symbols.primary(instrument['key']) for instrument in instruments]
+        if self.breaker:
+            symbols = [symbol for symbol in symbols if not self.breaker.is_open(symbol)]
+        return self.get_latest_data_batch(symbols)
+
+    def collect(self, instruments):
+        """采集一组品种：批量模式下先统一预取，预取不到的再逐个请求"""
+        started = time.perf_counter()
+        self.progress = ProgressReporter('采集', total=len(instruments), unit='个品种', log=logger)
+        prefetched = self.prefetch_latest_data(instruments) if BATCH_FETCH_ENABLED else {}
+        if self.executor:
+            lazy_import('asyncio').run(self.collect_concurrently(instruments, prefetched))
+        else:
+            for instrument in instruments:
+                symbol = self.symbols.primary(instrument['key'])
+                # 隔离期内的代码不请求上游，也不需要请求间隔
+                quarantined = self.breaker is not None and self.breaker.is_open(symbol)
+                success = instrument['fetch'](prefetched)
+                self.progress.advance(instrument['key'], rows=int(bool(success)), errors=int(not success))
+                if symbol not in prefetched and not quarantined:
+                    self.sleep(2, 'fallback')
+        self.progress.finish()
+        
+        if self.cross_rates and any(instrument['key'].startswith('USD/') for instrument in instruments):
+            self.update_cross_rates()
+        CYCLE_SECONDS.observe(time.perf_counter() - started)
+        
+        if self.mysql_writer:
+            WRITE_QUEUE_DEPTH.set(self.mysql_writer.depth(), sink='mysql')
+            if self.mysql_writer.depth():
+                logger.info(f"MySQL写入队列中还有 {self.mysql_writer.depth()} 个数据点等待写入")
+        self.log_metrics_summary()
 
-    def fetch_usd_index(self):
-        """获取美元指数"""
+    def log_metrics_summary(self, force=False):
+        """每隔 METRICS_SUMMARY_INTERVAL 秒输出一行指标汇总"""
+        if not force and (METRICS_SUMMARY_INTERVAL <= 0 or time.monotonic() - self.metrics_logged_at < METRICS_SUMMARY_INTERVAL):
+            return
+        self.metrics_logged_at = time.monotonic()
+        logger.info(f"指标汇总: {summary_line()}")
+
+    async def collect_concurrently(self, instruments, prefetched):
+        """并发采集：每个品种一个任务，阻塞的请求和重试等待在线程池中执行，按完成顺序汇总结果
+
+        一轮的耗时取决于最慢的品种而不是所有品种之和；超过 COLLECT_TASK_TIMEOUT 的品种本轮记为失败，
+        它的线程会在后台继续运行到结束。
+        """
+        asyncio = lazy_import('asyncio')
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(max(1, COLLECT_CONCURRENCY))
+
+        async def fetch(instrument):
+            async with semaphore:
+                try:
+                    return instrument, await asyncio.wait_for(
+                        loop.run_in_executor(self.executor, instrument['fetch'], prefetched),
+                        COLLECT_TASK_TIMEOUT
+                    )
+                except asyncio.TimeoutError:
+                    logger.error(f"{instrument['key']} 采集超过 {COLLECT_TASK_TIMEOUT:.0f} 秒，本轮放弃")
+                except Exception as e:
+                    logger.error(f"{instrument['key']} 采集出错: {e}")
+                return instrument, False
+
+        for task in asyncio.as_completed([fetch(instrument) for instrument in instruments]):
+            instrument, success = await task
+            self.progress.advance(instrument['key'], rows=int(bool(success)), errors=int(not success))
+
+    def update_cross_rates(self):
+        """由本轮已获取的 USD 汇率计算交叉汇率矩阵，作为派生序列写入"""
         try:
-            data = self.get_latest_data('EURUSD=X')
+            timestamp, rates = self.cross_rates.compute(
+                lazy_import('cross_rates').quote_histories(self.quotes, self.cross_rates.currencies)
+            )
+            for from_currency, to_currency, rate in rates:
+                self.write_point(
+                    measurement="cross_rates",
+                    tags={
+                        "from_currency": from_currency,
+                        "to_currency": to_currency,
+                        "derived": "true"
+                    },
+                    fields={"rate": rate},
+                    timestamp=timestamp
+                )
+            if rates:
+                logger.info(f"交叉汇率已更新: {len(rates)} 个货币对 (对齐时间 {timestamp})")
+        except Exception as e:
+            logger.error(f"计算交叉汇率时发生错误: {e}")
+
+    def fetch_usd_index(self, prefetched=None):
+        """获取美元指数，返回是否写入成功"""
+        try:
+            data = self.fetch_resolved('usd_index', prefetched)
             if data is not None:
                 rate = data['Close']
                 usd_index = self.round_decimal((1 / rate) * 88.3)
                 timestamp = data['timestamp']  # 使用数据的实际时间戳
                 
-                # MySQL写入
-                mysql_success = self.write_to_mysql(
-                    "INSERT INTO usd_index (timestamp, value) VALUES (%s, %s)",
-                    (timestamp, usd_index)
-                )
-                
-                # InfluxDB写入
-                influx_success = self.write_to_influxdb(
+                if self.write_point(
                     measurement="usd_index",
                     tags={},
                     fields={"value": usd_index},
                     timestamp=timestamp
-                )
-                
-                if mysql_success or influx_success:
-                    logger.info(f"USD Index updated: {usd_index}")
-                else:
-                    logger.error("USD Index 更新失败：所有数据库写入都失败了")
+                ):
+                    self.progress.detail("USD Index updated: %s", usd_index)
+                    return True
+                logger.error("USD Index 更新失败：所有数据库写入都失败了")
         except Exception as e:
             logger.error(f"Error fetching USD index: {e}")
+        return False
 
-    def fetch_exchange_rates(self):
-        """获取汇率数据"""
-        for currency in CURRENCIES:
-            try:
-                symbol = f'USD{currency}=X'
-                
-                # 对CNH特殊处理
-                if currency == 'CNH':
-                    for symbol_try in ['USDCNH=X', 'CNH=F', 'CNHUSD=X']:
-                        data = self.get_latest_data(symbol_try)
-                        if data is not None:
-                            break
-                else:
-                    data = self.get_latest_data(symbol)
+    def fetch_exchange_rate(self, currency, prefetched=None):
+        """获取单个货币的汇率，返回是否写入成功"""
+        try:
+            # 批量结果中没有时逐个尝试候选代码
+            data = self.fetch_resolved(f'USD/{currency}', prefetched)
+            
+            if data is not None:
+                rate = self.round_decimal(data['Close'])
+                timestamp = data['timestamp']  # 使用数据的实际时间戳
                 
-                if data is not None:
-                    rate = self.round_decimal(data['Close'])
-                    timestamp = data['timestamp']  # 使用数据的实际时间戳
-                    
-                    # MySQL写入
-                    mysql_success = self.write_to_mysql(
-                        "INSERT INTO exchange_rates (timestamp, from_currency, to_currency, rate) VALUES (%s, %s, %s, %s)",
-                        (timestamp, 'USD', currency, rate)
-                    )
-                    
-                    # InfluxDB写入
-                    influx_success = self.write_to_influxdb(
-                        measurement="exchange_rates",
-                        tags={
-                            "from_currency": "USD",
-                            "to_currency": currency
-                        },
-                        fields={"rate": rate},
-                        timestamp=timestamp
-                    )
-                    
-                    if mysql_success or influx_success:
-                        logger.info(f"Exchange rate updated for USD/{currency}: {rate}")
-                    else:
-                        logger.error(f"Exchange rate 更新失败 USD/{currency}: 所有数据库写入都失败了")
-                else:
-                    logger.error(f"未能获取到 {currency} 的数据")
+                if self.write_point(
+                    measurement="exchange_rates",
+                    tags={
+                        "from_currency": "USD",
+                        "to_currency": currency
+                    },
+                    fields={"rate": rate},
+                    timestamp=timestamp
+                ):
+                    self.progress.detail("Exchange rate updated for USD/%s: %s", currency, rate)
+                    return True
+                logger.error(f"Exchange rate 更新失败 USD/{currency}: 所有数据库写入都失败了")
+            else:
+                logger.error(f"未能获取到 {currency} 的数据")
+        except Exception as e:
+            logger.error(f"Error fetching exchange rate for {currency}: {e}")
+        return False
+
+    def fetch_exchange_rates(self, prefetched=None):
+        """获取所有货币的汇率"""
+        prefetched = prefetched or {}
+        for currency in CURRENCIES:
+            self.fetch_exchange_rate(currency, prefetched)
+            if self.get_currency_symbols(currency)[0] not in prefetched:
+                self.sleep(2, 'fallback')
+
+    def fetch_stock_price(self, market, symbol, prefetched=None):
+        """获取单个股票指数价格，返回是否写入成功"""
+        try:
+            data = self.fetch_resolved(f'{market}:{symbol}', prefetched)
+            if data is not None:
+                price = self.round_decimal(data['Close'])
+                volume = data['Volume']
+                currency = 'USD' if market == 'US' else 'HKD' if market == 'HK' else 'CNY'
+                timestamp = data['timestamp']  # 使用数据的实际时间戳
                 
-                time.sleep(2)
-            except Exception as e:
-                logger.error(f"Error fetching exchange rate for {currency}: {e}")
+                if self.write_point(
+                    measurement="stock_prices",
+                    tags={
+                        "market": market,
+                        "symbol": symbol,
+                        "currency": currency
+                    },
+                    fields={
+                        "price": price,
+                        "volume": volume
+                    },
+                    timestamp=timestamp
+                ):
+                    self.progress.detail("Stock index updated for %s:%s: %s %s", market, symbol, price, currency)
+                    return True
+                logger.error(f"Stock index 更新失败 {market}:{symbol}: 所有数据库写入都失败了")
+        except Exception as e:
+            logger.error(f"Error fetching stock index for {market}:{symbol}: {e}")
+        return False
 
-    def fetch_stock_prices(self):
-        """获取股票指数价格"""
+    def fetch_stock_prices(self, prefetched=None):
+        """获取所有股票指数价格"""
+        prefetched = prefetched or {}
         for market, symbols in STOCKS.items():
             for symbol in symbols:
-                try:
-                    # 修正股票代码格式
-                    if market == 'HK':
-                        yf_symbol = "^HSI"  # 恒生指数特殊处理
-                    elif market == 'CN':
-                        if symbol == '000001.SS':
-                            yf_symbol = '000001.SS'  # 上证指数
-                        elif symbol == '399001.SZ':
-                            yf_symbol = '399001.SZ'  # 深证成指
-                        elif symbol == '899050.BJ':
-                            yf_symbol = '899050.BJ'  # 北证50
-                    else:
-                        yf_symbol = symbol
-                    
-                    data = self.get_latest_data(yf_symbol)
-                    if data is not None:
-                        price = self.round_decimal(data['Close'])
-                        volume = data['Volume']
-                        currency = 'USD' if market == 'US' else 'HKD' if market == 'HK' else 'CNY'
-                        timestamp = data['timestamp']  # 使用数据的实际时间戳
-                        
-                        # MySQL写入
-                        mysql_success = self.write_to_mysql(
-                            """INSERT INTO stock_prices 
-                               (timestamp, market, symbol, price, currency, volume) 
-                               VALUES (%s, %s, %s, %s, %s, %s)""",
-                            (timestamp, market, symbol, price, currency, volume)
-                        )
-                        
-                        # InfluxDB写入
-                        influx_success = self.write_to_influxdb(
-                            measurement="stock_prices",
-                            tags={
-                                "market": market,
-                                "symbol": symbol,
-                                "currency": currency
-                            },
-                            fields={
-                                "price": price,
-                                "volume": volume
-                            },
-                            timestamp=timestamp
-                        )
-                        
-                        if mysql_success or influx_success:
-                            logger.info(f"Stock index updated for {market}:{symbol}: {price} {currency}")
-                        else:
-                            logger.error(f"Stock index 更新失败 {market}:{symbol}: 所有数据库写入都失败了")
-                    
-                    time.sleep(2)
-                except Exception as e:
-                    logger.error(f"Error fetching stock index for {market}:{symbol}: {e}")
+                self.fetch_stock_price(market, symbol, prefetched)
+                if self.get_stock_symbol(market, symbol) not in prefetched:
+                    self.sleep(2, 'fallback')
 
     def get_historical_data(self, symbol, start, end, interval, retries=3):
-        """获取历史数据，带重试机制"""
+        """获取历史数据，优先读取本地缓存，带重试机制"""
+        data = self.download_cache.get(symbol, interval, start, end) if self.download_cache else None
+        if data is not None and not data.empty:
+            return data
+        
         for attempt in range(retries):
+            if attempt:
+                FETCH_RETRIES.inc(operation='get_historical_data')
             try:
-                data = yf.download(
-                    symbol,
-                    start=start,
-                    end=end,
-                    interval=interval,
-                    progress=False
-                )
+                with FETCH_SECONDS.time(operation='get_historical_data', symbol=symbol):
+                    data = lazy_import('yfinance').download(
+                        symbol,
+                        start=start,
+                        end=end,
+                        interval=interval,
+                        progress=False
+                    )
                 if not data.empty:
+                    if self.download_cache:
+                        self.download_cache.put(symbol, interval, start, end, data)
                     return data
                     
             except Exception as e:
+                FETCH_FAILURES.inc(operation='get_historical_data')
                 logger.error(f"第{attempt + 1}次获取{symbol}数据失败: {e}")
                 if attempt < retries - 1:
-                    time.sleep(5 * (attempt + 1))
+                    self.sleep(5 * (attempt + 1), 'retry')
         
         logger.error(f"无法获取 {symbol} 的数据，所有尝试都失败了")
         return None
 
+    def get_history_specs(self):
+        """列出需要补采历史数据的序列：标识、上游代码、写入的 measurement、标签和数值字段"""
+        specs = []
+        for currency in CURRENCIES:
+            specs.append({
+                'key': f'USD/{currency}',
+                'measurement': 'exchange_rates',
+                'tags': {"from_currency": "USD", "to_currency": currency},
+                'fields': ('rate',),
+            })
+        for market, symbols in STOCKS.items():
+            for symbol in symbols:
+                specs.append({
+                    'key': f'{market}:{symbol}',
+                    'measurement': 'stock_prices',
+                    'tags': {
+                        "market": market,
+                        "symbol": symbol,
+                        "currency": 'USD' if market == 'US' else 'HKD' if market == 'HK' else 'CNY'
+                    },
+                    'fields': ('price', 'volume'),
+                })
+        return specs
+
+    def fetch_history_window(self, key, start, end, interval):
+        """流水线的获取阶段：每个窗口重新解析候选代码，首选代码按正常次数重试，其他候选只请求一次
+
+        每次请求后短暂暂停避免请求过快；换用其他候选成功时记录它，所有候选都没有数据时不视为代码失效。
+        """
+        self.progress.detail("获取 %s 从 %s 到 %s 的 %s 数据", key, start, end, interval)
+        for i, symbol in enumerate(self.symbols.candidates(key)):
+            try:
+                data = self.get_historical_data(symbol, start, end, interval, retries=3 if i == 0 else 1)
+            finally:
+                self.sleep(1, 'throttle')
+            if data is not None and not data.empty:
+                self.symbols.success(key, symbol)
+                return data
+        return None
+
     def fetch_historical_data(self, start_date):
-        """获取历史数据"""
+        """获取历史数据：与历史导入共用 fetch → normalize 流式流水线，按时间窗口逐段写入"""
+        pipeline = lazy_import('import_pipeline')
         try:
             end_date = datetime.now()
             start_datetime = datetime.strptime(start_date, '%Y-%m-%d')
-            days_diff = (end_date - start_datetime).days
-            
-            # 根据时间跨度确定数据间隔
-            def get_interval(days):
-                if days <= 7:  # 7天内用15分钟
-                    return '15m'
-                elif days <= 60:  # 60天内用1小时
-                    return '1h'
-                else:  # 超过60天用天级别
-                    return '1d'
             
-            # 分段获取数据
+            # 分段获取数据，分界对齐到日历周期的起点
+            recent_7d = pipeline.period_start(end_date - timedelta(days=7), '15m')
+            recent_60d = pipeline.period_start(end_date - timedelta(days=60), '1h')
             segments = [
                 (start_datetime, min(start_datetime + timedelta(days=60), end_date), '1d'),  # 60天以前的数据
-                (max(end_date - timedelta(days=60), start_datetime), end_date - timedelta(days=7), '1h'),  # 7-60天的数据
-                (end_date - timedelta(days=7), end_date, '15m')  # 最近7天的数据
+                (max(recent_60d, start_datetime), recent_7d, '1h'),  # 7-60天的数据
+                (recent_7d, end_date, '15m')  # 最近7天的数据
             ]
             
             # 过滤掉无效的时间段
             segments = [(start, end, interval) for start, end, interval in segments if start < end]
+            windows = sum(len(pipeline.split_windows(*segment)) for segment in segments)
 
-            for currency in CURRENCIES:
-                symbol = f'USD{currency}=X'
-                
-                for start, end, interval in segments:
-                    logger.info(f"获取 {symbol} 从 {start} 到 {end} 的 {interval} 数据")
-                    data = self.get_historical_data(symbol, start, end, interval)
-                    
-                    for timestamp, row in data.iterrows():
-                        rate = self.round_decimal(row['Close'])
-                        
-                        # MySQL写入
-                        if self.use_mysql:
-                            query = "INSERT INTO exchange_rates (timestamp, from_currency, to_currency, rate) VALUES (%s, %s, %s, %s)"
-                            self.cursor.execute(query, (timestamp, 'USD', currency, rate))
-                            self.db.commit()
-                        
-                        # InfluxDB写入
-                        self.write_to_influxdb(
-                            measurement="exchange_rates",
-                            tags={
-                                "from_currency": "USD",
-                                "to_currency": currency
-                            },
-                            fields={"rate": rate},
+            specs = self.get_history_specs()
+            self.progress = ProgressReporter('历史数据获取', total=len(specs) * windows, unit='个时间窗口', log=logger)
+            for spec in specs:
+                value_field, *extra_fields = spec['fields']
+                for interval, bars, _ in pipeline.stream_bars(
+                    partial(self.fetch_history_window, spec['key']), segments, rounding=COLLECTOR_ROUNDING
+                ):
+                    if bars is None:
+                        self.progress.advance(spec['key'], errors=1)
+                        continue
+                    columns = [bars['value'].tolist()] + [bars[field].tolist() for field in extra_fields]
+                    for timestamp, *values in zip(bars.index, *columns):
+                        self.write_point(
+                            measurement=spec['measurement'],
+                            tags=spec['tags'],
+                            fields=dict(zip(spec['fields'], values)),
                             timestamp=timestamp
                         )
-                    
-                    time.sleep(1)  # 短暂暂停避免请求过快
+                    self.progress.advance(spec['key'], rows=len(bars))
                 
-                logger.info(f"历史汇率数据已导入: USD/{currency}")
-                time.sleep(2)  # 避免请求过于频繁
-
-            # 获取股票历史数据
-            for market, symbols in STOCKS.items():
-                for symbol in symbols:
-                    if market == 'HK':
-                        yf_symbol = "^HSI"
-                    elif market == 'CN':
-                        yf_symbol = symbol
-                    else:
-                        yf_symbol = symbol
-                    
-                    for start, end, interval in segments:
-                        logger.info(f"获取 {market}:{symbol} 从 {start} 到 {end} 的 {interval} 数据")
-                        data = self.get_historical_data(yf_symbol, start, end, interval)
-                        
-                        currency = 'USD' if market == 'US' else 'HKD' if market == 'HK' else 'CNY'
-                        
-                        for timestamp, row in data.iterrows():
-                            price = self.round_decimal(row['Close'])
-                            volume = int(row['Volume']) if 'Volume' in row else 0
-                            
-                            # MySQL写入
-                            if self.use_mysql:
-                                query = """INSERT INTO stock_prices 
-                                         (timestamp, market, symbol, price, currency, volume) 
-                                         VALUES (%s, %s, %s, %s, %s, %s)"""
-                                self.cursor.execute(query, (timestamp, market, symbol, price, currency, volume))
-                                self.db.commit()
-                            
-                            # InfluxDB写入
-                            self.write_to_influxdb(
-                                measurement="stock_prices",
-                                tags={
-                                    "market": market,
-                                    "symbol": symbol,
-                                    "currency": currency
-                                },
-                                fields={
-                                    "price": price,
-                                    "volume": volume
-                                },
-                                timestamp=timestamp
-                            )
-                        
-                        time.sleep(1)  # 短暂暂停避免请求过快
-                    
-                    logger.info(f"历史股票数据已导入: {market}:{symbol}")
-                    time.sleep(2)  # 避免请求过于频繁
-
+                self.progress.detail("历史数据已导入: %s", spec['key'])
+                self.sleep(2, 'throttle')  # 避免请求过于频繁
+            self.progress.finish()
         except Exception as e:
             logger.error(f"获取历史数据时发生错误: {e}")
 
+    def run_scheduled(self):
+        """按交易时段调度采集：每个品种独立计时，休市的市场不再轮询"""
+        poller = AdaptivePoller(self.quotes) if ADAPTIVE_POLLING_ENABLED else None
+        scheduler = Scheduler(self.get_instruments(), poller=poller)
+        logger.info(
+            f"已启用交易时段调度: {len(scheduler.instruments)} 个品种"
+            + (f", 自适应间隔 {POLL_MIN_INTERVAL}-{POLL_MAX_INTERVAL} 秒" if poller else '')
+        )
+        while True:
+            due = scheduler.due(datetime.now(timezone.utc))
+            if due:
+                logger.info(f"本次采集 {len(due)} 个品种: {', '.join(instrument['key'] for instrument in due)}")
+                self.collect(due)
+            
+            now = datetime.now(timezone.utc)
+            wakeup = scheduler.next_wakeup(now)
+            self.sleep(max(1.0, (wakeup - now).total_seconds()), 'interval')
+
     def run(self, fetch_historical=False):
         """主运行循环"""
         try:
@@ -443,11 +730,12 @@ class MarketDataCollector:
                 self.fetch_historical_data(HISTORY_START_DATE)
                 logger.info("历史数据获取完成")
             
+            if SCHEDULER_ENABLED:
+                self.run_scheduled()
+            
             while True:
-                self.fetch_usd_index()
-                self.fetch_exchange_rates()
-                self.fetch_stock_prices()
-                time.sleep(FETCH_INTERVAL)
+                self.collect(self.get_instruments())
+                self.sleep(FETCH_INTERVAL, 'interval')
         except KeyboardInterrupt:
             logger.info("程序正在退出...")
             self.cleanup()
@@ -455,21 +743,44 @@ class MarketDataCollector:
             logger.error(f"运行时发生错误: {e}")
             self.cleanup()
 
+    def run_once(self):
+        """一次性运行：采集一轮所有品种，等待写入完成后输出启动耗时，返回是否有品种采集成功"""
+        instruments = self.get_instruments()
+        try:
+            self.collect(instruments)
+            mark('采集完成')
+        finally:
+            self.cleanup()
+        mark('写入完成')
+        self.log_metrics_summary(force=True)
+        logger.info("启动耗时:\n" + "\n".join(startup_profile()))
+        return not instruments or self.progress.rows > 0
+
     def cleanup(self):
         """清理资源"""
         try:
-            if hasattr(self, 'write_api') and self.write_api:
-                logger.info("正在关闭 InfluxDB write_api...")
-                self.write_api.close()
-            if hasattr(self, 'influx_client') and self.influx_client:
-                logger.info("正在关闭 InfluxDB client...")
-                self.influx_client.close()
-            if hasattr(self, 'cursor') and self.cursor:
-                logger.info("正在关闭 MySQL cursor...")
-                self.cursor.close()
-            if hasattr(self, 'db') and self.db:
-                logger.info("正在关闭 MySQL connection...")
-                self.db.close()
+            if getattr(self, 'api', None):
+                self.api.stop()
+                self.api = None
+            if getattr(self, 'executor', None):
+                # 等待后台仍在进行的请求写完数据，再关闭写入
+                self.executor.shutdown(wait=True, cancel_futures=True)
+                self.executor = None
+            if getattr(self, 'spool', None):
+                logger.info("正在回放写入日志...")
+                self.spool.close()
+                self.spool = None
+            if getattr(self, 'spool_mysql_sink', None):
+                self.spool_mysql_sink.close()
+                self.spool_mysql_sink = None
+            if hasattr(self, 'influx_sink') and self.influx_sink:
+                logger.info("正在发送剩余数据并关闭 InfluxDB...")
+                self.influx_sink.close()
+                self.influx_sink = None
+            if getattr(self, 'mysql_writer', None):
+                logger.info("正在等待 MySQL 写入队列写完...")
+                self.mysql_writer.close()
+                self.mysql_writer = None
         except Exception as e:
             logger.error(f"清理资源时发生错误: {e}")
 
@@ -478,5 +789,13 @@ class MarketDataCollector:
         self.cleanup()
 
 if __name__ == "__main__":
-    collector = MarketDataCollector()
+    mark('模块加载')
+    parser = argparse.ArgumentParser(description='实时行情采集')
+    parser.add_argument('--once', action='store_true', help='采集一轮后退出，适合 cron / Kubernetes CronJob；没有品种采集成功时退出码为 1')
+    args = parser.parse_args()
+
+    collector = MarketDataCollector(once=args.once)
+    if args.once:
+        mark('初始化')
+        sys.exit(0 if collector.run_once() else 1)
     collector.run(fetch_historical=HISTORY_FETCH_ENABLED) 
\ No newline at end of file
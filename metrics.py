@@ -0,0 +1,231 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http_api import text_response
+
+# 默认的耗时分桶（秒），覆盖从内存操作到上游超时的范围
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """带标签的指标，每组标签值对应一个序列"""
+
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for key, value in series:
+            lines.extend(self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key, value):
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def total(self, **labels):
+        """所有标签值之和，给出标签时只统计匹配的序列"""
+        with self._lock:
+            return sum(
+                value for key, value in self._series.items()
+                if all(key[self.labels.index(name)] == str(v) for name, v in labels.items())
+            )
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._series[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    """累积分桶直方图，与 Prometheus histogram 相同：_bucket{le=...}、_sum、_count"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            series['counts'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """计时上下文，异常时同样记录耗时"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render_series(self, key, series):
+        lines = []
+        cumulative = 0
+        for bound, count in zip((*self.buckets, float('inf')), series['counts']):
+            cumulative += count
+            lines.append(
+                f"{self.name}_bucket{_format_labels(self.labels, key, [('le', _format_value(float(bound)))])} {cumulative}"
+            )
+        labels = _format_labels(self.labels, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(series['sum'])}")
+        lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+    def aggregate(self, by, **match):
+        """按一个标签合并各序列，返回 {标签值: (次数, 总耗时, p50, p95)}，分位数由分桶线性插值估算
+
+        给出 match 时只合并标签值匹配的序列。
+        """
+        position = self.labels.index(by)
+        merged = {}
+        with self._lock:
+            for key, series in self._series.items():
+                if any(key[self.labels.index(name)] != str(value) for name, value in match.items()):
+                    continue
+                target = merged.setdefault(key[position], {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0})
+                target['counts'] = [a + b for a, b in zip(target['counts'], series['counts'])]
+                target['sum'] += series['sum']
+                target['count'] += series['count']
+        return {
+            value: (series['count'], series['sum'], self._quantile(series, 0.5), self._quantile(series, 0.95))
+            for value, series in merged.items()
+        }
+
+    def _quantile(self, series, q):
+        if not series['count']:
+            return 0.0
+        rank = q * series['count']
+        cumulative = 0
+        lower = 0.0
+        for bound, count in zip((*self.buckets, self.buckets[-1]), series['counts']):
+            if count and cumulative + count >= rank:
+                return lower + (bound - lower) * (rank - cumulative) / count
+            cumulative += count
+            lower = bound
+        return self.buckets[-1]
+
+
+class Registry:
+    """指标注册表，render() 输出 Prometheus 文本格式"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# 上游请求：每次请求（含重试中的每一次）的耗时、重试和失败次数
+FETCH_SECONDS = REGISTRY.histogram(
+    'market_data_fetch_seconds', '上游请求耗时（每次尝试）', ('operation', 'symbol')
+)
+FETCH_RETRIES = REGISTRY.counter('market_data_fetch_retries_total', '上游请求重试次数', ('operation',))
+FETCH_FAILURES = REGISTRY.counter('market_data_fetch_failures_total', '上游请求失败次数（每次尝试）', ('operation',))
+FETCH_SKIPPED = REGISTRY.counter('market_data_fetch_skipped_total', '处于熔断隔离期而跳过的请求次数', ('symbol',))
+CIRCUIT_STATE = REGISTRY.gauge('market_data_circuit_state', '上游代码的熔断状态（0: closed, 1: half_open, 2: open）', ('symbol',))
+
+# 写入：enqueue 为采集线程放入缓冲区/队列的耗时，flush 为实际写入数据库的耗时
+WRITE_SECONDS = REGISTRY.histogram('market_data_write_seconds', '写入耗时', ('sink', 'stage'))
+ROWS_WRITTEN = REGISTRY.counter('market_data_rows_written_total', '写入数据库的行数', ('sink', 'table'))
+WRITE_RETRIES = REGISTRY.counter('market_data_write_retries_total', '数据库写入重试次数', ('sink',))
+WRITE_FAILURES = REGISTRY.counter('market_data_write_failures_total', '最终写入失败（丢弃）的行数', ('sink',))
+WRITE_QUEUE_DEPTH = REGISTRY.gauge('market_data_write_queue_depth', '等待写入的数据点数', ('sink',))
+POINTS_SUPPRESSED = REGISTRY.counter(
+    'market_data_points_suppressed_total', '写入前去重跳过的数据点数（duplicate: 重复，deadband: 死区内）',
+    ('measurement', 'reason')
+)
+
+# 采集循环
+POLL_INTERVAL_SECONDS = REGISTRY.gauge('market_data_poll_interval_seconds', '自适应调度分配的采集间隔', ('key',))
+CYCLE_SECONDS = REGISTRY.histogram('market_data_cycle_seconds', '每轮采集耗时（不含轮间等待）')
+SLEEP_SECONDS = REGISTRY.counter('market_data_sleep_seconds_total', 'time.sleep 等待的总秒数', ('reason',))
+
+
+def summary_line():
+    """各项指标的一行汇总，用于定期写入日志"""
+    parts = []
+    for operation, (count, total, p50, p95) in sorted(FETCH_SECONDS.aggregate('operation').items()):
+        parts.append(f"{operation} {count}次 p50={p50:.3f}s p95={p95:.3f}s 重试{FETCH_RETRIES.total(operation=operation):.0f}")
+    flushes = WRITE_SECONDS.aggregate('sink', stage='flush')
+    for sink in sorted(flushes):
+        count, total, p50, p95 = flushes[sink]
+        parts.append(
+            f"{sink} 写入{ROWS_WRITTEN.total(sink=sink):.0f}行 p95={p95:.3f}s "
+            f"重试{WRITE_RETRIES.total(sink=sink):.0f} 失败{WRITE_FAILURES.total(sink=sink):.0f}"
+        )
+    suppressed = POINTS_SUPPRESSED.total()
+    if suppressed:
+        parts.append(f"去重跳过 {suppressed:.0f} 点")
+    parts.append(f"等待 {SLEEP_SECONDS.total():.0f}s")
+    return ' | '.join(parts)
+
+
+def handle_metrics(request):
+    """GET /metrics  Prometheus 文本格式的全部指标"""
+    return text_response(REGISTRY.render(), 'text/plain; version=0.0.4; charset=utf-8')
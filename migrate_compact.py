@@ -0,0 +1,192 @@
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import date
+import mysql.connector
+from config import MYSQL_CONFIG
+from compact_schema import (
+    CREATE_SERIES_TABLE, CREATE_VALUES_TABLE, VALUES_TABLE, SERIES_COLUMNS,
+    month_partitions, partition_definitions
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 旧表到紧凑表的映射：series_key 表达式（与 compact_schema.series_key 一致）、标签列、数值列
+LEGACY_TABLES = {
+    'usd_index': {
+        'series_key': "''",
+        'tags': {},
+        'value': 't.value',
+        'volume': 'NULL',
+    },
+    'exchange_rates': {
+        'series_key': "CONCAT_WS(':', t.from_currency, t.to_currency)",
+        'tags': {'from_currency': 't.from_currency', 'to_currency': 't.to_currency'},
+        'value': 't.rate',
+        'volume': 'NULL',
+    },
+    'cross_rates': {
+        'series_key': "CONCAT_WS(':', t.from_currency, t.to_currency)",
+        'tags': {'from_currency': 't.from_currency', 'to_currency': 't.to_currency'},
+        'value': 't.rate',
+        'volume': 'NULL',
+    },
+    'stock_prices': {
+        'series_key': "CONCAT_WS(':', t.market, t.symbol)",
+        'tags': {'market': 't.market', 'symbol': 't.symbol', 'currency': 'MAX(t.currency)'},
+        'value': 't.price',
+        'volume': 't.volume',
+    },
+}
+
+
+class CompactMigration:
+    """把旧宽表的数据分块迁移到紧凑表结构
+
+    每块按 id 范围复制并单独提交，进度写入状态文件，中断后再次运行从上次的位置继续；
+    写入使用 ON DUPLICATE KEY UPDATE，重复执行不会产生重复数据。
+    """
+
+    def __init__(self, state_file='compact_migration.json'):
+        self.db = mysql.connector.connect(**MYSQL_CONFIG)
+        self.cursor = self.db.cursor()
+        self.state_file = state_file
+        self.state = {}
+        if os.path.exists(state_file):
+            with open(state_file, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+
+    def save_state(self):
+        with open(f"{self.state_file}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
+        os.replace(f"{self.state_file}.tmp", self.state_file)
+
+    def create_tables(self):
+        """创建 series 和 series_values 表"""
+        self.cursor.execute(CREATE_SERIES_TABLE)
+        self.cursor.execute(CREATE_VALUES_TABLE)
+        self.db.commit()
+        logger.info("已创建紧凑表结构: series, series_values")
+
+    def register_series(self, table):
+        """把旧表中出现的所有序列登记到 series 表"""
+        spec = LEGACY_TABLES[table]
+        tag_columns = [column for column in SERIES_COLUMNS if column in spec['tags']]
+        group_columns = [spec['tags'][column] for column in tag_columns if not spec['tags'][column].startswith('MAX(')]
+        columns = ', '.join(['measurement', 'series_key', *tag_columns])
+        values = ', '.join([f"'{table}'", spec['series_key'], *(spec['tags'][column] for column in tag_columns)])
+        group_by = f" GROUP BY {', '.join(group_columns)}" if group_columns else " LIMIT 1"
+        self.cursor.execute(
+            f"INSERT INTO series ({columns}) SELECT {values} FROM {table} t{group_by} "
+            f"ON DUPLICATE KEY UPDATE series_id = series_id"
+        )
+        self.db.commit()
+
+    def migrate_table(self, table, chunk_size):
+        """按 id 范围分块复制一张旧表，返回复制的行数"""
+        spec = LEGACY_TABLES[table]
+        self.register_series(table)
+
+        self.cursor.execute(f"SELECT MIN(id), MAX(id) FROM {table}")
+        min_id, max_id = self.cursor.fetchone()
+        if max_id is None:
+            logger.info(f"{table} 没有数据，跳过")
+            return 0
+
+        query = (
+            f"INSERT INTO {VALUES_TABLE} (series_id, timestamp, value, volume) "
+            f"SELECT s.series_id, t.timestamp, {spec['value']}, {spec['volume']} FROM {table} t "
+            f"JOIN series s ON s.measurement = %s AND s.series_key = {spec['series_key']} "
+            f"WHERE t.id > %s AND t.id <= %s "
+            f"ON DUPLICATE KEY UPDATE value = VALUES(value), volume = VALUES(volume)"
+        )
+        last_id = max(self.state.get(table, min_id - 1), min_id - 1)
+        copied = 0
+        started = time.monotonic()
+        while last_id < max_id:
+            upper = min(last_id + chunk_size, max_id)
+            self.cursor.execute(query, (table, last_id, upper))
+            self.db.commit()
+            copied += self.cursor.rowcount
+            last_id = upper
+            self.state[table] = last_id
+            self.save_state()
+
+            elapsed = max(time.monotonic() - started, 1e-6)
+            done = (last_id - min_id + 1) / (max_id - min_id + 1)
+            logger.info(f"迁移 {table}: id {last_id}/{max_id} ({done:.1%}), {copied / elapsed:.0f} 行/秒")
+        logger.info(f"{table} 迁移完成")
+        return copied
+
+    def migrate(self, tables, chunk_size):
+        self.create_tables()
+        for table in tables:
+            self.migrate_table(table, chunk_size)
+
+    def partition(self, months_ahead):
+        """按月对 series_values 做 RANGE 分区，已分区时把 pmax 拆分出新的月份"""
+        self.cursor.execute(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION",
+            (VALUES_TABLE,)
+        )
+        existing = [row[0] for row in self.cursor.fetchall()]
+
+        today = date.today()
+        last_month = date(today.year + (today.month - 1 + months_ahead) // 12, (today.month - 1 + months_ahead) % 12 + 1, 1)
+        if existing:
+            monthly = [name for name in existing if name != 'pmax']
+            newest = monthly[-1] if monthly else None
+            first_month = date(int(newest[1:5]), int(newest[5:7]), 1) if newest else today.replace(day=1)
+            partitions = month_partitions(first_month, last_month)[1 if newest else 0:]
+            if not partitions:
+                logger.info("分区已覆盖到目标月份，无需调整")
+                return
+            self.cursor.execute(
+                f"ALTER TABLE {VALUES_TABLE} REORGANIZE PARTITION pmax INTO (\n    {partition_definitions(partitions)}\n)"
+            )
+        else:
+            self.cursor.execute(f"SELECT MIN(timestamp) FROM {VALUES_TABLE}")
+            first = self.cursor.fetchone()[0]
+            first_month = (first.date() if first else today).replace(day=1)
+            partitions = month_partitions(first_month, last_month)
+            self.cursor.execute(
+                f"ALTER TABLE {VALUES_TABLE} PARTITION BY RANGE (TO_DAYS(timestamp)) (\n    {partition_definitions(partitions)}\n)"
+            )
+        logger.info(f"series_values 已按月分区至 {partitions[-1][0]}")
+
+    def close(self):
+        self.cursor.close()
+        self.db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='迁移到紧凑表结构 (series + series_values)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('create', help='创建紧凑表')
+    migrate_parser = subparsers.add_parser('migrate', help='分块复制旧表数据，可中断后继续')
+    migrate_parser.add_argument('--chunk-size', type=int, default=50000, help='每块复制的 id 数量')
+    migrate_parser.add_argument('--tables', nargs='+', choices=list(LEGACY_TABLES), default=list(LEGACY_TABLES))
+    migrate_parser.add_argument('--state-file', default='compact_migration.json', help='迁移进度文件')
+    partition_parser = subparsers.add_parser('partition', help='按月分区 series_values')
+    partition_parser.add_argument('--months-ahead', type=int, default=3, help='预先创建未来几个月的分区')
+    args = parser.parse_args()
+
+    migration = CompactMigration(getattr(args, 'state_file', 'compact_migration.json'))
+    try:
+        if args.command == 'create':
+            migration.create_tables()
+        elif args.command == 'migrate':
+            migration.migrate(args.tables, args.chunk_size)
+        elif args.command == 'partition':
+            migration.partition(args.months_ahead)
+    finally:
+        migration.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+-- 为已有数据库添加唯一键，批量写入依赖它在数据库端去重
+-- 执行前会删除重复行，每组重复数据保留 id 最小的一行
+USE market_data;
+
+-- 美元指数
+DELETE t1 FROM usd_index t1
+JOIN usd_index t2 ON t1.timestamp = t2.timestamp AND t1.id > t2.id;
+
+ALTER TABLE usd_index
+    DROP INDEX idx_timestamp,
+    ADD UNIQUE KEY uk_timestamp (timestamp);
+
+-- 汇率
+DELETE t1 FROM exchange_rates t1
+JOIN exchange_rates t2
+  ON t1.from_currency = t2.from_currency
+ AND t1.to_currency = t2.to_currency
+ AND t1.timestamp = t2.timestamp
+ AND t1.id > t2.id;
+
+ALTER TABLE exchange_rates
+    DROP INDEX idx_currency_pair,
+    ADD UNIQUE KEY uk_currency_pair_timestamp (from_currency, to_currency, timestamp);
+
+-- 股票价格
+DELETE t1 FROM stock_prices t1
+JOIN stock_prices t2
+  ON t1.market = t2.market
+ AND t1.symbol = t2.symbol
+ AND t1.timestamp = t2.timestamp
+ AND t1.id > t2.id;
+
+ALTER TABLE stock_prices
+    DROP INDEX idx_market_symbol,
+    ADD UNIQUE KEY uk_market_symbol_timestamp (market, symbol, timestamp);
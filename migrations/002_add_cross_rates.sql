@@ -0,0 +1,11 @@
+-- 交叉汇率表：由同一轮获取的 USD 汇率推导的非 USD 货币对（CROSS_RATES_ENABLED=true 时写入）
+USE market_data;
+
+CREATE TABLE IF NOT EXISTS cross_rates (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    timestamp DATETIME NOT NULL,
+    from_currency VARCHAR(10) NOT NULL,
+    to_currency VARCHAR(10) NOT NULL,
+    rate DECIMAL(20, 6) NOT NULL,
+    UNIQUE KEY uk_currency_pair_timestamp (from_currency, to_currency, timestamp)
+);
@@ -0,0 +1,341 @@
+import logging
+import queue
+import threading
+import time
+import mysql.connector
+from mysql.connector import pooling
+from config import (
+    MYSQL_CONFIG, MYSQL_BATCH_SIZE, MYSQL_ON_DUPLICATE, MYSQL_SCHEMA, ROLLUP_ENABLED,
+    MYSQL_WRITER_THREADS, MYSQL_WRITE_QUEUE_SIZE, MYSQL_WRITE_TIMEOUT
+)
+from compact_schema import (
+    COMPACT_MEASUREMENTS, SERIES_TABLE, VALUES_TABLE, VALUE_COLUMNS,
+    SeriesRegistry, to_compact_rows
+)
+from rollup import RollupEngine
+from metrics import ROWS_WRITTEN, WRITE_FAILURES, WRITE_RETRIES, WRITE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def build_insert_query(table, columns, update_columns=(), rows=1, on_duplicate='update'):
+    """构造多行插入语句，重复数据由唯一键在数据库端去重
+
+    on_duplicate='update' 时生成 INSERT ... ON DUPLICATE KEY UPDATE，
+    'ignore' 或没有可更新的列时生成 INSERT IGNORE。
+    """
+    column_list = ', '.join(columns)
+    row_placeholder = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    values = ', '.join([row_placeholder] * rows)
+
+    if on_duplicate == 'ignore' or not update_columns:
+        return f"INSERT IGNORE INTO {table} ({column_list}) VALUES {values}"
+
+    updates = ', '.join(f"{column} = VALUES({column})" for column in update_columns)
+    return f"INSERT INTO {table} ({column_list}) VALUES {values} ON DUPLICATE KEY UPDATE {updates}"
+
+
+def point_to_row(columns, tags, fields, timestamp):
+    """把数据点（时间戳 + 标签 + 字段）按表的列顺序转换为一行"""
+    values = {'timestamp': timestamp, **tags, **fields}
+    return tuple(values.get(column) for column in columns)
+
+
+class MySQLSink:
+    """MySQL 批量写入：按批次发送多行 INSERT，整段数据一个事务提交
+
+    schema='compact' 时调用方仍按旧表结构传入表名和列，写入时转换为 series / series_values 紧凑表。
+    """
+
+    def __init__(self, batch_size=MYSQL_BATCH_SIZE, on_duplicate=MYSQL_ON_DUPLICATE, connection=None,
+                 schema=MYSQL_SCHEMA, rollups=ROLLUP_ENABLED):
+        self.batch_size = max(1, batch_size)
+        self.on_duplicate = on_duplicate
+        self.compact = schema == 'compact'
+        self.series = SeriesRegistry()
+        self.rollups = RollupEngine(schema) if rollups else None
+        # 传入连接池中的连接时，close() 会把连接归还给连接池
+        self.db = connection if connection is not None else mysql.connector.connect(**MYSQL_CONFIG)
+        self.cursor = self.db.cursor()
+
+    def write_rows(self, table, columns, rows, update_columns=()):
+        """在一个事务中分批写入多行，返回提交的行数"""
+        if not rows:
+            return 0
+
+        measurement, raw_columns, raw_rows = table, columns, rows
+        started = time.perf_counter()
+        try:
+            self.db.ping(reconnect=True)
+            if self.compact and table in COMPACT_MEASUREMENTS:
+                rows = to_compact_rows(self.cursor, self.series, table, columns, rows)
+                table, columns, update_columns = VALUES_TABLE, VALUE_COLUMNS, ('value', 'volume')
+            for offset in range(0, len(rows), self.batch_size):
+                batch = rows[offset:offset + self.batch_size]
+                query = build_insert_query(
+                    table, columns, update_columns,
+                    rows=len(batch),
+                    on_duplicate=self.on_duplicate
+                )
+                self.cursor.execute(query, [value for row in batch for value in row])
+            self.db.commit()
+        except mysql.connector.Error as e:
+            logger.error(f"MySQL批量写入 {table} 失败 ({len(rows)} 行): {e}")
+            self.series.clear()
+            try:
+                self.db.rollback()
+            except mysql.connector.Error:
+                pass
+            raise
+        finally:
+            WRITE_SECONDS.observe(time.perf_counter() - started, sink='mysql', stage='flush')
+
+        ROWS_WRITTEN.inc(len(rows), sink='mysql', table=measurement)
+        if self.rollups:
+            self.update_rollups(measurement, raw_columns, raw_rows)
+        return len(rows)
+
+    def update_rollups(self, measurement, columns, rows):
+        """原始数据提交后刷新涉及的汇总周期；失败只记录日志，原始数据不受影响"""
+        try:
+            self.rollups.update(self.cursor, measurement, list(columns), rows)
+            self.db.commit()
+        except Exception as e:
+            logger.error(f"更新 {measurement} 汇总失败，可执行 python rollup.py rebuild 重建: {e}")
+            try:
+                self.db.rollback()
+            except mysql.connector.Error:
+                pass
+
+    def write_points(self, points, tables):
+        """按 measurement 分表写入一组数据点，tables 为 {measurement: (columns, update_columns)}"""
+        groups = {}
+        for point in points:
+            if point['measurement'] not in tables:
+                logger.warning(f"忽略未知 measurement 的数据点: {point['measurement']}")
+                continue
+            columns, _ = tables[point['measurement']]
+            groups.setdefault(point['measurement'], []).append(
+                point_to_row(columns, point['tags'], point['fields'], point['timestamp'])
+            )
+
+        written = 0
+        for table, rows in groups.items():
+            columns, update_columns = tables[table]
+            written += self.write_rows(table, columns, rows, update_columns)
+        return written
+
+    def latest_timestamps(self, table, key_columns=()):
+        """一次查询返回表中每个序列的最新时间戳: {(key...): timestamp}"""
+        keys = ', '.join(key_columns)
+        params = ()
+        if self.compact and table in COMPACT_MEASUREMENTS:
+            # 按聚簇主键 (series_id, timestamp) 取每个序列的最大时间戳
+            series_keys = ''.join(f"s.{column}, " for column in key_columns)
+            query = (
+                f"SELECT {series_keys}MAX(v.timestamp) FROM {VALUES_TABLE} v "
+                f"JOIN {SERIES_TABLE} s ON s.series_id = v.series_id "
+                f"WHERE s.measurement = %s GROUP BY s.series_id"
+            )
+            params = (table,)
+        elif key_columns:
+            query = f"SELECT {keys}, MAX(timestamp) FROM {table} GROUP BY {keys}"
+        else:
+            query = f"SELECT MAX(timestamp) FROM {table}"
+        self.cursor.execute(query, params)
+        return {
+            tuple(row[:-1]): row[-1]
+            for row in self.cursor.fetchall()
+            if row[-1] is not None
+        }
+
+    def latest_rows(self, table, key_columns=(), value_columns=()):
+        """一次查询返回表中每个序列最新的一行: {(key...): (timestamp, (value...))}"""
+        if self.compact and table in COMPACT_MEASUREMENTS:
+            spec = COMPACT_MEASUREMENTS[table]
+            series_keys = ''.join(f"s.{column}, " for column in key_columns)
+            values = ', '.join(
+                'v.value' if column == spec['value'] else 'v.volume' if column == spec['volume'] else 'NULL'
+                for column in value_columns
+            )
+            query = (
+                f"SELECT {series_keys}v.timestamp, {values} FROM {VALUES_TABLE} v "
+                f"JOIN {SERIES_TABLE} s ON s.series_id = v.series_id "
+                f"JOIN (SELECT series_id, MAX(timestamp) AS timestamp FROM {VALUES_TABLE} GROUP BY series_id) m "
+                f"ON m.series_id = v.series_id AND m.timestamp = v.timestamp "
+                f"WHERE s.measurement = %s"
+            )
+            self.cursor.execute(query, (table,))
+        else:
+            values = ', '.join(f"t.{column}" for column in value_columns)
+            if key_columns:
+                keys = ', '.join(key_columns)
+                join = ' AND '.join(f"t.{column} = m.{column}" for column in key_columns)
+                query = (
+                    f"SELECT {', '.join(f't.{column}' for column in key_columns)}, t.timestamp, {values} FROM {table} t "
+                    f"JOIN (SELECT {keys}, MAX(timestamp) AS timestamp FROM {table} GROUP BY {keys}) m "
+                    f"ON {join} AND t.timestamp = m.timestamp"
+                )
+            else:
+                query = f"SELECT t.timestamp, {values} FROM {table} t ORDER BY t.timestamp DESC LIMIT 1"
+            self.cursor.execute(query)
+        width = len(key_columns)
+        return {
+            tuple(row[:width]): (row[width], tuple(row[width + 1:]))
+            for row in self.cursor.fetchall()
+        }
+
+    def close(self):
+        """关闭游标和连接"""
+        if self.cursor:
+            self.cursor.close()
+            self.cursor = None
+        if self.db:
+            self.db.close()
+            self.db = None
+
+
+class MySQLWriter:
+    """MySQL 写入线程：采集线程只把数据点放入有界队列，写入线程从连接池取连接批量写入
+
+    慢提交不会拖住下一次上游请求；队列满时 put() 阻塞等待（背压），
+    超过 MYSQL_WRITE_TIMEOUT 秒仍无空位则放弃该数据点。
+    tables 为 {measurement: (columns, update_columns)}。
+    """
+
+    def __init__(self, tables, threads=MYSQL_WRITER_THREADS, queue_size=MYSQL_WRITE_QUEUE_SIZE,
+                 batch_size=MYSQL_BATCH_SIZE, put_timeout=MYSQL_WRITE_TIMEOUT, retries=3):
+        self.tables = tables
+        self.batch_size = max(1, batch_size)
+        self.put_timeout = put_timeout
+        self.retries = retries
+        threads = max(1, threads)
+        self.pool = pooling.MySQLConnectionPool(
+            pool_name='market_data_writer',
+            pool_size=threads,
+            **MYSQL_CONFIG
+        )
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.stats = {'written': 0, 'failed': 0, 'batches': 0, 'blocked': 0, 'blocked_seconds': 0.0, 'max_depth': 0}
+        self._stats_lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._run, name=f'mysql-writer-{i}', daemon=True)
+            for i in range(threads)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def depth(self):
+        """队列中等待写入的数据点数"""
+        return self.queue.qsize()
+
+    def put(self, point):
+        """放入一个数据点，队列满时阻塞等待，超时返回 False"""
+        try:
+            self.queue.put_nowait(point)
+        except queue.Full:
+            logger.warning(f"MySQL写入队列已满 ({self.queue.maxsize})，等待写入线程...")
+            started = time.monotonic()
+            try:
+                self.queue.put(point, timeout=self.put_timeout)
+            except queue.Full:
+                logger.error(f"MySQL写入队列 {self.put_timeout:.0f} 秒内没有空位，丢弃数据点: {point['measurement']}")
+                WRITE_FAILURES.inc(sink='mysql')
+                with self._stats_lock:
+                    self.stats['failed'] += 1
+                return False
+            finally:
+                with self._stats_lock:
+                    self.stats['blocked'] += 1
+                    self.stats['blocked_seconds'] += time.monotonic() - started
+
+        depth = self.queue.qsize()
+        if depth > self.stats['max_depth']:
+            with self._stats_lock:
+                self.stats['max_depth'] = max(self.stats['max_depth'], depth)
+        return True
+
+    def _run(self):
+        """写入线程：取出一批数据点写入，收到 None 时写完手上的数据后退出
+
+        每个线程在整个生命周期内复用一个 MySQLSink（连接、series_id 缓存和汇总引擎），
+        只有出现非数据库错误时才丢弃重建。
+        """
+        sink = None
+        try:
+            while True:
+                point = self.queue.get()
+                stop = point is None
+                batch = [] if stop else [point]
+                while not stop and len(batch) < self.batch_size:
+                    try:
+                        point = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if point is None:
+                        stop = True
+                    else:
+                        batch.append(point)
+                if batch:
+                    sink = self._write(batch, sink)
+                if stop:
+                    return
+        finally:
+            self._close_sink(sink)
+
+    def _write(self, batch, sink=None):
+        """写入一批数据点，失败时重试，最终失败则丢弃并记录；返回之后继续使用的 sink
+
+        数据库错误时 write_rows 已回滚并清空 series_id 缓存，sink 继续使用（ping 会重连）；
+        其他错误时事务状态未知，关闭 sink，下一批重新建立。
+        """
+        for attempt in range(self.retries):
+            try:
+                if sink is None:
+                    sink = MySQLSink(batch_size=self.batch_size, connection=self.pool.get_connection())
+                sink.write_points(batch, self.tables)
+                with self._stats_lock:
+                    self.stats['written'] += len(batch)
+                    self.stats['batches'] += 1
+                return sink
+            except mysql.connector.Error as e:
+                logger.error(f"MySQL写入错误 (尝试 {attempt + 1}/{self.retries}, {len(batch)} 个点): {e}")
+                if attempt < self.retries - 1:
+                    WRITE_RETRIES.inc(sink='mysql')
+                    time.sleep(1 * (attempt + 1))  # 递增等待时间
+            except Exception as e:
+                # 数据转换等非数据库错误重试也不会成功；不能让异常结束写入线程，否则队列无人消费
+                logger.error(f"MySQL写入出错 ({len(batch)} 个点): {type(e).__name__}: {e}")
+                self._close_sink(sink)
+                sink = None
+                break
+        logger.error(f"MySQL写入最终失败，丢弃 {len(batch)} 个点")
+        WRITE_FAILURES.inc(len(batch), sink='mysql')
+        with self._stats_lock:
+            self.stats['failed'] += len(batch)
+        return sink
+
+    def _close_sink(self, sink):
+        """回滚未提交的数据并把连接归还给连接池"""
+        if sink is None:
+            return
+        try:
+            sink.db.rollback()
+        except Exception:
+            pass
+        try:
+            sink.close()
+        except mysql.connector.Error:
+            pass
+
+    def close(self):
+        """等待队列中的数据写完后停止写入线程"""
+        for _ in self._threads:
+            self.queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        logger.info(
+            f"MySQL写入统计: 成功 {self.stats['written']} 个点 / {self.stats['batches']} 批, "
+            f"失败 {self.stats['failed']} 个点, 队列最大深度 {self.stats['max_depth']}, "
+            f"队列满等待 {self.stats['blocked']} 次共 {self.stats['blocked_seconds']:.1f} 秒"
+        )
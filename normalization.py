@@ -0,0 +1,100 @@
+import logging
+from decimal import Decimal, ROUND_HALF_UP
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 与最近的整数 / 半数 / 四分位数之差小于该值时直接取整
+SNAP_TOLERANCE = 0.0001
+
+# 实时采集：吸附到整数、x.5、x.25/x.75，其余保留6位小数
+COLLECTOR_ROUNDING = {'places': 6, 'snap_steps': (1, 2, 4)}
+# 历史导入：只吸附到整数，其余保留4位小数
+IMPORTER_ROUNDING = {'places': 4, 'snap_steps': (1,)}
+
+
+def round_decimal(value, places=6, snap_steps=(1, 2, 4)):
+    """智能四舍五入处理数值（逐个值的参考实现）
+
+    依次检查是否接近 1/step 的整数倍（step 取自 snap_steps），
+    接近则直接吸附；否则按 ROUND_HALF_UP 保留 places 位小数。
+    """
+    try:
+        if isinstance(value, (float, int)):
+            value = str(value)
+        dec = Decimal(value)
+
+        for step in snap_steps:
+            nearest = round(float(dec) * step) / step
+            if abs(float(dec) - nearest) < SNAP_TOLERANCE:
+                return float(nearest)
+
+        return float(dec.quantize(Decimal(1).scaleb(-places), rounding=ROUND_HALF_UP))
+    except Exception as e:
+        logger.error(f"数值转换错误 {value}: {e}")
+        return value
+
+
+def round_decimal_array(values, places=6, snap_steps=(1, 2, 4)):
+    """round_decimal 的向量化版本，对整列数值一次完成吸附和量化
+
+    结果与逐个调用 round_decimal 完全一致；NaN/inf 原样返回 NaN。
+    二进制误差可能影响进位的临界值（接近 x.5 个最小单位）会回退到
+    Decimal 逐个计算，这类值极少，不影响整体速度。
+    """
+    x = np.asarray(values, dtype='float64')
+    result = np.full(x.shape, np.nan)
+    done = ~np.isfinite(x)
+
+    with np.errstate(invalid='ignore', over='ignore'):
+        for step in snap_steps:
+            nearest = np.round(x * step) / step
+            hit = ~done & (np.abs(x - nearest) < SNAP_TOLERANCE)
+            result[hit] = nearest[hit] + 0.0  # 与 round() 一致，不产生 -0.0
+            done |= hit
+
+        scale = 10.0 ** places
+        scaled = np.abs(x * scale)
+        quantized = np.floor(scaled + 0.5)
+        fraction = scaled - np.floor(scaled)
+        ambiguous = ~done & (
+            (np.abs(fraction - 0.5) < scaled * 1e-13 + 1e-9) | (scaled >= 2.0 ** 52)
+        )
+        rest = ~done & ~ambiguous
+        result[rest] = np.copysign(quantized[rest], x[rest]) / scale
+
+    for i in np.flatnonzero(ambiguous):
+        result[i] = round_decimal(float(x[i]), places, snap_steps)
+    return result
+
+
+def column_values(data, name):
+    """取出单列数值，兼容 yfinance 单代码下载返回的 (Price, Ticker) 多级列"""
+    column = data[name]
+    if getattr(column, 'ndim', 1) > 1:
+        column = column.iloc[:, 0]
+    return pd.to_numeric(column, errors='coerce').to_numpy(dtype='float64')
+
+
+def normalize_bars(data, rounding=IMPORTER_ROUNDING, transform=None):
+    """把下载的K线整列转换为可直接写入的数值
+
+    返回以原时间索引为索引、包含 value / volume 两列的 DataFrame：value 为处理后的
+    Close（可先经过 transform 换算），收盘价无效的行被丢弃，缺失的成交量记为0。
+    """
+    close = column_values(data, 'Close')
+    if transform is not None:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            close = transform(close)
+
+    if 'Volume' in data:
+        volume = np.nan_to_num(column_values(data, 'Volume'), nan=0.0, posinf=0.0, neginf=0.0)
+    else:
+        volume = np.zeros(len(close))
+
+    valid = np.isfinite(close)
+    return pd.DataFrame({
+        'value': round_decimal_array(close[valid], **rounding),
+        'volume': np.trunc(volume[valid]).astype('int64')
+    }, index=data.index[valid])
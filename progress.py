@@ -0,0 +1,88 @@
+import logging
+import threading
+import time
+from config import PROGRESS_LOG_INTERVAL, LOG_DETAIL_SAMPLE
+
+logger = logging.getLogger(__name__)
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+class ProgressReporter:
+    """汇总导入 / 采集进度：按序列累计行数和错误，每隔 interval 秒输出一行摘要（行/秒、预计剩余时间、错误数）
+
+    逐行、逐个数据点的明细通过 detail() 记录：默认只在 DEBUG 级别输出，
+    sample_every > 0 时每 sample_every 条明细以 INFO 输出一条，日志量与数据行数无关。
+    """
+
+    def __init__(self, name, total=None, unit='个', interval=PROGRESS_LOG_INTERVAL,
+                 sample_every=LOG_DETAIL_SAMPLE, log=logger):
+        self.name = name
+        self.total = total
+        self.unit = unit
+        self.interval = interval
+        self.sample_every = sample_every
+        self.log = log
+        self.done = 0
+        self.rows = 0
+        self.errors = 0
+        self.series = {}
+        self.started = time.monotonic()
+        self._logged_at = self.started
+        self._details = 0
+        self._lock = threading.Lock()
+
+    def detail(self, message, *args):
+        """逐条明细，参数延迟格式化，未输出时没有格式化开销"""
+        with self._lock:
+            self._details += 1
+            sampled = self.sample_every > 0 and self._details % self.sample_every == 0
+        if sampled:
+            self.log.info(message, *args)
+        elif self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug(message, *args)
+
+    def advance(self, series, rows=0, errors=0, done=1):
+        """完成一个单位（数据段、品种）的处理"""
+        with self._lock:
+            self.done += done
+            self.rows += rows
+            self.errors += errors
+            stats = self.series.setdefault(series, {'rows': 0, 'errors': 0})
+            stats['rows'] += rows
+            stats['errors'] += errors
+        self.maybe_log()
+
+    def maybe_log(self, force=False):
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._logged_at < self.interval:
+                return
+            self._logged_at = now
+            done, rows, errors = self.done, self.rows, self.errors
+        elapsed = max(now - self.started, 1e-6)
+        progress = f"{done}/{self.total}" if self.total else f"{done}"
+        if self.total:
+            progress += f" ({done / self.total:.1%})"
+        eta = ''
+        if self.total and 0 < done < self.total:
+            eta = f", 预计剩余 {format_duration((self.total - done) * elapsed / done)}"
+        self.log.info(
+            f"{self.name}进度: {progress} {self.unit}, {rows} 行, {rows / elapsed:.0f} 行/秒, "
+            f"错误 {errors}{eta}"
+        )
+
+    def finish(self):
+        """输出最终汇总，有错误时列出出错的序列"""
+        elapsed = time.monotonic() - self.started
+        failed = sorted(series for series, stats in self.series.items() if stats['errors'])
+        self.log.info(
+            f"{self.name}完成: {self.done} {self.unit}, {self.rows} 行, 耗时 {format_duration(elapsed)}, "
+            f"{self.rows / max(elapsed, 1e-6):.0f} 行/秒, 错误 {self.errors}"
+        )
+        if failed:
+            shown = ', '.join(failed[:20]) + (f" 等 {len(failed)} 个" if len(failed) > 20 else '')
+            self.log.warning(f"{self.name}出错的序列: {shown}")
@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import deque
+from config import QUOTE_BUFFER_SIZE
+from http_api import json_response
+
+MAX_POINTS = 10000
+
+
+def quote_key(measurement, tags):
+    """数据点对应的品种标识，与采集器的 instrument key 一致: usd_index、USD/JPY、HK:^HSI"""
+    if measurement in ('exchange_rates', 'cross_rates'):
+        return f"{tags['from_currency']}/{tags['to_currency']}"
+    if measurement == 'stock_prices':
+        return f"{tags['market']}:{tags['symbol']}"
+    return measurement
+
+
+class QuoteStore:
+    """内存中的最新行情：每个品种保留最近 size 个数据点的环形缓冲区
+
+    同一时间戳重复采集时覆盖最后一个点，早于最后一个点的数据（如历史补数）不会进入缓冲区。
+    先后按时间点比较（不同时区的时间戳换算后比较），ISO 字符串只用于输出。
+    每次变化都会递增版本号，用于 HTTP 接口的 ETag / Last-Modified。
+    """
+
+    def __init__(self, size=QUOTE_BUFFER_SIZE):
+        self.size = max(1, size)
+        self._buffers = {}
+        self._last = {}
+        self._versions = {}
+        self._updated = {}
+        self.version = 0
+        self.updated = None
+        self._lock = threading.Lock()
+
+    def add(self, key, measurement, tags, fields, timestamp):
+        """记录一个数据点，返回是否进入了缓冲区"""
+        quote = {'key': key, 'measurement': measurement, 'timestamp': timestamp.isoformat(), **tags, **fields}
+        # 带时区的时间戳换算为同一时间点；不带时区的按 Python 约定视为本地时间
+        instant = timestamp.timestamp()
+        with self._lock:
+            buffer = self._buffers.setdefault(key, deque(maxlen=self.size))
+            if buffer:
+                last = self._last[key]
+                if instant < last:
+                    return False
+                if instant == last:
+                    if buffer[-1] == quote:
+                        return False
+                    buffer.pop()
+            buffer.append(quote)
+            self._last[key] = instant
+            self.version += 1
+            self.updated = time.time()
+            self._versions[key] = self.version
+            self._updated[key] = self.updated
+        return True
+
+    def latest(self, key=None):
+        """返回一个品种的最新数据点；key 为 None 时返回所有品种的最新数据点"""
+        with self._lock:
+            if key is None:
+                return {k: buffer[-1] for k, buffer in self._buffers.items() if buffer}
+            buffer = self._buffers.get(key)
+            return buffer[-1] if buffer else None
+
+    def history(self, key, points):
+        """返回一个品种最近 points 个数据点（按时间升序）"""
+        with self._lock:
+            buffer = self._buffers.get(key)
+            return list(buffer)[-points:] if buffer else []
+
+    def state(self, key=None):
+        """返回 (版本号, 最后更新时间)，用于条件请求"""
+        with self._lock:
+            if key is None:
+                return self.version, self.updated
+            return self._versions.get(key), self._updated.get(key)
+
+
+def handle_quotes(store, request):
+    """GET /quotes                  所有品种的最新数据
+       GET /quotes/<key>            单个品种的最新数据，如 /quotes/USD/JPY、/quotes/HK:^HSI
+       GET /quotes/<key>?points=N   单个品种最近 N 个数据点
+    """
+    key = request.path or None
+    version, updated = store.state(key)
+    if key is None:
+        return json_response(request, store.latest(), version, updated)
+    if version is None:
+        return json_response(request, {'error': f'unknown symbol: {key}'}, status=404)
+
+    points = request.param('points')
+    if points is None:
+        return json_response(request, store.latest(key), version, updated)
+    try:
+        points = min(max(1, int(points)), MAX_POINTS)
+    except ValueError:
+        return json_response(request, {'error': 'points must be an integer'}, status=400)
+    return json_response(request, store.history(key, points), f"{version}-{points}", updated)
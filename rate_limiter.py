@@ -0,0 +1,37 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """令牌桶限速器：所有线程共享，控制对上游的总请求速率
+
+    rate 为每秒补充的令牌数（即平均请求速率），capacity 为允许的突发请求数。
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(capacity))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1):
+        """取走令牌，令牌不足时阻塞等待，返回等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
@@ -0,0 +1,268 @@
+import argparse
+import logging
+import threading
+from datetime import datetime, timedelta
+import pandas as pd
+from config import MYSQL_SCHEMA
+from compact_schema import COMPACT_MEASUREMENTS, SERIES_TABLE, VALUES_TABLE, series_key
+
+logger = logging.getLogger(__name__)
+
+# 汇总级别：1h 由原始数据计算，1d 由 1h 汇总，1w 由 1d 汇总
+ROLLUP_LEVELS = ('1h', '1d', '1w')
+ROLLUP_COLUMNS = ('measurement', 'series_key', 'bucket', 'open', 'high', 'low', 'close', 'volume', 'samples')
+ROLLUP_ROW = '(' + ', '.join(['%s'] * len(ROLLUP_COLUMNS)) + ')'
+# 汇总结果按主键覆盖，重复计算同一周期结果不变
+ROLLUP_UPSERT = (
+    "INSERT INTO rollup_{level} (" + ', '.join(ROLLUP_COLUMNS) + ") VALUES {values} "
+    "ON DUPLICATE KEY UPDATE " + ', '.join(f"{column} = VALUES({column})" for column in ROLLUP_COLUMNS[3:])
+)
+
+CREATE_ROLLUP_TABLE = """
+CREATE TABLE IF NOT EXISTS rollup_{level} (
+    measurement VARCHAR(32) NOT NULL,
+    series_key VARCHAR(64) NOT NULL,
+    bucket DATETIME NOT NULL,
+    open DECIMAL(20, 6) NOT NULL,
+    high DECIMAL(20, 6) NOT NULL,
+    low DECIMAL(20, 6) NOT NULL,
+    close DECIMAL(20, 6) NOT NULL,
+    volume BIGINT NOT NULL,
+    samples INT NOT NULL,
+    PRIMARY KEY (measurement, series_key, bucket)
+) ENGINE=InnoDB
+"""
+
+
+def bucket_start(timestamps, level):
+    """返回每个时间点所在汇总周期的起点，周线从周一开始"""
+    if level == '1h':
+        return timestamps.dt.floor('h')
+    days = timestamps.dt.floor('D')
+    if level == '1d':
+        return days
+    return days - pd.to_timedelta(days.dt.weekday, unit='D')
+
+
+def bucket_range(start, end, level):
+    """覆盖 [start, end] 的完整汇总周期范围 [lower, upper)"""
+    bounds = bucket_start(pd.Series([pd.Timestamp(start), pd.Timestamp(end)]), level)
+    step = {'1h': timedelta(hours=1), '1d': timedelta(days=1), '1w': timedelta(days=7)}[level]
+    return bounds[0].to_pydatetime(), bounds[1].to_pydatetime() + step
+
+
+def aggregate(frame, level):
+    """把 (series_key, timestamp, open, high, low, close, volume, samples) 按序列和周期聚合为 OHLC"""
+    frame = frame.sort_values('timestamp')
+    grouped = frame.groupby([frame['series_key'], bucket_start(frame['timestamp'], level)], sort=True)
+    return pd.DataFrame({
+        'open': grouped['open'].first(),
+        'high': grouped['high'].max(),
+        'low': grouped['low'].min(),
+        'close': grouped['close'].last(),
+        'volume': grouped['volume'].sum(),
+        'samples': grouped['samples'].sum(),
+    })
+
+
+def to_naive(timestamp):
+    """数据库中保存的是去掉时区的时间，汇总时按同样的方式处理"""
+    return timestamp.replace(tzinfo=None) if getattr(timestamp, 'tzinfo', None) else timestamp
+
+
+class RollupEngine:
+    """增量维护 1h / 1d / 1w OHLC 汇总表
+
+    每批原始数据写入后，只重新计算这批数据涉及的周期：1h 周期读取原始数据，
+    1d 读取 1h、1w 读取 1d，每个周期最多读取几十行；未涉及的已收盘周期不会重新计算。
+    一批数据涉及的所有序列一起计算，每个汇总级别一次读取、一次写入。
+    汇总结果按主键覆盖写入，重复回放同一批数据不会造成重复累计。
+    汇总表在每个进程第一次更新前自动创建。
+    """
+
+    _tables_ready = False
+    _tables_lock = threading.Lock()
+
+    def __init__(self, schema=MYSQL_SCHEMA):
+        self.compact = schema == 'compact'
+
+    def create_tables(self, cursor):
+        for level in ROLLUP_LEVELS:
+            cursor.execute(CREATE_ROLLUP_TABLE.format(level=level))
+        RollupEngine._tables_ready = True
+
+    def ensure_tables(self, cursor):
+        """本进程还没有建过汇总表时建表（CREATE TABLE IF NOT EXISTS）"""
+        if RollupEngine._tables_ready:
+            return
+        with RollupEngine._tables_lock:
+            if not RollupEngine._tables_ready:
+                self.create_tables(cursor)
+
+    def read_raw(self, cursor, measurement, bounds):
+        """读取多个序列的原始数据，bounds 为 {key_values: (start, end)}，每个序列读取 [start, end)"""
+        spec = COMPACT_MEASUREMENTS[measurement]
+        params = []
+        if self.compact:
+            for key_values, (start, end) in bounds.items():
+                params += [series_key(key_values), start, end]
+            conditions = ' OR '.join(['(s.series_key = %s AND v.timestamp >= %s AND v.timestamp < %s)'] * len(bounds))
+            cursor.execute(
+                f"SELECT s.series_key, v.timestamp, v.value, COALESCE(v.volume, 0) FROM {VALUES_TABLE} v "
+                f"JOIN {SERIES_TABLE} s ON s.series_id = v.series_id "
+                f"WHERE s.measurement = %s AND ({conditions})",
+                (measurement, *params)
+            )
+            rows = cursor.fetchall()
+        else:
+            for key_values, (start, end) in bounds.items():
+                params += [*key_values, start, end]
+            volume = f"COALESCE({spec['volume']}, 0)" if spec['volume'] else '0'
+            keys = ''.join(f"{column}, " for column in spec['keys'])
+            condition = '(' + ''.join(f"{column} = %s AND " for column in spec['keys']) + 'timestamp >= %s AND timestamp < %s)'
+            cursor.execute(
+                f"SELECT {keys}timestamp, {spec['value']}, {volume} FROM {measurement} "
+                f"WHERE {' OR '.join([condition] * len(bounds))}",
+                params
+            )
+            width = len(spec['keys'])
+            rows = [(series_key(row[:width]), *row[width:]) for row in cursor.fetchall()]
+        frame = pd.DataFrame(rows, columns=['series_key', 'timestamp', 'value', 'volume'])
+        frame['timestamp'] = pd.to_datetime(frame['timestamp'])
+        value = frame['value'].astype(float)
+        return pd.DataFrame({
+            'series_key': frame['series_key'],
+            'timestamp': frame['timestamp'],
+            'open': value, 'high': value, 'low': value, 'close': value,
+            'volume': frame['volume'].astype('int64'),
+            'samples': 1,
+        })
+
+    def read_rollup(self, cursor, level, measurement, bounds):
+        """读取下一级汇总表中多个序列的数据，bounds 为 {key_values: (start, end)}"""
+        params = [measurement]
+        for key_values, (start, end) in bounds.items():
+            params += [series_key(key_values), start, end]
+        conditions = ' OR '.join(['(series_key = %s AND bucket >= %s AND bucket < %s)'] * len(bounds))
+        cursor.execute(
+            f"SELECT series_key, bucket, open, high, low, close, volume, samples FROM rollup_{level} "
+            f"WHERE measurement = %s AND ({conditions})",
+            params
+        )
+        frame = pd.DataFrame(
+            cursor.fetchall(),
+            columns=['series_key', 'timestamp', 'open', 'high', 'low', 'close', 'volume', 'samples']
+        )
+        frame['timestamp'] = pd.to_datetime(frame['timestamp'])
+        for column in ('open', 'high', 'low', 'close'):
+            frame[column] = frame[column].astype(float)
+        return frame
+
+    def write_rollup(self, cursor, level, measurement, bars):
+        if bars.empty:
+            return 0
+        rows = [
+            (measurement, key, bucket.to_pydatetime(), float(row.open), float(row.high), float(row.low),
+             float(row.close), int(row.volume), int(row.samples))
+            for (key, bucket), row in zip(bars.index, bars.itertuples())
+        ]
+        cursor.execute(
+            ROLLUP_UPSERT.format(level=level, values=', '.join([ROLLUP_ROW] * len(rows))),
+            [value for row in rows for value in row]
+        )
+        return len(rows)
+
+    def refresh(self, cursor, measurement, ranges):
+        """重新计算多个序列涉及的所有周期，ranges 为 {key_values: (start, end)}，每个序列覆盖 [start, end]"""
+        for level, child in (('1h', None), ('1d', '1h'), ('1w', '1d')):
+            bounds = {key_values: bucket_range(start, end, level) for key_values, (start, end) in ranges.items()}
+            if child is None:
+                source = self.read_raw(cursor, measurement, bounds)
+            else:
+                source = self.read_rollup(cursor, child, measurement, bounds)
+            self.write_rollup(cursor, level, measurement, aggregate(source, level))
+
+    def update(self, cursor, measurement, columns, rows):
+        """原始数据写入后调用：按序列找出这批数据的时间范围，一次刷新所有涉及的周期"""
+        if measurement not in COMPACT_MEASUREMENTS or not rows:
+            return
+        self.ensure_tables(cursor)
+        spec = COMPACT_MEASUREMENTS[measurement]
+        key_indexes = [columns.index(column) for column in spec['keys']]
+        timestamp_index = columns.index('timestamp')
+
+        ranges = {}
+        for row in rows:
+            key_values = tuple(row[i] for i in key_indexes)
+            timestamp = to_naive(row[timestamp_index])
+            lower, upper = ranges.get(key_values, (timestamp, timestamp))
+            ranges[key_values] = (min(lower, timestamp), max(upper, timestamp))
+
+        self.refresh(cursor, measurement, ranges)
+
+    def list_series(self, cursor, measurement):
+        """列出一个 measurement 的所有序列及其时间范围: [(key_values, first, last)]"""
+        spec = COMPACT_MEASUREMENTS[measurement]
+        if self.compact:
+            key_columns = ''.join(f"s.{column}, " for column in spec['keys'])
+            cursor.execute(
+                f"SELECT {key_columns}MIN(v.timestamp), MAX(v.timestamp) FROM {VALUES_TABLE} v "
+                f"JOIN {SERIES_TABLE} s ON s.series_id = v.series_id "
+                f"WHERE s.measurement = %s GROUP BY s.series_id",
+                (measurement,)
+            )
+        else:
+            keys = ', '.join(spec['keys'])
+            group_by = f" GROUP BY {keys}" if keys else ''
+            cursor.execute(
+                f"SELECT {keys + ', ' if keys else ''}MIN(timestamp), MAX(timestamp) FROM {measurement}{group_by}"
+            )
+        return [
+            (tuple(row[:-2]), row[-2], row[-1])
+            for row in cursor.fetchall()
+            if row[-1] is not None
+        ]
+
+    def rebuild(self, db, measurements=None, window_days=28):
+        """从原始数据重建全部汇总，按周对齐的时间窗口逐段计算并提交"""
+        cursor = db.cursor()
+        self.create_tables(cursor)
+        db.commit()
+        for measurement in measurements or COMPACT_MEASUREMENTS:
+            for key_values, first, last in self.list_series(cursor, measurement):
+                label = f"{measurement}:{series_key(key_values)}"
+                window_start, _ = bucket_range(first, first, '1w')
+                windows = 0
+                while window_start <= last:
+                    window_end = window_start + timedelta(days=window_days)
+                    self.refresh(cursor, measurement, {key_values: (window_start, min(window_end - timedelta(microseconds=1), last))})
+                    db.commit()
+                    window_start = window_end
+                    windows += 1
+                logger.info(f"已重建 {label} 的汇总: {first} ~ {last} ({windows} 个时间窗口)")
+        cursor.close()
+
+
+def main():
+    import mysql.connector
+    from config import MYSQL_CONFIG
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='OHLC 汇总表 (rollup_1h / rollup_1d / rollup_1w)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    rebuild_parser = subparsers.add_parser('rebuild', help='从原始数据重建汇总表')
+    rebuild_parser.add_argument('--measurements', nargs='+', choices=list(COMPACT_MEASUREMENTS))
+    args = parser.parse_args()
+
+    db = mysql.connector.connect(**MYSQL_CONFIG)
+    try:
+        if args.command == 'rebuild':
+            started = datetime.now()
+            RollupEngine().rebuild(db, args.measurements)
+            logger.info(f"汇总重建完成，用时 {datetime.now() - started}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
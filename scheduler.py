@@ -0,0 +1,101 @@
+import logging
+from datetime import timedelta
+from market_calendar import get_calendar, load_calendars
+from config import FETCH_INTERVAL, SYMBOL_FETCH_INTERVALS, SCHEDULE_CLOSE_GRACE
+
+logger = logging.getLogger(__name__)
+
+
+class Scheduler:
+    """按交易时段调度实时采集：每个品种独立计时，休市时跳过，收盘后补采一次
+
+    instruments 中每一项需要包含 key（品种标识）和 market（所属市场）。
+    给出 poller（AdaptivePoller）时，开盘品种的采集间隔按活跃度动态调整，配置的间隔作为请求量基准。
+    """
+
+    def __init__(self, instruments, calendars=None, poller=None):
+        self.calendars = calendars if calendars is not None else load_calendars()
+        self.close_grace = timedelta(seconds=SCHEDULE_CLOSE_GRACE)
+        self.instruments = instruments
+        self.poller = poller
+        self.state = {
+            instrument['key']: {
+                'base_interval': SYMBOL_FETCH_INTERVALS.get(instrument['key'], FETCH_INTERVAL),
+                'interval': timedelta(seconds=SYMBOL_FETCH_INTERVALS.get(instrument['key'], FETCH_INTERVAL)),
+                'next_run': None,
+                'was_open': None,  # None: 启动后尚未采集过
+                'close_at': None,  # 开盘中为本交易时段的收盘时间，收盘后保留到补采完成
+            }
+            for instrument in instruments
+        }
+
+    def calendar(self, instrument):
+        return get_calendar(self.calendars, instrument['market'])
+
+    def due(self, now):
+        """返回当前需要采集的品种，并安排它们的下一次采集时间"""
+        if self.poller:
+            self.rebalance(now)
+        due = []
+        for instrument in self.instruments:
+            state = self.state[instrument['key']]
+            calendar = self.calendar(instrument)
+            if calendar.is_open(now):
+                if state['next_run'] is None or now >= state['next_run']:
+                    due.append(instrument)
+                    state['next_run'] = now + state['interval']
+                state['was_open'] = True
+                state['close_at'] = calendar.next_close(now)
+            elif state['was_open'] is None:
+                # 启动时已休市：采集一次，拿到最后一根K线
+                due.append(instrument)
+                state['was_open'] = False
+                logger.info(f"{instrument['key']} 所在市场 {instrument['market']} 已休市，采集收盘数据")
+            elif state['was_open']:
+                # 收盘后等到 收盘时间 + SCHEDULE_CLOSE_GRACE，上游生成完整的最后一根K线后再采集一次
+                state['next_run'] = None
+                if state['close_at'] is None:
+                    state['close_at'] = now
+                if now >= state['close_at'] + self.close_grace:
+                    due.append(instrument)
+                    state['was_open'] = False
+                    state['close_at'] = None
+                    logger.info(f"{instrument['key']} 所在市场 {instrument['market']} 已休市，采集收盘数据")
+        return due
+
+    def rebalance(self, now):
+        """按最新数据重新分配开盘品种的采集间隔，间隔缩短时提前下一次采集"""
+        base_intervals = {
+            instrument['key']: self.state[instrument['key']]['base_interval']
+            for instrument in self.instruments
+            if self.calendar(instrument).is_open(now)
+        }
+        if not base_intervals:
+            return
+        for key, seconds in self.poller.intervals(base_intervals).items():
+            state = self.state[key]
+            interval = timedelta(seconds=seconds)
+            if abs(interval - state['interval']) >= state['interval'] / 2:
+                logger.info(f"{key} 采集间隔调整为 {seconds:.0f} 秒（原 {state['interval'].total_seconds():.0f} 秒）")
+            if state['next_run'] is not None and interval < state['interval']:
+                state['next_run'] = min(state['next_run'], now + interval)
+            state['interval'] = interval
+
+    def next_wakeup(self, now):
+        """返回下一次需要检查的时间：开盘品种的下次采集、收盘补采或休市品种的开盘"""
+        candidates = []
+        for instrument in self.instruments:
+            state = self.state[instrument['key']]
+            calendar = self.calendar(instrument)
+            if state['was_open']:
+                if state['next_run'] is not None:
+                    candidates.append(state['next_run'])
+                # 收盘后等待补采期间 close_at 是已经过去的收盘时间，不能用 next_close(now)
+                close_at = state['close_at'] if state['close_at'] is not None else calendar.next_close(now)
+                if close_at is not None:
+                    candidates.append(close_at + self.close_grace)
+            else:
+                next_open = calendar.next_open(now)
+                if next_open is not None:
+                    candidates.append(next_open)
+        return min(candidates) if candidates else now + timedelta(seconds=FETCH_INTERVAL)
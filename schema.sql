@@ -7,7 +7,7 @@ CREATE TABLE IF NOT EXISTS usd_index (
     id BIGINT AUTO_INCREMENT PRIMARY KEY,
     timestamp DATETIME NOT NULL,
     value DECIMAL(12, 6) NOT NULL,
-    INDEX idx_timestamp (timestamp)
+    UNIQUE KEY uk_timestamp (timestamp)
 );
 
 -- 汇率表
@@ -18,7 +18,17 @@ CREATE TABLE IF NOT EXISTS exchange_rates (
     to_currency VARCHAR(10) NOT NULL,
     rate DECIMAL(20, 6) NOT NULL,
     INDEX idx_timestamp (timestamp),
-    INDEX idx_currency_pair (from_currency, to_currency)
+    UNIQUE KEY uk_currency_pair_timestamp (from_currency, to_currency, timestamp)
+);
+
+-- 交叉汇率表（由 USD 汇率推导的派生数据）
+CREATE TABLE IF NOT EXISTS cross_rates (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    timestamp DATETIME NOT NULL,
+    from_currency VARCHAR(10) NOT NULL,
+    to_currency VARCHAR(10) NOT NULL,
+    rate DECIMAL(20, 6) NOT NULL,
+    UNIQUE KEY uk_currency_pair_timestamp (from_currency, to_currency, timestamp)
 );
 
 -- 加密货币表
@@ -43,5 +53,5 @@ CREATE TABLE IF NOT EXISTS stock_prices (
     currency VARCHAR(10) NOT NULL,
     volume BIGINT,
     INDEX idx_timestamp (timestamp),
-    INDEX idx_market_symbol (market, symbol)
+    UNIQUE KEY uk_market_symbol_timestamp (market, symbol, timestamp)
 ); 
\ No newline at end of file
@@ -0,0 +1,36 @@
+import importlib
+import sys
+import time
+
+# 入口模块最先导入本模块，作为启动计时的起点
+STARTED = time.perf_counter()
+
+# 按需导入的模块及首次导入耗时（含其依赖），按导入顺序
+IMPORT_SECONDS = {}
+
+_marks = []
+
+
+def lazy_import(name):
+    """按需导入较重的依赖（yfinance、mysql.connector、influxdb_client 等），只有启用的功能才加载，并记录首次导入耗时"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    IMPORT_SECONDS[name] = time.perf_counter() - started
+    return module
+
+
+def mark(label):
+    """记录一个启动阶段完成的时间点，如模块加载完成、初始化完成"""
+    _marks.append((label, time.perf_counter()))
+
+
+def startup_profile():
+    """启动耗时报告：各阶段距启动的时间和按需导入的各模块耗时，按耗时降序"""
+    lines = [f"{label}: {at - STARTED:.3f}s" for label, at in _marks]
+    for name, seconds in sorted(IMPORT_SECONDS.items(), key=lambda item: -item[1]):
+        lines.append(f"  导入 {name}: {seconds:.3f}s")
+    lines.append(f"合计: {time.perf_counter() - STARTED:.3f}s")
+    return lines
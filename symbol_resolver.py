@@ -0,0 +1,85 @@
+import json
+import logging
+import os
+import threading
+import time
+from config import SYMBOL_CANDIDATES, SYMBOL_CACHE_FILE, SYMBOL_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+
+def default_candidates(key):
+    """没有配置候选代码的品种：美元指数由 EUR/USD 换算，货币取 USDxxx=X，股票指数直接使用配置中的代码"""
+    if key == 'usd_index':
+        return ['EURUSD=X']
+    if key.startswith('USD/'):
+        return [f"USD{key[4:]}=X"]
+    return [key.split(':', 1)[1]] if ':' in key else [key]
+
+
+class SymbolResolver:
+    """品种标识到上游代码的解析：每个品种有一组按优先级排列的候选代码（SYMBOL_CANDIDATES）
+
+    记住每个品种上一次成功的候选代码（写入 SYMBOL_CACHE_FILE，进程重启后仍然有效），之后直接使用它；
+    只有它获取失败时才重新按顺序探测其他候选。记录超过 SYMBOL_CACHE_TTL 秒后失效，回到配置的顺序。
+    """
+
+    def __init__(self, candidates=SYMBOL_CANDIDATES, path=SYMBOL_CACHE_FILE, ttl=SYMBOL_CACHE_TTL):
+        self.configured = candidates
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._resolved = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._resolved = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error(f"读取代码解析缓存失败，将重新探测: {e}")
+
+    def candidates(self, key):
+        """返回品种的候选代码，上一次成功且未过期的代码排在最前"""
+        configured = list(self.configured.get(key) or default_candidates(key))
+        with self._lock:
+            entry = self._resolved.get(key)
+        if entry and entry['symbol'] in configured and time.time() - entry['at'] < self.ttl:
+            configured.remove(entry['symbol'])
+            configured.insert(0, entry['symbol'])
+        return configured
+
+    def primary(self, key):
+        """当前首选的上游代码，用于批量预取"""
+        return self.candidates(key)[0]
+
+    def success(self, key, symbol):
+        """记录获取成功的代码，代码变化或记录已接近过期时写入文件"""
+        now = time.time()
+        with self._lock:
+            entry = self._resolved.get(key)
+            if entry and entry['symbol'] == symbol and now - entry['at'] < self.ttl / 4:
+                return
+            if not entry or entry['symbol'] != symbol:
+                logger.info(f"{key} 使用上游代码 {symbol}")
+            self._resolved[key] = {'symbol': symbol, 'at': now}
+            self._save()
+
+    def failure(self, key, symbol):
+        """记录的代码获取失败时清除记录，下次重新按顺序探测"""
+        with self._lock:
+            entry = self._resolved.get(key)
+            if not entry or entry['symbol'] != symbol:
+                return
+            logger.warning(f"{key} 的上游代码 {symbol} 获取失败，重新探测候选代码")
+            del self._resolved[key]
+            self._save()
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._resolved, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"写入代码解析缓存失败: {e}")
@@ -0,0 +1,57 @@
+import pytest
+
+from adaptive_polling import allocate
+
+LOW, HIGH = 1 / 300, 1 / 5
+
+
+def test_allocate_stays_within_budget_when_bounds_are_hit():
+    # 一个品种远比其他活跃，会被限制在上限；平静的品种触及下限
+    weights = {'hot': 1000.0, 'warm': 1.0, 'cool': 0.1, 'calm': 0.0001, 'flat': 0.0}
+    budget = 5 / 60
+    rates = allocate(weights, budget, LOW, HIGH)
+
+    assert sum(rates.values()) <= budget * (1 + 1e-9)
+    assert sum(rates.values()) == pytest.approx(budget)
+    assert all(LOW <= rate <= HIGH for rate in rates.values())
+    assert rates['flat'] == LOW
+    assert rates['hot'] >= rates['warm'] >= rates['cool'] >= rates['calm']
+
+
+def test_allocate_reserves_floor_before_pinning_high():
+    # 按比例 hot 超过上限、其余低于下限；同时固定在两端会超出总量，应先为其余品种留出下限
+    weights = {'hot': 1000.0, **{f"s{i}": 1.0 for i in range(50)}}
+    rates = allocate(weights, 0.3, LOW, HIGH)
+
+    assert sum(rates.values()) == pytest.approx(0.3)
+    assert rates['hot'] == pytest.approx(0.3 - 50 * LOW)
+    assert all(rates[f"s{i}"] == pytest.approx(LOW) for i in range(50))
+
+
+def test_allocate_is_proportional_between_bounds():
+    weights = {'a': 1.0, 'b': 2.0, 'c': 3.0}
+    rates = allocate(weights, 0.06, LOW, HIGH)
+
+    assert rates['b'] == pytest.approx(2 * rates['a'])
+    assert rates['c'] == pytest.approx(3 * rates['a'])
+    assert sum(rates.values()) == pytest.approx(0.06)
+
+
+def test_allocate_caps_every_symbol_at_high():
+    rates = allocate({'a': 1.0, 'b': 5.0}, 10.0, LOW, HIGH)
+
+    assert rates == {'a': HIGH, 'b': HIGH}
+
+
+def test_allocate_gives_floor_when_budget_is_too_small():
+    rates = allocate({'a': 1.0, 'b': 2.0}, 0.0, LOW, HIGH)
+
+    assert rates == {'a': LOW, 'b': LOW}
+
+
+def test_allocate_splits_evenly_without_weights():
+    rates = allocate({'a': 0.0, 'b': 0.0}, 0.1, LOW, HIGH)
+
+    assert rates['a'] == pytest.approx(0.05)
+    assert rates['b'] == pytest.approx(0.05)
+    assert allocate({}, 1.0, LOW, HIGH) == {}
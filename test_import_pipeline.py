@@ -0,0 +1,90 @@
+import threading
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from import_pipeline import MemoryBudget, split_windows, stream_bars
+
+
+@pytest.mark.parametrize('interval', ['15m', '1h', '1d'])
+def test_split_windows_boundaries_do_not_depend_on_run_time(interval):
+    # 两次运行的起点相同、终点不同：已收盘的窗口应完全一致，只有最后一个窗口被截短
+    start = datetime(2025, 3, 4, 5, 6)
+    earlier = split_windows(start, datetime(2025, 9, 10, 11, 12), interval, window_rows=5000)
+    later = split_windows(start, datetime(2025, 9, 10, 17, 45), interval, window_rows=5000)
+
+    assert earlier[:-1] == later[:len(earlier) - 1]
+    assert earlier[0][0] == start
+    assert earlier[-1][1] == datetime(2025, 9, 10, 11, 12)
+    assert all(previous[1] == current[0] for previous, current in zip(later, later[1:]))
+
+
+def test_split_windows_aligns_to_calendar_periods():
+    windows = split_windows(datetime(2025, 1, 15), datetime(2025, 4, 1), '1h', window_rows=5000)
+
+    assert [window[:2] for window in windows] == [
+        (datetime(2025, 1, 15), datetime(2025, 2, 1)),
+        (datetime(2025, 2, 1), datetime(2025, 3, 1)),
+        (datetime(2025, 3, 1), datetime(2025, 4, 1)),
+    ]
+
+
+def test_split_windows_divides_long_periods_evenly():
+    windows = split_windows(datetime(2025, 1, 6), datetime(2025, 1, 13), '1m', window_rows=3000)
+
+    # 一周 10080 根分钟K线超过 3000 根，等分为 4 份
+    assert len(windows) == 4
+    assert windows[0][0] == datetime(2025, 1, 6)
+    assert windows[-1][1] == datetime(2025, 1, 13)
+
+
+def test_memory_budget_blocks_until_released():
+    budget = MemoryBudget(limit_bytes=100)
+    assert budget.acquire(60) == 60
+    acquired = threading.Event()
+
+    def waiter():
+        budget.acquire(60)
+        acquired.set()
+
+    thread = threading.Thread(target=waiter, daemon=True)
+    thread.start()
+    assert not acquired.wait(0.2)
+
+    budget.release(60)
+    assert acquired.wait(2)
+    thread.join(2)
+    assert budget.used == 60
+    assert budget.peak == 60
+
+
+def test_memory_budget_admits_oversized_request_when_idle():
+    budget = MemoryBudget(limit_bytes=100)
+    assert budget.acquire(500) == 500
+    budget.release(500)
+    assert budget.used == 0
+
+
+def test_memory_budget_resize_only_shrinks():
+    budget = MemoryBudget(limit_bytes=1000)
+    reserved = budget.acquire(400)
+    assert budget.resize(reserved, 500) == 400
+    assert budget.resize(reserved, 100) == 100
+    assert budget.used == 100
+
+
+def test_stream_bars_releases_budget_when_normalize_fails():
+    budget = MemoryBudget(limit_bytes=10 ** 9)
+    index = pd.date_range('2025-01-06', periods=3, freq='D', tz='UTC')
+
+    def fetch(start, end, interval):
+        return pd.DataFrame({'Close': [1.0, 2.0, 3.0], 'Volume': [1, 2, 3]}, index=index)
+
+    def transform(value):
+        raise ValueError('bad data')
+
+    windows = stream_bars(fetch, [(datetime(2025, 1, 6), datetime(2025, 1, 9), '1d')], transform=transform, budget=budget)
+    with pytest.raises(ValueError):
+        list(windows)
+    assert budget.used == 0
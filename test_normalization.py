@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from normalization import (
+    COLLECTOR_ROUNDING,
+    IMPORTER_ROUNDING,
+    normalize_bars,
+    round_decimal,
+    round_decimal_array,
+)
+
+EDGE_VALUES = [
+    0.0, 1.0, -1.0, 0.99995, 1.00005, 7.4999, 7.5001, 0.24999, 0.75001,
+    0.1234565, 1.0000005, 0.00005, -0.0000001, -2.5000005, 7.12345, 88.3,
+    149.8765432, 7.2345678, 39876.54321, 1e-9, 123456.78905,
+]
+
+
+def sample_values():
+    rng = np.random.default_rng(20240101)
+    halves = np.round(rng.uniform(0, 100, 20000) * 2) / 2
+    return np.concatenate([
+        EDGE_VALUES,
+        rng.uniform(-10, 10, 20000),
+        rng.uniform(0, 50000, 20000),
+        np.round(rng.uniform(0, 100, 20000), 7),  # 大量第7位为5的临界值
+        halves + rng.normal(0, 1e-4, 20000),       # 吸附阈值附近
+    ])
+
+
+@pytest.mark.parametrize('rounding', [COLLECTOR_ROUNDING, IMPORTER_ROUNDING])
+def test_round_decimal_array_matches_scalar(rounding):
+    values = sample_values()
+    expected = np.array([round_decimal(float(value), **rounding) for value in values])
+    result = round_decimal_array(values, **rounding)
+
+    mismatched = np.flatnonzero((result != expected) | (np.signbit(result) != np.signbit(expected)))
+    assert mismatched.size == 0, list(zip(values[mismatched][:5], result[mismatched][:5], expected[mismatched][:5]))
+
+
+def test_round_decimal_array_keeps_non_finite_as_nan():
+    result = round_decimal_array([np.nan, np.inf, 1.23456789])
+    assert np.isnan(result[0]) and np.isnan(result[1])
+    assert result[2] == round_decimal(1.23456789)
+
+
+def test_normalize_bars_matches_scalar_per_row():
+    index = pd.date_range('2024-01-01', periods=4, freq='h', tz='UTC')
+    columns = pd.MultiIndex.from_product([['Close', 'Volume'], ['^DJI']], names=['Price', 'Ticker'])
+    data = pd.DataFrame(
+        [[37000.123456, 10.0], [np.nan, 20.0], [36999.99999, np.nan], [37001.55555, 30.7]],
+        index=index,
+        columns=columns,
+    )
+
+    bars = normalize_bars(data)
+
+    assert list(bars.index) == [index[0], index[2], index[3]]
+    assert bars['value'].tolist() == [round_decimal(v, **IMPORTER_ROUNDING) for v in (37000.123456, 36999.99999, 37001.55555)]
+    assert bars['volume'].tolist() == [10, 0, 30]
+
+
+def test_normalize_bars_transform():
+    index = pd.date_range('2024-01-01', periods=2, freq='D')
+    data = pd.DataFrame({'Close': [1.0856, 0.0]}, index=index)
+
+    bars = normalize_bars(data, transform=lambda rate: (1 / rate) * 88.3)
+
+    assert bars['value'].tolist() == [round_decimal((1 / 1.0856) * 88.3, **IMPORTER_ROUNDING)]
+    assert bars['volume'].tolist() == [0]
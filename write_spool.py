@@ -0,0 +1,241 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from config import (
+    SPOOL_DIR, SPOOL_SEGMENT_BYTES, SPOOL_FSYNC_BATCH, SPOOL_FSYNC_INTERVAL,
+    SPOOL_DRAIN_BATCH, SPOOL_MAX_RETRY_DELAY
+)
+from metrics import WRITE_RETRIES
+
+logger = logging.getLogger(__name__)
+
+POSITIONS_FILE = 'positions.json'
+SEGMENT_SUFFIX = '.log'
+
+
+def segment_name(seq):
+    return f"{seq:012d}{SEGMENT_SUFFIX}"
+
+
+class WriteSpool:
+    """本地写入日志：数据点先追加到磁盘上的分段日志，后台线程再回放给各个数据库
+
+    - 日志只追加，按 SPOOL_SEGMENT_BYTES 切分段；每 SPOOL_FSYNC_BATCH 条或 SPOOL_FSYNC_INTERVAL 秒 fsync 一次
+    - 每个数据库（handler）单独记录回放位置，一个数据库故障不影响其他数据库，故障期间按指数退避重试
+    - 位置在 handler 成功后才推进，进程重启后从上次的位置继续；崩溃时可能重放最后一批，
+      因此 handler 必须幂等（MySQL 依靠唯一键 upsert，InfluxDB 同一序列同一时间戳覆盖写）
+    - 所有数据库都已回放完的分段会被删除
+
+    handlers 为 {名称: callable(records)}，records 为数据点字典列表，失败时应抛出异常。
+    """
+
+    def __init__(self, handlers, directory=SPOOL_DIR, segment_bytes=SPOOL_SEGMENT_BYTES,
+                 fsync_batch=SPOOL_FSYNC_BATCH, fsync_interval=SPOOL_FSYNC_INTERVAL,
+                 drain_batch=SPOOL_DRAIN_BATCH, max_retry_delay=SPOOL_MAX_RETRY_DELAY):
+        self.handlers = handlers
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_batch = max(1, fsync_batch)
+        self.fsync_interval = fsync_interval
+        self.drain_batch = max(1, drain_batch)
+        self.max_retry_delay = max_retry_delay
+
+        os.makedirs(directory, exist_ok=True)
+        self.positions = self._load_positions()
+        segments = self.segments()
+        self._segment = segments[-1] if segments else 1
+        self._file = open(os.path.join(directory, segment_name(self._segment)), 'ab')
+        first = segments[0] if segments else self._segment
+        for name in handlers:
+            self.positions.setdefault(name, [first, 0])
+
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._failures = {name: 0 for name in handlers}
+        self._retry_at = {name: 0.0 for name in handlers}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='write-spool', daemon=True)
+        self._thread.start()
+
+        backlog = {name: self.lag_bytes(name) for name in handlers}
+        logger.info(f"写入日志已启用 ({directory})，待回放: {backlog} 字节")
+
+    def _load_positions(self):
+        path = os.path.join(self.directory, POSITIONS_FILE)
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"读取写入日志位置失败，将从最早的分段开始回放: {e}")
+            return {}
+
+    def _save_positions(self):
+        path = os.path.join(self.directory, POSITIONS_FILE)
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(self.positions, f)
+        os.replace(f"{path}.tmp", path)
+
+    def segments(self):
+        """返回磁盘上所有分段的序号（升序）"""
+        return sorted(
+            int(name[:-len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit()
+        )
+
+    def append(self, measurement, tags, fields, timestamp):
+        """追加一个数据点，只写本地磁盘，不会因数据库缓慢而阻塞"""
+        record = {
+            'measurement': measurement,
+            'tags': tags,
+            'fields': fields,
+            'timestamp': timestamp.isoformat()
+        }
+        line = (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+        with self._cond:
+            if self._file.tell() > 0 and self._file.tell() + len(line) > self.segment_bytes:
+                self._rotate()
+            self._file.write(line)
+            self._file.flush()
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_batch or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+            self._cond.notify()
+        return True
+
+    def _sync(self):
+        """把已写入的数据刷到磁盘（调用方持有锁）"""
+        if self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _rotate(self):
+        """关闭当前分段并开始新分段（调用方持有锁）"""
+        self._sync()
+        self._file.close()
+        self._segment += 1
+        self._file = open(os.path.join(self.directory, segment_name(self._segment)), 'ab')
+
+    def _read(self, position, limit):
+        """从 position 开始读取最多 limit 条完整记录，返回 (records, 新位置)"""
+        segment, offset = position
+        segments = [seq for seq in self.segments() if seq >= segment]
+        records = []
+        for seq in segments:
+            if seq != segment:
+                segment, offset = seq, 0
+            with open(os.path.join(self.directory, segment_name(seq)), 'rb') as f:
+                f.seek(offset)
+                while len(records) < limit:
+                    line = f.readline()
+                    if not line.endswith(b'\n'):
+                        break  # 到达末尾，或最后一行尚未写完
+                    offset += len(line)
+                    try:
+                        record = json.loads(line)
+                        record['timestamp'] = datetime.fromisoformat(record['timestamp'])
+                        records.append(record)
+                    except (ValueError, KeyError) as e:
+                        logger.error(f"跳过写入日志中损坏的记录 {segment_name(seq)}@{offset}: {e}")
+            if len(records) >= limit:
+                break
+        return records, [segment, offset]
+
+    def lag_bytes(self, name):
+        """某个数据库尚未回放的字节数"""
+        segment, offset = self.positions[name]
+        total = 0
+        for seq in self.segments():
+            if seq >= segment:
+                try:
+                    total += os.path.getsize(os.path.join(self.directory, segment_name(seq)))
+                except OSError:
+                    continue
+                if seq == segment:
+                    total -= offset
+        return total
+
+    def drain(self, name, force=False):
+        """把 name 对应的数据库回放到日志末尾，失败时安排退避重试，返回本次回放的条数"""
+        if not force and time.monotonic() < self._retry_at[name]:
+            return 0
+
+        drained = 0
+        while True:
+            records, position = self._read(self.positions[name], self.drain_batch)
+            if records:
+                try:
+                    self.handlers[name](records)
+                except Exception as e:
+                    self._failures[name] += 1
+                    WRITE_RETRIES.inc(sink=name)
+                    delay = min(2 ** (self._failures[name] - 1), self.max_retry_delay)
+                    self._retry_at[name] = time.monotonic() + delay
+                    logger.error(
+                        f"写入日志回放到 {name} 失败 (连续 {self._failures[name]} 次)，"
+                        f"{delay:.0f} 秒后重试，积压 {self.lag_bytes(name)} 字节: {e}"
+                    )
+                    return drained
+                drained += len(records)
+            if position != self.positions[name]:
+                self.positions[name] = position
+                self._save_positions()
+            if len(records) < self.drain_batch:
+                break
+
+        if self._failures[name]:
+            logger.info(f"{name} 已恢复，写入日志回放完成")
+            self._failures[name] = 0
+        return drained
+
+    def _cleanup(self):
+        """删除所有数据库都已回放完的旧分段"""
+        if not self.handlers:
+            return
+        done = min(self.positions[name][0] for name in self.handlers)
+        for seq in self.segments():
+            if seq >= done or seq == self._segment:
+                break
+            try:
+                os.remove(os.path.join(self.directory, segment_name(seq)))
+            except OSError as e:
+                logger.error(f"删除写入日志分段失败 {segment_name(seq)}: {e}")
+
+    def _run(self):
+        """后台回放线程"""
+        while True:
+            with self._cond:
+                if not self._closed:
+                    self._cond.wait(self.fsync_interval)
+                if time.monotonic() - self._last_sync >= self.fsync_interval:
+                    self._sync()
+                closed = self._closed
+            for name in self.handlers:
+                try:
+                    self.drain(name, force=closed)
+                except Exception as e:
+                    logger.error(f"写入日志回放线程出错 ({name}): {e}")
+            self._cleanup()
+            if closed:
+                return
+
+    def close(self):
+        """尝试回放剩余数据并关闭日志；未能写入的数据保留在磁盘上，下次启动继续回放"""
+        if self._closed:
+            return
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        with self._cond:
+            self._sync()
+            self._file.close()
+        backlog = {name: self.lag_bytes(name) for name in self.handlers}
+        logger.info(f"写入日志已关闭，待回放: {backlog} 字节")